@@ -0,0 +1,75 @@
+"""
+Provides streaming access to the attachments of invoices and contacts.
+"""
+
+import mimetypes
+import os
+import urllib
+
+# Resources which accept attachments:
+INVOICES = "Invoices"
+CONTACTS = "Contacts"
+
+def _attachment_uri(resource, identifier, filename=None):
+    """
+    Returns the internal API URI of the attachments of the entity, or of
+    the named attachment.
+    """
+    if resource not in (INVOICES, CONTACTS):
+        raise ValueError("Resource does not take attachments: %s" % resource)
+    if filename is None:
+        return "%s/%s/Attachments" % (resource, identifier)
+    return "%s/%s/Attachments/%s" % (resource, identifier, urllib.quote(filename))
+
+def list_attachments(client, resource, identifier):
+    """
+    Returns the attachment records of the invoice or contact.
+    """
+    # Attempt to retrieve the response as a Python dict:
+    response = client.get(_attachment_uri(resource, identifier))
+
+    # If no attachment, return []
+    if not response["Response"].get("Attachments"):
+        return []
+
+    # If only one instance is returned, xml2json returns
+    # dictionary. Put the single item back into a list.
+    attachments = response["Response"]["Attachments"]["Attachment"]
+    if isinstance(attachments, dict):
+        attachments = [attachments]
+    return attachments
+
+def upload_attachment(client, resource, identifier, path, filename=None, content_type=None):
+    """
+    Attaches the file to the invoice or contact, streaming it from disk,
+    and returns the attachment record.
+
+    The file name and the content type default to those of the path.
+    """
+    filename = filename or os.path.basename(path)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    with open(path, "rb") as fileobj:
+        response = client.upload(_attachment_uri(resource, identifier, filename), fileobj, content_type)
+    return response["Response"]["Attachments"]["Attachment"]
+
+def download_attachment(client, resource, identifier, filename, target, content_type=None):
+    """
+    Writes the named attachment of the invoice or contact to the target,
+    a path or a file object, as it arrives.
+    """
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    uri = _attachment_uri(resource, identifier, filename)
+    if hasattr(target, "write"):
+        client.download(uri, target, content_type)
+        return
+
+    # Write to a temporary file so that no partial download is left over:
+    partial = "%s.part" % (target)
+    try:
+        with open(partial, "wb") as fileobj:
+            client.download(uri, fileobj, content_type)
+        os.rename(partial, target)
+    except:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
@@ -0,0 +1,193 @@
+"""
+Provides bulk operations on XERO resources.
+"""
+
+from ratelimit import RateBudget
+from resources import XContact
+from resources import XInvoice
+import Queue
+import re
+import threading
+import urllib
+
+# Keep lookup URIs within what XERO (IIS) accepts by default:
+MAX_URI_LENGTH = 4000
+
+# XERO returns at most 100 records per request:
+MAX_LOOKUP = 100
+
+# Matches XERO identifiers (GUIDs), as opposed to numbers:
+_GUID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+def is_guid(identifier):
+    """
+    Tells whether the identifier is a XERO GUID rather than a number.
+    """
+    return _GUID.match(identifier) is not None
+
+def envelope_results(response, resource):
+    """
+    Returns the per entity results of an envelope posted with
+    ``SummarizeErrors=false`` as a list of ``(ok, result)``, in the
+    order of the envelope.
+    """
+    results = response["Response"]["%ss" % (resource)][resource]
+    if isinstance(results, dict):
+        results = [results]
+
+    # The status is an attribute in XML and a field in JSON:
+    return [(result.get("@status", result.get("StatusAttributeString")) != "ERROR", result) for result in results]
+
+def run_batches(batches, send, workers=4):
+    """
+    Calls ``send(batch)`` for each batch on ``workers`` threads and
+    returns the list of ``(batch, result)`` where the result is the
+    return value of ``send``, or the exception it raised.
+
+    ``send`` is called from many threads at once, so clients it uses
+    should be :meth:`Client.pooled` ones.
+    """
+    pending = Queue.Queue()
+    for batch in batches:
+        pending.put(batch)
+    results = []
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            try:
+                batch = pending.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                result = send(batch)
+            except Exception, e:
+                result = e
+            with lock:
+                results.append((batch, result))
+
+    threads = [threading.Thread(target=work) for i in range(min(workers, pending.qsize()))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def transition_invoices(client, identifiers, status, batch_size=50, workers=4, budget=None):
+    """
+    Moves the invoices, given by ID or number, to the
+    :class:`XInvoice.InvoiceStatus` (ie. ``AUTHORISED`` or ``VOIDED``).
+
+    Minimal envelopes holding only the identifier and the status are
+    posted ``batch_size`` invoices at a time on ``workers`` threads,
+    within the :class:`RateBudget`. Returns a dictionary of
+    ``(ok, result)`` by identifier, where the result is the XERO
+    response for the invoice or the exception which failed its batch.
+    Clients which do not stream send through their pooled transport
+    (see :meth:`Client.pooled`).
+    """
+    if status not in XInvoice.InvoiceStatus.get_all_types():
+        raise ValueError("Status is unknown: %s" % status)
+    budget = budget or RateBudget()
+    client = client.pooled()
+
+    def send(batch):
+        chunks = ["<Invoices>"]
+        for identifier in batch:
+            invoice = XInvoice.load({"InvoiceID" if is_guid(identifier) else "InvoiceNumber": identifier})
+            invoice.Status = status
+            chunks.append(invoice.to_update_xml())
+        chunks.append("</Invoices>")
+        budget.acquire()
+        return envelope_results(client.post("Invoices?SummarizeErrors=false", "".join(chunks)), "Invoice")
+
+    # Split the identifiers into batches, dropping duplicates:
+    seen = set()
+    identifiers = [i for i in identifiers if not (i in seen or seen.add(i))]
+    batches = [identifiers[i:i + batch_size] for i in range(0, len(identifiers), batch_size)]
+
+    retval = {}
+    for batch, results in run_batches(batches, send, workers):
+        if isinstance(results, Exception):
+            for identifier in batch:
+                retval[identifier] = (False, results)
+        else:
+            for identifier, result in zip(batch, results):
+                retval[identifier] = result
+    return retval
+
+def _lookup_uris(resource, field, identifiers, max_length=MAX_URI_LENGTH, max_count=MAX_LOOKUP):
+    """
+    Yields ``(uri, identifiers)`` looking up the identifiers in as few
+    URIs of at most ``max_length`` characters as possible. GUIDs go into
+    the ``IDs`` filter, numbers into a ``where`` filter on the field.
+    """
+    guids = [i for i in identifiers if is_guid(i)]
+    numbers = [i for i in identifiers if not is_guid(i)]
+
+    def query(chunk, guid):
+        if guid:
+            return "IDs=%s" % (urllib.quote(",".join(chunk), safe=","))
+        condition = " OR ".join(['%s=="%s"' % (field, i.replace("\\", "\\\\").replace('"', '\\"')) for i in chunk])
+        return urllib.urlencode({"where": condition})
+
+    for guid, pending in ((True, guids), (False, numbers)):
+        chunk = []
+        for identifier in pending:
+            candidate = chunk + [identifier]
+            if chunk and (len(candidate) > max_count or len(resource) + 1 + len(query(candidate, guid)) > max_length):
+                yield "%s?%s" % (resource, query(chunk, guid)), chunk
+                candidate = [identifier]
+            chunk = candidate
+        if chunk:
+            yield "%s?%s" % (resource, query(chunk, guid)), chunk
+
+def _lookup(client, resource, entity, id_field, number_field, identifiers, workers, fields):
+    """
+    Looks up the identifiers (IDs or numbers) of the resource and
+    returns a dictionary of entities by identifier; identifiers which are
+    not found are left out.
+    """
+    seen = set()
+    identifiers = [i for i in identifiers if not (i in seen or seen.add(i))]
+    uris = [uri for uri, chunk in _lookup_uris(resource, number_field, identifiers)]
+    projection = entity.projection(fields) if fields else None
+    client = client.pooled()
+
+    retval = {}
+    for uri, response in run_batches(uris, lambda uri: client.get(uri, projection), workers):
+        if isinstance(response, Exception):
+            raise response
+
+        # If nothing is found, there is no collection:
+        records = response["Response"].get(resource)
+        if not records:
+            continue
+        records = records[entity._element]
+        if isinstance(records, dict):
+            records = [records]
+        for record in entity.load_all(records):
+            for key in (record.get(id_field), record.get(number_field)):
+                if key in seen:
+                    retval[key] = record
+    return retval
+
+def fetch_invoices(client, identifiers, workers=4, fields=None):
+    """
+    Returns a dictionary of :class:`XInvoice` by the given invoice IDs
+    or numbers, packing up to a hundred of them into each request and
+    running the requests on ``workers`` threads, through the pooled
+    transport (see :meth:`Client.pooled`). With ``fields``, only those
+    fields (and the identifiers) are kept.
+    """
+    return _lookup(client, "Invoices", XInvoice, "InvoiceID", "InvoiceNumber", identifiers, workers, fields)
+
+def fetch_contacts(client, identifiers, workers=4, fields=None):
+    """
+    Returns a dictionary of :class:`XContact` by the given contact IDs
+    or numbers, packing up to a hundred of them into each request and
+    running the requests on ``workers`` threads, through the pooled
+    transport (see :meth:`Client.pooled`). With ``fields``, only those
+    fields (and the identifiers) are kept.
+    """
+    return _lookup(client, "Contacts", XContact, "ContactID", "ContactNumber", identifiers, workers, fields)
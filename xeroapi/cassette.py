@@ -0,0 +1,209 @@
+"""
+Provides record and replay transports for running the client without a
+network.
+
+A :class:`RecordingTransport` passes the requests on to a real transport
+and appends each request and response to a cassette, a gzipped file of
+JSON lines. A :class:`ReplayTransport` serves the responses of a
+cassette from memory. Both stand in for the :class:`StreamingTransport`
+of a client in streaming mode::
+
+    client = Client(..., streaming=True, transport=RecordingTransport("invoices.cassette"))
+
+Cassettes hold no secrets: request headers (and so the OAuth
+signature) are not recorded, ``oauth_*`` query parameters and cookies are
+dropped, and any further strings given are replaced.
+"""
+
+from transport import CHUNK_SIZE
+from transport import StreamingTransport
+import base64
+import gzip
+import hashlib
+import json
+import re
+import threading
+import zlib
+
+# Replaces the secrets found in the cassette:
+SCRUBBED = "SCRUBBED"
+
+# Matches OAuth parameters in query strings:
+_OAUTH_PARAMETER = re.compile(r"(oauth_[a-z_]+)=[^&]*")
+
+# Response headers which are not recorded; the body is recorded
+# decompressed and served in one piece:
+_DROPPED_HEADERS = ("set-cookie", "content-encoding", "content-length", "transfer-encoding")
+
+def _read_body(body):
+    """
+    Returns the request body, a string, a file object or an iterable of
+    chunks, as a string.
+    """
+    if body is None or isinstance(body, basestring):
+        return body
+    if hasattr(body, "read"):
+        return body.read()
+    return "".join(body)
+
+def _digest(body, headers=None):
+    """
+    Returns the digest of the request body matching it on replay.
+
+    Compressed bodies are digested decompressed: gzip writes the time
+    into its header, so the same body compresses differently each run.
+    """
+    if not body:
+        return None
+    encoding = [value for key, value in (headers or {}).iteritems() if key.lower() == "content-encoding"]
+    if encoding and encoding[0].lower() in ("gzip", "x-gzip"):
+        # Offset the window bits so that zlib expects a gzip header:
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    return hashlib.sha1(body).hexdigest()
+
+def scrub(text, secrets=()):
+    """
+    Returns the text with the OAuth parameters and the secrets replaced.
+    """
+    text = _OAUTH_PARAMETER.sub(r"\1=%s" % (SCRUBBED), text)
+    for secret in secrets:
+        text = text.replace(secret, SCRUBBED)
+    return text
+
+class CassetteResponse:
+    """
+    Provides a response served from memory, compatible with
+    :class:`StreamingResponse`.
+    """
+
+    def __init__(self, status, headers, content):
+        """
+        Constructs a new :class:`CassetteResponse` instance.
+        """
+        self.status = status
+        self.headers = dict(headers)
+        self.headers["status"] = status
+        self._content = content
+
+    def iter_content(self, chunk_size=CHUNK_SIZE):
+        """
+        Yields the response body chunk by chunk.
+        """
+        for offset in range(0, len(self._content), chunk_size):
+            yield self._content[offset:offset + chunk_size]
+
+    def read(self):
+        """
+        Returns the complete response body.
+        """
+        return self._content
+
+    def close(self):
+        """
+        Does nothing, there is no connection to release.
+        """
+        pass
+
+class RecordingTransport:
+    """
+    Provides a transport which records the requests it sends, and their
+    responses, into a cassette.
+    """
+
+    def __init__(self, path, transport=None, secrets=()):
+        """
+        Constructs a new :class:`RecordingTransport` instance appending to
+        the cassette at the path.
+
+        Requests are sent through the given transport, a new
+        :class:`StreamingTransport` by default. Each of the ``secrets``
+        (eg. tenant names or keys) is replaced by :data:`SCRUBBED`
+        wherever it appears in the cassette.
+        """
+        self.path = path
+        self.transport = transport or StreamingTransport()
+        self.secrets = [secret for secret in secrets if secret]
+        self._lock = threading.Lock()
+
+    def request(self, uri, method="GET", body=None, headers=None):
+        """
+        Sends the request, records it with its response and returns the
+        response, read in full.
+        """
+        # Bodies are matched on replay, so read them up front:
+        body = _read_body(body)
+        response = self.transport.request(uri, method, body, headers)
+        content = response.read()
+        response_headers = dict((key, value) for key, value in response.headers.iteritems()
+                                if key not in _DROPPED_HEADERS and key != "status")
+
+        # Scrub the entry and append it to the cassette:
+        entry = {"method": method,
+                 "uri": scrub(uri, self.secrets),
+                 "body": _digest(body, headers),
+                 "status": response.status,
+                 "headers": dict((key, scrub(value, self.secrets)) for key, value in response_headers.iteritems()),
+                 "content": base64.b64encode(scrub(content, self.secrets) if self.secrets else content)}
+        with self._lock:
+            cassette = gzip.open(self.path, "ab")
+            try:
+                cassette.write("%s\n" % (json.dumps(entry, sort_keys=True)))
+            finally:
+                cassette.close()
+        return CassetteResponse(response.status, response_headers, content)
+
+def load_cassette(path):
+    """
+    Returns the list of entries recorded in the cassette, with their
+    content decoded.
+    """
+    entries = []
+    cassette = gzip.open(path, "rb")
+    try:
+        for line in cassette:
+            if line.strip():
+                entry = json.loads(line)
+                entry["content"] = base64.b64decode(entry["content"])
+                entries.append(entry)
+    finally:
+        cassette.close()
+    return entries
+
+class ReplayTransport:
+    """
+    Provides a transport which serves the responses of a cassette.
+
+    Requests are matched on their method, scrubbed URI and body. Repeated
+    requests are served the recorded responses in order, the last one
+    being served again once they run out.
+    """
+
+    def __init__(self, path, secrets=()):
+        """
+        Constructs a new :class:`ReplayTransport` instance from the
+        cassette at the path, scrubbing the request URIs with the
+        ``secrets`` it was recorded with.
+        """
+        self.secrets = [secret for secret in secrets if secret]
+        self._responses = {}
+        self._served = {}
+        self._lock = threading.Lock()
+        for entry in load_cassette(path):
+            key = (entry["method"], entry["uri"], entry["body"])
+            self._responses.setdefault(key, []).append(entry)
+
+    def request(self, uri, method="GET", body=None, headers=None):
+        """
+        Returns the recorded response of the request.
+
+        Raises ValueError if the request has not been recorded.
+        """
+        key = (method, scrub(uri, self.secrets), _digest(_read_body(body), headers))
+        with self._lock:
+            responses = self._responses.get(key)
+            if responses is None:
+                raise ValueError("Request is not recorded: %s %s" % (method, uri))
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+        entry = responses[min(served, len(responses) - 1)]
+        return CassetteResponse(entry["status"], entry["headers"], entry["content"])
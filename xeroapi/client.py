@@ -4,11 +4,37 @@ Provides a API client module for private XERO Api applications.
 
 from M2Crypto import RSA
 import base64
+import copy
 import hashlib
 import oauth2
-import json
-import xml2json
 import urllib
+import urlparse
+# The exceptions and the parsers used to live here, keep them importable:
+from errors import XeroClientBadRequestException
+from errors import XeroClientCancelledException
+from errors import XeroClientNotFoundException
+from errors import XeroClientNotImplementedException
+from errors import XeroClientRequestException
+from errors import XeroClientUnknownException
+from parsing import PARSE_THRESHOLD
+from parsing import json_to_internal
+from parsing import parse_json
+from parsing import parse_json_or_xml
+from parsing import parse_xml
+from parsing import parse_xml_chunks
+from pipeline import Call
+from pipeline import CheckStage
+from pipeline import DecodeStage
+from pipeline import Pipeline
+from pipeline import QuotaStage
+from pipeline import ScheduleStage
+from pipeline import SingleFlightStage
+from pipeline import cancellable
+from transport import COMPRESSION_THRESHOLD
+from transport import ResponseStream
+from transport import StreamingTransport
+from transport import gzip_chunks
+from transport import gzip_string
 
 class SignatureMethod_RSA(oauth2.SignatureMethod):
     """
@@ -50,47 +76,107 @@ class SignatureMethod_RSA(oauth2.SignatureMethod):
         encoded = base64.b64encode(signature)
         return encoded
 
-class XeroClientRequestException(Exception):
+class ResponseFormat:
     """
-    Indicates that there is a problem with the XERO API client
-    request.
+    Defines the response formats a :class:`Client` can ask XERO for.
     """
-    pass
+    XML = "xml"
+    JSON = "json"
 
-class XeroClientBadRequestException(Exception):
-    """
-    Indicates that the request has failed Xero validation.
-    """
-    pass
-
-class XeroClientNotFoundException(Exception):
-    """
-    Indicates that the reference object (either by ID or Number) does not exist.
-    """
-    pass
-
-class XeroClientNotImplementedException(Exception):
-    """
-    Indicates that the endpoint doesn't accept the attempted method.
-    """
-    pass
-
-class XeroClientUnknownException(Exception):
-    """
-    Indicates that there occured an unknown exception due to unknown
-    status code.
-    """
-    pass
+    @classmethod
+    def get_all_types(cls):
+        return [cls.XML, cls.JSON]
 
 class Client(oauth2.Client):
     """
     Provides a API client class for private XERO Api applications.
     """
 
-    def __init__(self, access_token, access_secret, cert_filepath, xero_api_url="https://api.xero.com/api.xro/2.0/"):
+    def __init__(self, access_token, access_secret, cert_filepath,
+                 xero_api_url="https://api.xero.com/api.xro/2.0/",
+                 response_format=ResponseFormat.XML,
+                 streaming=False,
+                 compress_requests=False,
+                 signature_method=None,
+                 transport=None,
+                 scheduler=None,
+                 tenant=None,
+                 single_flight=None,
+                 parse_pool=None,
+                 parse_threshold=PARSE_THRESHOLD,
+                 compact_parsing=False,
+                 middleware=(),
+                 quota=None):
         """
         Instantiates a API client class instance for private XERO Api applications.
+
+        With ``response_format`` set to ``ResponseFormat.JSON`` the
+        client asks XERO for JSON responses which are decoded by the
+        (C accelerated) ``json`` module instead of being converted from
+        XML. Responses which turn out not to be JSON are still parsed
+        as XML.
+
+        With ``streaming`` set, requests bypass ``httplib2``: responses
+        are requested gzip compressed and are decompressed and parsed
+        incrementally as they arrive. ``compress_requests`` additionally
+        gzip compresses large request bodies; only enable it against
+        servers which accept ``Content-Encoding: gzip`` requests.
+
+        ``signature_method``, ``transport`` and ``scheduler`` allow many
+        clients to share an already loaded private key, a connection
+        pool and a :class:`FairScheduler` (see :class:`ClientPool`).
+        Calls are scheduled as ``tenant``, by default the access token.
+
+        With a :class:`SingleFlight` instance given as ``single_flight``,
+        concurrent ``GET``s of the same tenant and URI share one request
+        and its (read only) result. The instance may be shared by clients.
+
+        With a ``multiprocessing.Pool`` given as ``parse_pool``, response
+        bodies of ``parse_threshold`` bytes or more are parsed in the
+        pool, so that the calling process (and its other threads) are not
+        held up by the parser; the result comes back as plain, picklable
+        dictionaries, lists and strings. Streamed bodies are then read in
+        full before being parsed, instead of being parsed as they arrive.
+
+        With ``compact_parsing`` set, XML responses are parsed to use less
+        memory: repeated tags and short values (codes, statuses,
+        currencies) share one string across the response.
+
+        Each request goes down a :class:`Pipeline` of stages, outermost
+        first: the given ``middleware`` (ie. a :class:`CacheStage`, a
+        :class:`CircuitBreakerStage`, a :class:`RetryStage` or a
+        :class:`HedgeStage`), single flight, decoding, status checking
+        and scheduling. Only the enabled stages are in the pipeline.
+
+        Requests sent are counted in the ``quota`` :class:`QuotaTracker`,
+        if any, which may be shared by clients.
         """
+        # Check and keep the response format:
+        if response_format not in ResponseFormat.get_all_types():
+            raise ValueError("Response format is unknown: %s" % response_format)
+        self._response_format = response_format
+
+        # Keep the streaming options:
+        self._streaming = streaming
+        self._compress_requests = compress_requests
+        self._transport = transport or StreamingTransport()
+
+        # Keep the tenant to make calls as:
+        self._tenant = tenant or access_token
+
+        # Build the request pipeline of the enabled stages:
+        stages = list(middleware)
+        if single_flight is not None:
+            stages.append(SingleFlightStage(single_flight))
+        stages.append(DecodeStage(parse_pool, parse_threshold, compact_parsing))
+        stages.append(CheckStage())
+        if scheduler is not None:
+            stages.append(ScheduleStage(scheduler))
+        if quota is not None:
+            stages.append(QuotaStage(quota))
+        self.pipeline = Pipeline(stages, self._transmit)
+        self.quota = quota
+
         # Keep the API url for future use:
         if xero_api_url[-1] == "/":
             self._xero_api_url = xero_api_url
@@ -107,86 +193,206 @@ class Client(oauth2.Client):
         oauth2.Client.__init__(self, oauth_consumer, oauth_token)
 
         # Set the signature method to RSA:
-        self.set_signature_method(SignatureMethod_RSA(cert_filepath))
+        self.set_signature_method(signature_method or SignatureMethod_RSA(cert_filepath))
 
-    def get(self, resource_uri):
+    def _headers(self):
         """
-        ``GET``s a resource by its internal API URI.
+        Returns the HTTP headers to be sent with each request.
         """
-        # Attempt to retrieve the response
-        try:
-            response_header, response_content = self.request("%s%s" % (self._xero_api_url, resource_uri), method="GET")
-        except:
-            raise XeroClientRequestException
+        if self._response_format == ResponseFormat.JSON:
+            return {"Accept": "application/json"}
+        return {}
 
-        # Check if there is an error:
-        if response_header["status"] == "400":
-            raise XeroClientBadRequestException(response_content)
-        elif response_header["status"] == "404":
-            raise XeroClientNotFoundException(response_content)
-        elif response_header["status"] == "501":
-            raise XeroClientNotImplementedException(response_content)
-        elif response_header["status"] != "200":
-            raise XeroClientUnknownException(response_content)
+    def _sign(self, uri, method, body=None):
+        """
+        Returns the OAuth ``Authorization`` header for the request.
 
-        # Convert the data into a JSON object:
-        json_string = xml2json.xml2json(response_content)
+        Form encoded ``POST`` parameters are part of the signature.
+        """
+        parameters = {}
+        if method == "POST" and isinstance(body, basestring) and body:
+            parameters = dict(urlparse.parse_qsl(body, keep_blank_values=True))
+        request = oauth2.Request.from_consumer_and_token(self.consumer,
+                                                         token=self.token,
+                                                         http_method=method,
+                                                         http_url=uri,
+                                                         parameters=parameters)
+        request.sign_request(self.method, self.consumer, self.token)
+        return request.to_header()
 
-        # Convert the json_string to a Python dictionary and return:
-        return json.loads(json_string)
+    def _send(self, method, resource_uri, body=None, headers=None, stream=False):
+        """
+        Sends the request and returns the response headers and content.
 
-    def put(self, resource_uri, content):
+        The body is either a string, a file object or an iterable of raw
+        XML chunks. Files are streamed from disk and chunks are sent with
+        chunked transfer encoding, both through the streaming transport.
+        ``headers`` override the default request headers.
+
+        In streaming mode, or if ``stream`` is set, the content of a
+        successful response is an iterator over the decompressed body
+        chunks instead of a string.
         """
-        ``PUT``s a resource by its internal API URI and contents.
+        uri = "%s%s" % (self._xero_api_url, resource_uri)
+        request_headers = self._headers()
+        streamed = hasattr(body, "read")
+        chunked = body is not None and not streamed and not isinstance(body, basestring)
+        if not (self._streaming or stream or streamed or chunked):
+            request_headers.update(headers or {})
+            return self.request(uri, method=method, body=body or "", headers=request_headers)
+
+        # Sign the request and ask for a compressed response:
+        request_headers.update(self._sign(uri, method, body))
+        request_headers["Accept-Encoding"] = "gzip"
+        if chunked:
+            request_headers["Content-Type"] = "application/xml"
+        elif method == "POST":
+            request_headers["Content-Type"] = "application/x-www-form-urlencoded"
+        request_headers.update(headers or {})
+
+        # Compress chunked and large bodies if allowed:
+        if chunked and self._compress_requests:
+            body = gzip_chunks(body)
+            request_headers["Content-Encoding"] = "gzip"
+        elif body and not streamed and self._compress_requests and len(body) >= COMPRESSION_THRESHOLD:
+            body = gzip_string(body)
+            request_headers["Content-Encoding"] = "gzip"
+
+        # Errors are small, read them in full:
+        response = self._transport.request(uri, method, body, request_headers)
+        if response.status != "200":
+            return response.headers, response.read()
+        return response.headers, response.iter_content()
+
+    def _transmit(self, call):
+        """
+        Sends the call at the end of the pipeline.
+
+        Cancelled calls are not sent; a streamed body stops being read
+        once its call is cancelled (see :func:`cancellable`).
         """
+        if call.cancelled is not None and call.cancelled.is_set():
+            raise XeroClientCancelledException("Call is cancelled")
+
         # Attempt to retrieve the response
         try:
-            response_header, response_content = self.request("%s%s" % (self._xero_api_url, resource_uri), method="PUT", body=content)
+            response_header, response_content = self._send(call.method, call.resource_uri, call.body, call.headers,
+                                                           call.stream)
         except:
             raise XeroClientRequestException
+        if call.cancelled is not None and not isinstance(response_content, basestring):
+            response_content = cancellable(response_content, call.cancelled)
+        return response_header, response_content
+
+    def pooled(self):
+        """
+        Returns a client which can be called from many threads at once.
+
+        ``httplib2``, which non-streaming clients send through, shares one
+        connection per host between threads, so such clients return a
+        copy of themselves sending through the (thread safe) pooled
+        streaming transport instead. The copy shares the credentials and
+        the pipeline stages (cache, single flight, scheduler...).
+        """
+        if self._streaming:
+            return self
+        retval = copy.copy(self)
+        retval._streaming = True
+        retval.pipeline = Pipeline(self.pipeline.stages, retval._transmit)
+        return retval
+
+    def remaining_quota(self):
+        """
+        Returns the calls left this minute and this day, as counted by
+        the quota tracker.
+        """
+        if self.quota is None:
+            raise ValueError("Client has no quota tracker")
+        return self.quota.remaining(self._tenant)
+
+    def _call(self, method, resource_uri, body=None, headers=None, stream=False, decode=True, projection=None):
+        """
+        Sends the request down the pipeline and returns its result.
+        """
+        return self.pipeline(Call(method, resource_uri, body, headers, stream, decode, self._tenant, projection,
+                                  self._streaming))
+
+    def get(self, resource_uri, projection=None):
+        """
+        ``GET``s a resource by its internal API URI.
 
-        # Check if there is an error:
-        if response_header["status"] == "400":
-            raise XeroClientBadRequestException(response_content)
-        elif response_header["status"] == "404":
-            raise XeroClientNotFoundException()
-        elif response_header["status"] == "501":
-            raise XeroClientNotImplementedException(response_content)
-        elif response_header["status"] != "200":
-            raise XeroClientUnknownException(response_content)
+        With a ``projection`` mapping element names to the child elements
+        to keep (see :meth:`XEntity.projection`), only those fields of the
+        entities are returned; the others are skipped by the parser
+        without being converted.
+        """
+        return self._call("GET", resource_uri, projection=projection)
 
-        # Convert the data into a JSON object:
-        json_string = xml2json.xml2json(response_content)
+    def get_raw(self, resource_uri, accept="application/pdf"):
+        """
+        ``GET``s a resource by its internal API URI as the given content
+        type and returns the response body as is, without conversion.
+        """
+        response_header, response_content = self._call("GET", resource_uri, headers={"Accept": accept}, decode=False)
 
-        # Convert the json_string to a Python dictionary and return:
-        return json.loads(json_string)
+        # Join streamed bodies and return:
+        if not isinstance(response_content, basestring):
+            response_content = "".join(response_content)
+        return response_content
+
+    def get_stream(self, resource_uri, accept=None):
+        """
+        ``GET``s a resource by its internal API URI and returns the
+        response body as a read only file object. The body is read from
+        the connection, and decompressed, as the file is read, so it can
+        be parsed as it downloads (ie. with :func:`parse_xml_stream`)
+        without ever being held in memory as a whole.
+
+        Close the file to release the connection.
+        """
+        headers = {"Accept": accept} if accept else None
+        response_header, response_content = self._call("GET", resource_uri, headers=headers, stream=True, decode=False)
+        return ResponseStream(response_content)
+
+    def put(self, resource_uri, content):
+        """
+        ``PUT``s a resource by its internal API URI and contents.
+
+        The contents are either an XML string or an iterable of XML
+        string chunks which are streamed to XERO as they are produced.
+        """
+        return self._call("PUT", resource_uri, content)
 
     def post(self, resource_uri, content):
         """
         ``POST``s a resource by its internal API URI and contents.
+
+        The contents are either an XML string, which is sent form
+        encoded, or an iterable of XML string chunks which are streamed
+        to XERO as the raw request body while they are produced.
         """
-        # Attempt to retrieve the response
-        try:
-            response_header, response_content = self.request("%s%s" %
-                                                             (self._xero_api_url,
-                                                              resource_uri),
-                                                             method="POST",
-                                                             body=urllib.urlencode({"xml": content}))
-        except:
-            raise XeroClientRequestException
+        # Form encode complete documents only:
+        if isinstance(content, basestring):
+            content = urllib.urlencode({"xml": content})
+        return self._call("POST", resource_uri, content)
+
+    def upload(self, resource_uri, fileobj, content_type="application/octet-stream", method="PUT"):
+        """
+        ``PUT``s (or ``POST``s) the contents of the file object to the
+        resource, streaming them from disk, and returns the response as
+        a Python dictionary.
+        """
+        return self._call(method, resource_uri, fileobj, {"Content-Type": content_type})
+
+    def download(self, resource_uri, fileobj, accept="application/octet-stream"):
+        """
+        ``GET``s the resource as is, without any conversion, writing the
+        response body to the file object as it arrives. Returns the
+        response headers.
+        """
+        response_header, response_content = self._call("GET", resource_uri, headers={"Accept": accept}, stream=True, decode=False)
 
-        # Check if there is an error:
-        if response_header["status"] == "400":
-            raise XeroClientBadRequestException(response_content)
-        elif response_header["status"] == "404":
-            raise XeroClientNotFoundException()
-        elif response_header["status"] == "501":
-            raise XeroClientNotImplementedException(response_content)
-        elif response_header["status"] != "200":
-            raise XeroClientUnknownException(response_content)
-
-        # Convert the data into a JSON object:
-        json_string = xml2json.xml2json(response_content)
-
-        # Convert the json_string to a Python dictionary and return:
-        return json.loads(json_string)
+        # Write the body chunk by chunk:
+        for chunk in response_content:
+            fileobj.write(chunk)
+        return response_header
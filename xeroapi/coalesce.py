@@ -0,0 +1,62 @@
+"""
+Provides coalescing of concurrent identical calls.
+"""
+
+import sys
+import threading
+
+class _Call:
+    """
+    Holds the outcome of an in-flight call.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Makes concurrent calls with the same key share one execution: the
+    first caller runs the function, the others wait for and receive its
+    result (or exception).
+
+    The result is shared, not copied, so it must be treated as read only.
+    """
+
+    def __init__(self):
+        """
+        Constructs a new :class:`SingleFlight` instance.
+        """
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args):
+        """
+        Returns ``function(*args)``, or the result of the in-flight call
+        with the same key if there is one.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        # Wait for the leader:
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error[1]
+            return call.result
+
+        # Lead the call:
+        try:
+            call.result = function(*args)
+            return call.result
+        except:
+            call.error = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
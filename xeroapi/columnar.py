@@ -0,0 +1,319 @@
+"""
+Provides a compact columnar export of invoices and their line items.
+
+The file holds two tables, ``invoices`` and ``line_items``, stored
+column by column:
+
+- amounts and quantities as little endian 64 bit fixed point integers
+  (eg. cents for a scale of 2),
+- dates as 64 bit days since 1970-01-01,
+- codes (types, statuses, currencies, accounts, tax types) as 32 bit
+  indexes into a per column dictionary of distinct values,
+- identifiers and descriptions as UTF-8 bytes, one after the other, and
+  the 64 bit offsets where each value ends, after a leading ``0``.
+
+Missing values are ``NULL`` (the smallest 64 bit integer), ``-1`` and an
+end offset stored as ``-end - 1`` respectively. Each line item refers to
+its invoice by row number. The file starts with a magic string and the
+offset and length of a JSON directory, found at the end, which gives the
+row counts and, for each column, its type, scale, offsets and
+dictionary. Columns are 8 byte aligned, so they can be scanned straight
+from a memory map, eg. with :class:`ColumnarReader` or ``numpy.memmap``.
+"""
+
+from decimal import Decimal
+from decimal import ROUND_HALF_UP
+import datetime
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import urllib
+
+MAGIC = "XEROCOL2"
+
+# Value of missing numbers and dates:
+NULL = -2 ** 63
+
+# Column types:
+FIXED = "fixed"
+DATE = "date"
+STRING = "string"
+TEXT = "text"
+ROW = "row"
+
+_HEADER = struct.Struct("<8sQQ")
+_FORMATS = {FIXED: "q", DATE: "q", STRING: "i", TEXT: "q", ROW: "q"}
+_EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+# Values kept in memory per column before being spilled to disk:
+_SPILL_SIZE = 64 * 1024
+
+# Columns of each table, as (name, type, scale):
+INVOICE_COLUMNS = [("InvoiceID", TEXT, None),
+                   ("InvoiceNumber", TEXT, None),
+                   ("Type", STRING, None),
+                   ("Status", STRING, None),
+                   ("ContactID", TEXT, None),
+                   ("CurrencyCode", STRING, None),
+                   ("Date", DATE, None),
+                   ("DueDate", DATE, None),
+                   ("SubTotal", FIXED, 2),
+                   ("TotalTax", FIXED, 2),
+                   ("Total", FIXED, 2),
+                   ("AmountDue", FIXED, 2),
+                   ("AmountPaid", FIXED, 2)]
+
+LINE_ITEM_COLUMNS = [("Invoice", ROW, None),
+                     ("Description", TEXT, None),
+                     ("AccountCode", STRING, None),
+                     ("TaxType", STRING, None),
+                     ("Quantity", FIXED, 4),
+                     ("UnitAmount", FIXED, 4),
+                     ("DiscountRate", FIXED, 2),
+                     ("LineAmount", FIXED, 2),
+                     ("TaxAmount", FIXED, 2)]
+
+def _to_fixed(value, scale):
+    """
+    Returns the string amount as a fixed point integer.
+    """
+    if value is None or value == "":
+        return NULL
+    return int((Decimal(value) * 10 ** scale).to_integral_value(ROUND_HALF_UP))
+
+def _to_days(value):
+    """
+    Returns the ISO date (or date and time) as days since the epoch.
+    """
+    if not value:
+        return NULL
+    return datetime.date(int(value[0:4]), int(value[5:7]), int(value[8:10])).toordinal() - _EPOCH
+
+class _ColumnWriter:
+    """
+    Accumulates the values of a column, spilling them to a temporary file.
+    """
+
+    def __init__(self, name, kind, scale):
+        self.name = name
+        self.kind = kind
+        self.scale = scale
+        self.count = 0
+        self.dictionary = {}
+        self._format = _FORMATS[kind]
+        self._values = []
+        self._spill = tempfile.TemporaryFile()
+        if kind == TEXT:
+            # Text values go to their own file, after their end offsets:
+            self._values.append(0)
+            self._text = tempfile.TemporaryFile()
+            self._size = 0
+
+    def append(self, value):
+        if self.kind == STRING:
+            if value is None:
+                value = -1
+            else:
+                value = self.dictionary.setdefault(value, len(self.dictionary))
+        elif self.kind == TEXT:
+            if value is None:
+                value = -self._size - 1
+            else:
+                if isinstance(value, unicode):
+                    value = value.encode("utf-8")
+                self._text.write(value)
+                self._size += len(value)
+                value = self._size
+        elif self.kind == FIXED:
+            value = _to_fixed(value, self.scale)
+        elif self.kind == DATE:
+            value = _to_days(value)
+        self._values.append(value)
+        self.count += 1
+        if len(self._values) >= _SPILL_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._spill.write(struct.pack("<%d%s" % (len(self._values), self._format), *self._values))
+        self._values = []
+
+    def copy_to(self, fileobj):
+        """
+        Writes the column to the file, 8 byte aligned, and returns its
+        directory entry.
+        """
+        self._flush()
+        padding = -fileobj.tell() % 8
+        fileobj.write("\0" * padding)
+        entry = {"type": self.kind, "offset": fileobj.tell(), "count": self.count}
+        if self.scale is not None:
+            entry["scale"] = self.scale
+        if self.kind == STRING:
+            entry["dictionary"] = sorted(self.dictionary, key=self.dictionary.get)
+        self._spill.seek(0)
+        shutil.copyfileobj(self._spill, fileobj)
+        self._spill.close()
+        if self.kind == TEXT:
+            fileobj.write("\0" * (-fileobj.tell() % 8))
+            entry["data"] = fileobj.tell()
+            entry["size"] = self._size
+            self._text.seek(0)
+            shutil.copyfileobj(self._text, fileobj)
+            self._text.close()
+        return entry
+
+class ColumnarWriter:
+    """
+    Provides a writer streaming invoices into a columnar file.
+    """
+
+    def __init__(self, path):
+        """
+        Constructs a new :class:`ColumnarWriter` instance writing to the
+        path once closed.
+        """
+        self.path = path
+        self._invoices = [_ColumnWriter(*column) for column in INVOICE_COLUMNS]
+        self._line_items = [_ColumnWriter(*column) for column in LINE_ITEM_COLUMNS]
+        self.count = 0
+
+    def add(self, invoice):
+        """
+        Appends the invoice record (as parsed from a response) and its
+        line items.
+        """
+        contact = invoice.get("Contact") or {}
+        for column in self._invoices:
+            if column.name == "ContactID":
+                column.append(contact.get("ContactID"))
+            else:
+                column.append(invoice.get(column.name))
+
+        # If only one line item is there, it is not in a list:
+        lines = (invoice.get("LineItems") or {}).get("LineItem") or []
+        if isinstance(lines, dict):
+            lines = [lines]
+        for line in lines:
+            for column in self._line_items:
+                if column.kind == ROW:
+                    column.append(self.count)
+                else:
+                    column.append(line.get(column.name))
+        self.count += 1
+
+    def close(self):
+        """
+        Writes the file out, through a temporary file so that no partial
+        export is left over.
+        """
+        partial = "%s.part" % (self.path)
+        with open(partial, "wb") as fileobj:
+            fileobj.write(_HEADER.pack(MAGIC, 0, 0))
+            directory = {}
+            for table, columns in (("invoices", self._invoices), ("line_items", self._line_items)):
+                directory[table] = {"rows": columns[0].count,
+                                    "columns": dict((column.name, column.copy_to(fileobj)) for column in columns)}
+            offset = fileobj.tell()
+            data = json.dumps(directory)
+            fileobj.write(data)
+            fileobj.seek(0)
+            fileobj.write(_HEADER.pack(MAGIC, offset, len(data)))
+        os.rename(partial, self.path)
+
+class ColumnarReader:
+    """
+    Provides a reader of columnar files over a memory map.
+    """
+
+    def __init__(self, path):
+        """
+        Constructs a new :class:`ColumnarReader` instance, mapping the
+        file and reading its directory.
+        """
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, offset, length = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a columnar export: %s" % path)
+        self.directory = json.loads(self._map[offset:offset + length])
+
+    def close(self):
+        """
+        Unmaps and closes the file.
+        """
+        self._map.close()
+        self._file.close()
+
+    def rows(self, table):
+        """
+        Returns the row count of the table.
+        """
+        return self.directory[table]["rows"]
+
+    def column(self, table, name):
+        """
+        Returns the raw values of the column: fixed point integers, days,
+        dictionary indexes, text end offsets (after a leading ``0``) or
+        row numbers.
+        """
+        entry = self.directory[table]["columns"][name]
+        count = entry["count"] + 1 if entry["type"] == TEXT else entry["count"]
+        return struct.unpack_from("<%d%s" % (count, _FORMATS[entry["type"]]), self._map, entry["offset"])
+
+    def values(self, table, name):
+        """
+        Returns the values of the column as :class:`Decimal`,
+        :class:`datetime.date` or strings, with ``None`` when missing.
+        """
+        entry = self.directory[table]["columns"][name]
+        raw = self.column(table, name)
+        if entry["type"] == STRING:
+            dictionary = entry["dictionary"]
+            return [dictionary[value] if value >= 0 else None for value in raw]
+        if entry["type"] == TEXT:
+            retval = []
+            data = entry["data"]
+            start = 0
+            for end in raw[1:]:
+                if end < 0:
+                    retval.append(None)
+                    start = -end - 1
+                else:
+                    retval.append(self._map[data + start:data + end].decode("utf-8"))
+                    start = end
+            return retval
+        if entry["type"] == FIXED:
+            return [Decimal(value).scaleb(-entry["scale"]) if value != NULL else None for value in raw]
+        if entry["type"] == DATE:
+            return [datetime.date.fromordinal(value + _EPOCH) if value != NULL else None for value in raw]
+        return list(raw)
+
+def export_invoices_columnar(client, path, where=None):
+    """
+    Pages through the invoices of the client, optionally filtered by a
+    ``where`` expression, streaming them into a columnar file at the
+    path. Returns the number of invoices exported.
+
+    Pages are requested until one comes back empty.
+    """
+    writer = ColumnarWriter(path)
+    page = 1
+    while True:
+        # Paged requests return the line items with the invoices:
+        query = {"page": page}
+        if where:
+            query["where"] = where
+        response = client.get("Invoices?%s" % (urllib.urlencode(query)))
+        if not response["Response"].get("Invoices"):
+            break
+        records = response["Response"]["Invoices"]["Invoice"]
+        if isinstance(records, dict):
+            records = [records]
+        for record in records:
+            writer.add(record)
+        page += 1
+    writer.close()
+    return writer.count
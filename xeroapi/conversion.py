@@ -0,0 +1,92 @@
+"""
+Provides the conversion of XERO date and amount strings into Python
+values.
+
+XERO sends dates in a few fixed ISO layouts (``2011-09-20``,
+``2011-09-20T00:00:00`` and ``2011-09-20T10:12:42.753``), which are
+sliced apart rather than handed to ``strptime``. Pages of records repeat
+the same dates and amounts over and over, so the converted values, which
+are immutable, are memoized.
+"""
+
+from decimal import Decimal
+import datetime
+
+# Layout of the dates set by the client:
+DATE_FORMAT = "%Y-%m-%d"
+
+# Distinct values memoized per conversion before the memo is reset:
+_MEMO_SIZE = 4096
+
+_DATES = {}
+_AMOUNTS = {}
+
+def _parse_date(value):
+    """
+    Returns the XERO date string as a :class:`datetime.datetime`.
+
+    Raises ValueError if the date is in an unknown layout.
+    """
+    length = len(value)
+    if length == 10 and value[4] == "-" and value[7] == "-":
+        return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+    if length >= 19 and value[10] == "T" and value[13] == ":" and value[16] == ":":
+        microsecond = 0
+        if length > 20 and value[19] == "." and value[20:].isdigit():
+            microsecond = int(value[20:26].ljust(6, "0"))
+        elif length != 19:
+            raise ValueError("Date is in an unknown layout: %s" % value)
+        return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                 int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                                 microsecond)
+    return datetime.datetime.strptime(value, DATE_FORMAT)
+
+def _memoized(memo, convert, value):
+    """
+    Returns the converted value, from the memo if it has been seen.
+    """
+    result = memo.get(value)
+    if result is None:
+        result = convert(value)
+        if len(memo) >= _MEMO_SIZE:
+            memo.clear()
+        memo[value] = result
+    return result
+
+def parse_date(value):
+    """
+    Returns the XERO date string as a :class:`datetime.datetime`, or None
+    if it is empty.
+    """
+    if not value:
+        return None
+    return _memoized(_DATES, _parse_date, value)
+
+def parse_amount(value):
+    """
+    Returns the XERO amount string as a :class:`Decimal`, or None if it is
+    empty.
+    """
+    if not value:
+        return None
+    return _memoized(_AMOUNTS, Decimal, value)
+
+def convert_records(records, dates=(), amounts=()):
+    """
+    Converts the date and amount fields of a page of records in one pass
+    and returns, for each record, a dictionary of ``(string, value)`` by
+    field name.
+    """
+    retval = []
+    for record in records:
+        converted = {}
+        for field in dates:
+            value = record.get(field)
+            if value:
+                converted[field] = (value, _DATES.get(value) or parse_date(value))
+        for field in amounts:
+            value = record.get(field)
+            if value:
+                converted[field] = (value, _AMOUNTS.get(value) or parse_amount(value))
+        retval.append(converted)
+    return retval
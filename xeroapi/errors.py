@@ -0,0 +1,49 @@
+"""
+Provides the exceptions raised by the XERO API client.
+"""
+
+class XeroClientRequestException(Exception):
+    """
+    Indicates that there is a problem with the XERO API client
+    request.
+    """
+    pass
+
+class XeroClientBadRequestException(Exception):
+    """
+    Indicates that the request has failed Xero validation.
+    """
+    pass
+
+class XeroClientNotFoundException(Exception):
+    """
+    Indicates that the reference object (either by ID or Number) does not exist.
+    """
+    pass
+
+class XeroClientNotImplementedException(Exception):
+    """
+    Indicates that the endpoint doesn't accept the attempted method.
+    """
+    pass
+
+class XeroClientUnknownException(Exception):
+    """
+    Indicates that there occured an unknown exception due to unknown
+    status code.
+    """
+    pass
+
+class XeroClientCircuitOpenException(XeroClientRequestException):
+    """
+    Indicates that the request has not been sent because the endpoint
+    has been failing (see :class:`CircuitBreakerStage`).
+    """
+    pass
+
+class XeroClientCancelledException(Exception):
+    """
+    Indicates that the request has been given up, ie. the hedge of a
+    call which has already been answered (see :class:`HedgeStage`).
+    """
+    pass
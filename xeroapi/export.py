@@ -0,0 +1,107 @@
+"""
+Provides bulk export of XERO documents to disk.
+"""
+
+from bulk import run_batches
+from ratelimit import RateBudget
+import hashlib
+import json
+import os
+import threading
+
+# Name of the file recording the checksums of the exported files:
+MANIFEST = "manifest.json"
+
+class _HashingWriter:
+    """
+    Wraps a file object, keeping the SHA-1 of what is written to it.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha1 = hashlib.sha1()
+
+    def write(self, data):
+        self.sha1.update(data)
+        self.fileobj.write(data)
+
+def file_sha1(path, chunk_size=64 * 1024):
+    """
+    Returns the SHA-1 of the file, read chunk by chunk.
+    """
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as fileobj:
+        for chunk in iter(lambda: fileobj.read(chunk_size), ""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+class _Manifest:
+    """
+    Provides the checksums of the files exported into a directory.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST)
+        self.lock = threading.Lock()
+        self.checksums = {}
+        if os.path.exists(self.path):
+            with open(self.path) as fileobj:
+                self.checksums = json.load(fileobj)
+
+    def matches(self, directory, filename):
+        """
+        Tells whether the file exists with the recorded checksum.
+        """
+        path = os.path.join(directory, filename)
+        with self.lock:
+            checksum = self.checksums.get(filename)
+        return checksum is not None and os.path.exists(path) and file_sha1(path) == checksum
+
+    def record(self, filename, checksum):
+        """
+        Records the checksum, rewriting the manifest atomically.
+        """
+        with self.lock:
+            self.checksums[filename] = checksum
+            with open("%s.part" % (self.path), "w") as fileobj:
+                json.dump(self.checksums, fileobj)
+            os.rename("%s.part" % (self.path), self.path)
+
+def export_invoice_pdfs(client, invoice_ids, directory, workers=4, budget=None):
+    """
+    Writes the PDFs of the invoices into the directory as
+    ``<InvoiceID>.pdf``, fetching them concurrently on ``workers``
+    threads within the :class:`RateBudget`.
+
+    The export is resumable: files already exported, whose checksum
+    matches the one recorded in the directory's manifest, are skipped.
+    Returns a dictionary by invoice ID of ``"exported"``, ``"skipped"``
+    or the exception which failed the export.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    manifest = _Manifest(directory)
+    budget = budget or RateBudget()
+
+    def export(invoice_id):
+        filename = "%s.pdf" % (invoice_id)
+        if manifest.matches(directory, filename):
+            return "skipped"
+
+        # Stream into a temporary file so that no partial file is left over:
+        path = os.path.join(directory, filename)
+        partial = "%s.part" % (path)
+        budget.acquire()
+        try:
+            with open(partial, "wb") as fileobj:
+                writer = _HashingWriter(fileobj)
+                client.download("Invoices/%s" % (invoice_id), writer, "application/pdf")
+            os.rename(partial, path)
+        except:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        manifest.record(filename, writer.sha1.hexdigest())
+        return "exported"
+
+    return dict(run_batches(sorted(set(invoice_ids)), export, workers))
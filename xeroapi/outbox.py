@@ -0,0 +1,269 @@
+"""
+Provides a durable write-behind outbox for XERO API writes.
+
+Writes are journalled into a local SQLite database and returned from
+immediately; an :class:`OutboxWorker` drains the journal in batched,
+rate limited envelopes, retrying transient failures. Entries caught
+in-flight by a crash are sent again on restart, and those left in-flight
+by a failing worker once their lease is over, so delivery is at least
+once.
+"""
+
+from bulk import envelope_results
+from client import XeroClientBadRequestException
+from client import XeroClientNotFoundException
+from client import XeroClientNotImplementedException
+from ratelimit import RateBudget
+from resources import XContact
+from resources import XInvoice
+from resources import XItem
+import json
+import sqlite3
+import threading
+import time
+
+# XERO resource names of the entities which can be journalled:
+_RESOURCES = {XInvoice: "Invoice",
+              XItem: "Item",
+              XContact: "Contact"}
+
+# Failures which will not go away by retrying:
+_PERMANENT_ERRORS = (XeroClientBadRequestException,
+                     XeroClientNotFoundException,
+                     XeroClientNotImplementedException)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    resource TEXT NOT NULL,
+    xml TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+"""
+
+def _error(e):
+    """
+    Returns the exception as a journalled error.
+    """
+    return {"Error": type(e).__name__, "Message": str(e)}
+
+class Outbox:
+    """
+    Provides a SQLite journal of pending XERO writes.
+    """
+
+    class Status:
+        PENDING = "PENDING"
+        SENDING = "SENDING"
+        DONE = "DONE"
+        FAILED = "FAILED"
+
+        @classmethod
+        def get_all_types(cls):
+            return [cls.PENDING, cls.SENDING, cls.DONE, cls.FAILED]
+
+    def __init__(self, path, max_attempts=5, backoff=2.0, lease=300.0):
+        """
+        Constructs a new :class:`Outbox` on the SQLite database file.
+
+        Failed sends are retried ``max_attempts`` times, waiting
+        ``backoff`` seconds doubled after each attempt. Entries left
+        in-flight by a previous process are put back to pending, those
+        still in-flight ``lease`` seconds after being claimed (ie. their
+        outcome could not be stored) are claimed again.
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+            self._connection.execute("UPDATE outbox SET status = ? WHERE status = ?",
+                                     (Outbox.Status.PENDING, Outbox.Status.SENDING))
+            self._connection.commit()
+
+    def enqueue(self, entity):
+        """
+        Journals the :class:`XInvoice`, :class:`XItem` or :class:`XContact`
+        to be posted and returns the entry identifier.
+        """
+        resource = _RESOURCES.get(type(entity))
+        if resource is None:
+            raise ValueError("Entity can not be journalled: %s" % type(entity).__name__)
+        xml = entity.to_xml()
+        with self._lock:
+            cursor = self._connection.execute("INSERT INTO outbox (resource, xml, status, next_attempt) VALUES (?, ?, ?, ?)",
+                                              (resource, xml, Outbox.Status.PENDING, time.time()))
+            self._connection.commit()
+            return cursor.lastrowid
+
+    def status(self, entry_id):
+        """
+        Returns the status of the entry and its result: the XERO
+        response of the entity once done, the error once failed.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT status, result FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            raise KeyError(entry_id)
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def wait(self, entry_id, timeout=None, poll=1.0):
+        """
+        Blocks until the entry is done or failed, or until the timeout
+        expires, and returns its status and result.
+
+        Completions in this process wake the caller immediately, those
+        of other processes are noticed by polling.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                status, result = self.status(entry_id)
+                if status in (Outbox.Status.DONE, Outbox.Status.FAILED):
+                    return status, result
+                delay = poll
+                if deadline is not None:
+                    delay = min(delay, deadline - time.time())
+                    if delay <= 0:
+                        return status, result
+                self._condition.wait(delay)
+
+    def claim(self, limit):
+        """
+        Marks up to ``limit`` due entries of the same resource as being
+        sent and returns the resource and the ``(id, xml)`` entries.
+
+        Entries being sent are due again once their lease is over.
+        """
+        with self._lock:
+            now = time.time()
+            row = self._connection.execute("SELECT resource FROM outbox WHERE status IN (?, ?) AND next_attempt <= ? ORDER BY id LIMIT 1",
+                                           (Outbox.Status.PENDING, Outbox.Status.SENDING, now)).fetchone()
+            if row is None:
+                return None, []
+            entries = self._connection.execute("SELECT id, xml FROM outbox WHERE status IN (?, ?) AND next_attempt <= ? AND resource = ? ORDER BY id LIMIT ?",
+                                               (Outbox.Status.PENDING, Outbox.Status.SENDING, now, row[0], limit)).fetchall()
+            self._connection.executemany("UPDATE outbox SET status = ?, next_attempt = ? WHERE id = ?",
+                                         [(Outbox.Status.SENDING, now + self.lease, entry[0]) for entry in entries])
+            self._connection.commit()
+            return row[0], entries
+
+    def complete(self, entry_id, result):
+        """
+        Marks the entry as done with the XERO response of the entity.
+        """
+        self._finish(entry_id, Outbox.Status.DONE, result)
+
+    def fail(self, entry_id, error, retry=True):
+        """
+        Puts the entry back for another attempt later, or marks it as
+        failed if it is not to be retried or has run out of attempts.
+        """
+        with self._lock:
+            attempts = self._connection.execute("SELECT attempts FROM outbox WHERE id = ?", (entry_id,)).fetchone()[0] + 1
+            if retry and attempts < self.max_attempts:
+                self._connection.execute("UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, result = ? WHERE id = ?",
+                                         (Outbox.Status.PENDING,
+                                          attempts,
+                                          time.time() + self.backoff * 2 ** (attempts - 1),
+                                          json.dumps(error),
+                                          entry_id))
+                self._connection.commit()
+                return
+        self._finish(entry_id, Outbox.Status.FAILED, error)
+
+    def _finish(self, entry_id, status, result):
+        """
+        Stores the final status of the entry and wakes up the waiters.
+        """
+        with self._lock:
+            self._connection.execute("UPDATE outbox SET status = ?, result = ? WHERE id = ?",
+                                     (status, json.dumps(result), entry_id))
+            self._connection.commit()
+        with self._condition:
+            self._condition.notify_all()
+
+class OutboxWorker(threading.Thread):
+    """
+    Provides a background thread which drains an :class:`Outbox`.
+    """
+
+    def __init__(self, outbox, client, batch_size=50, budget=None, interval=1.0):
+        """
+        Constructs a new :class:`OutboxWorker` instance posting batches of
+        up to ``batch_size`` entities through the client, within the
+        :class:`RateBudget` and checking for work every ``interval``
+        seconds when idle.
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.outbox = outbox
+        self.client = client
+        self.batch_size = batch_size
+        self.budget = budget or RateBudget()
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """
+        Asks the worker to stop after the current batch.
+        """
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                drained = self.drain()
+            except Exception:
+                # Keep the worker alive, ie. through database errors, and
+                # try again after the interval:
+                drained = 0
+            if not drained:
+                self._stopped.wait(self.interval)
+
+    def drain(self):
+        """
+        Sends one batch and returns the number of entries it held.
+        """
+        resource, entries = self.outbox.claim(self.batch_size)
+        if not entries:
+            return 0
+
+        # Post the envelope, asking for the outcome of each entity:
+        self.budget.acquire()
+        envelope = "<%ss>%s</%ss>" % (resource, "".join([entry[1] for entry in entries]), resource)
+        try:
+            response = self.client.post("%ss?SummarizeErrors=false" % (resource), envelope)
+        except Exception, e:
+            retry = not isinstance(e, _PERMANENT_ERRORS)
+            for entry in entries:
+                self.outbox.fail(entry[0], _error(e), retry)
+            return len(entries)
+
+        # The results are in the order of the envelope:
+        finished = set()
+        error = {"Error": "MissingResult", "Message": "Response holds no result for the entry"}
+        try:
+            for entry, (ok, result) in zip(entries, envelope_results(response, resource)):
+                if ok:
+                    self.outbox.complete(entry[0], result)
+                else:
+                    self.outbox.fail(entry[0], result, False)
+                finished.add(entry[0])
+        except Exception, e:
+            error = _error(e)
+
+        # Put the entries left without an outcome back for a retry, ie.
+        # when the response is not shaped as expected:
+        for entry in entries:
+            if entry[0] not in finished:
+                self.outbox.fail(entry[0], error)
+        return len(entries)
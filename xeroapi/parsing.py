@@ -0,0 +1,169 @@
+"""
+Provides the parsers of XERO API responses.
+
+All parsers return the dictionary structure ``xml2json`` produces for
+XML responses, which is what the resource classes expect.
+"""
+
+import datetime
+import json
+import re
+import xml2json
+
+# Matches the Microsoft style dates Xero uses in JSON responses, ie.
+# "/Date(1316476800000+0000)/":
+_JSON_DATE = re.compile(r"^/Date\((-?\d+)([+-]\d{4})?\)/$")
+
+# Response bodies from this size on are parsed in the parse pool, if any:
+PARSE_THRESHOLD = 1024 * 1024
+
+# Collection names which can not be singularized by dropping the trailing "s":
+_SINGULAR_NAMES = {"Addresses": "Address",
+                   "Tracking": "TrackingCategory"}
+
+def _singularize(name):
+    """
+    Returns the XML element name of a single item of the named collection.
+    """
+    if name in _SINGULAR_NAMES:
+        return _SINGULAR_NAMES[name]
+    elif name.endswith("ies"):
+        return "%sy" % (name[:-3])
+    elif name.endswith("s"):
+        return name[:-1]
+    return name
+
+def _json_scalar(value):
+    """
+    Converts a JSON scalar into the string XML would have carried.
+    """
+    if value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    elif isinstance(value, basestring):
+        match = _JSON_DATE.match(value)
+        if match:
+            milliseconds = int(match.group(1))
+            date = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=milliseconds)
+            if date.microsecond:
+                return "%s.%03d" % (date.strftime("%Y-%m-%dT%H:%M:%S"), date.microsecond / 1000)
+            return date.strftime("%Y-%m-%dT%H:%M:%S")
+    return value
+
+def json_to_internal(value):
+    """
+    Reshapes a decoded XERO JSON response into the dictionary structure
+    ``xml2json`` produces for the equivalent XML response.
+
+    Collections become ``{"Invoices": {"Invoice": [...]}}`` (or a single
+    dictionary when there is only one item), empty collections are
+    dropped and scalars are converted to the strings XML would carry.
+    Numbers are expected to be decoded as strings already.
+    """
+    if isinstance(value, dict):
+        retval = {}
+        for key, item in value.iteritems():
+            if isinstance(item, list):
+                # Empty collections are not rendered in XML:
+                if not item:
+                    continue
+                items = [json_to_internal(i) for i in item]
+                retval[key] = {_singularize(key): items if len(items) > 1 else items[0]}
+            else:
+                retval[key] = json_to_internal(item)
+        return retval
+    return _json_scalar(value)
+
+def parse_xml(content):
+    """
+    Parses an XML response body into a Python dictionary.
+    """
+    # Convert the data into a JSON object:
+    json_string = xml2json.xml2json(content)
+
+    # Convert the json_string to a Python dictionary and return:
+    return json.loads(json_string)
+
+def parse_xml_compact(content):
+    """
+    Parses an XML response body into a Python dictionary using less
+    memory: the elements are converted directly, without going through
+    a JSON string, and equal tags and short values share one string.
+    """
+    return xml2json.xml2internal(content, memo={})
+
+def parse_xml_projected(content, projection, compact=False):
+    """
+    Parses an XML response body into a Python dictionary, keeping only
+    the projected fields: ``projection`` maps element names (ie.
+    ``Invoice``) to the names of the child elements to keep, the other
+    children are skipped without being converted.
+    """
+    return xml2json.xml2internal(content, memo={} if compact else None, projection=projection)
+
+def project(value, projection):
+    """
+    Returns the parsed response, keeping only the projected fields (see
+    :func:`parse_xml_projected`). This is for responses, like JSON ones,
+    which can not be projected while they are parsed.
+    """
+    return _project(value, projection, None)
+
+def _project(value, projection, keep):
+    """
+    Returns the value of an element keeping only the ``keep`` children,
+    if any, and projecting the children by their own entries, the way
+    the XML parser does.
+    """
+    if isinstance(value, list):
+        return [_project(item, projection, keep) for item in value]
+    if not isinstance(value, dict):
+        return value
+    retval = dict((key, _project(item, projection, projection.get(key)))
+                  for key, item in value.iteritems() if keep is None or key in keep)
+
+    # Elements left without children are empty, as in XML:
+    if keep is not None and not retval:
+        return None
+    return retval
+
+def parse_json(content):
+    """
+    Parses a JSON response body into a Python dictionary shaped like
+    the one :func:`parse_xml` returns for the same resource.
+
+    Numbers are kept as their literal strings, just like in XML, so
+    that amounts can be turned into :class:`Decimal` without loss.
+    """
+    return {"Response": json_to_internal(json.loads(content, parse_float=str, parse_int=str))}
+
+def parse_json_or_xml(content):
+    """
+    Parses a response body which claims to be JSON, falling back to
+    XML when it fails to decode.
+    """
+    try:
+        return parse_json(content)
+    except ValueError:
+        return parse_xml(content)
+
+def parse_xml_stream(fileobj, compact=False, chunk_size=64 * 1024):
+    """
+    Parses an XML response body, read from a file object (ie. the one
+    :meth:`Client.get_stream` returns) ``chunk_size`` bytes at a time,
+    into a Python dictionary.
+    """
+    return parse_xml_chunks(iter(lambda: fileobj.read(chunk_size), ""), compact)
+
+def parse_xml_chunks(chunks, compact=False, projection=None):
+    """
+    Parses an XML response body, given as an iterable of string chunks,
+    into a Python dictionary. The chunks are fed to the parser as they
+    arrive so that the complete body is never held in memory.
+
+    In ``compact`` mode equal tags and short values share one string.
+    Only the fields of the ``projection``, if any, are kept (see
+    :func:`parse_xml_projected`).
+    """
+    return xml2json.chunks2internal(chunks, memo={} if compact else None, projection=projection)
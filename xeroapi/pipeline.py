@@ -0,0 +1,620 @@
+"""
+Provides the request pipeline of the XERO API client.
+
+Every request is described by a :class:`Call` and handed down a chain
+of stages, each of which is a callable taking the call and the next
+handler of the chain::
+
+    def stage(call, proceed):
+        # ... before
+        result = proceed(call)
+        # ... after
+        return result
+
+The innermost handler sends the request and returns the response
+headers and content. Stages which are not enabled are simply not in the
+chain, so they cost nothing.
+
+Signing and building model objects are not stages. Requests are signed
+by the innermost handler as they are sent, since ``httplib2`` requests
+are signed by ``oauth2.Client`` itself, and a retried or hedged request
+needs a fresh nonce anyway. The resources (ie. :class:`XInvoice`) build
+their models from the decoded dictionaries, whose shape differs by
+resource. Stages therefore see unsigned calls and, once decoded,
+dictionaries.
+"""
+
+from errors import XeroClientBadRequestException
+from errors import XeroClientCancelledException
+from errors import XeroClientCircuitOpenException
+from errors import XeroClientNotFoundException
+from errors import XeroClientNotImplementedException
+from errors import XeroClientRequestException
+from errors import XeroClientUnknownException
+from parsing import PARSE_THRESHOLD
+from parsing import parse_json_or_xml
+from parsing import parse_xml
+from parsing import parse_xml_chunks
+from parsing import parse_xml_compact
+from parsing import parse_xml_projected
+from parsing import project
+from collections import deque
+import copy
+import Queue
+import sys
+import threading
+import time
+
+class Call:
+    """
+    Describes a request going down the pipeline.
+    """
+
+    def __init__(self, method, resource_uri, body=None, headers=None, stream=False, decode=True, tenant=None,
+                 projection=None, pooled=False):
+        """
+        Constructs a new :class:`Call` instance.
+
+        ``stream`` asks for the response content as an iterator of
+        chunks, ``decode`` for it to be parsed into a Python dictionary,
+        keeping only the fields of the ``projection`` if any (see
+        :func:`parse_xml_projected`). ``pooled`` tells that the call is
+        sent through the pooled streaming transport, which may send it
+        from many threads at once.
+        """
+        self.method = method
+        self.resource_uri = resource_uri
+        self.body = body
+        self.headers = headers
+        self.stream = stream
+        self.decode = decode
+        self.tenant = tenant
+        self.projection = projection
+        self.pooled = pooled
+        # Hedged duplicates are sent, not shared:
+        self.hedged = False
+        # Set (a threading.Event) by stages which may give the call up:
+        self.cancelled = None
+
+    @property
+    def key(self):
+        """
+        Returns the key identifying identical calls.
+        """
+        projection = None
+        if self.projection:
+            projection = tuple(sorted((element, tuple(sorted(fields))) for element, fields in self.projection.iteritems()))
+        return (self.tenant, self.method, self.resource_uri, projection)
+
+    @property
+    def replayable(self):
+        """
+        Tells whether the call can be sent again, ie. its body is not a
+        stream which has been consumed.
+        """
+        return self.body is None or isinstance(self.body, basestring)
+
+def cancellable(chunks, cancelled):
+    """
+    Yields the chunks of a streamed body until the ``cancelled`` event is
+    set, then closes them, dropping the connection, and raises
+    :class:`XeroClientCancelledException`.
+    """
+    chunks = iter(chunks)
+    try:
+        for chunk in chunks:
+            if cancelled.is_set():
+                raise XeroClientCancelledException("Call is cancelled")
+            yield chunk
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+class Pipeline:
+    """
+    Chains the stages in front of the handler which sends the request.
+    """
+
+    def __init__(self, stages, send):
+        """
+        Constructs a new :class:`Pipeline` of the stages, outermost first.
+        """
+        self.stages = list(stages)
+        handler = send
+        for stage in reversed(self.stages):
+            handler = self._bind(stage, handler)
+        self._handler = handler
+
+    @staticmethod
+    def _bind(stage, proceed):
+        return lambda call: stage(call, proceed)
+
+    def __call__(self, call):
+        return self._handler(call)
+
+def check_status(response_header, response_content):
+    """
+    Raises the exception matching the response status, if it is not a
+    success.
+    """
+    if response_header["status"] == "400":
+        raise XeroClientBadRequestException(response_content)
+    elif response_header["status"] == "404":
+        raise XeroClientNotFoundException(response_content)
+    elif response_header["status"] == "501":
+        raise XeroClientNotImplementedException(response_content)
+    elif response_header["status"] != "200":
+        raise XeroClientUnknownException(response_content)
+
+class CheckStage:
+    """
+    Turns error responses into exceptions.
+    """
+
+    def __call__(self, call, proceed):
+        response_header, response_content = proceed(call)
+        check_status(response_header, response_content)
+        return response_header, response_content
+
+class DecodeStage:
+    """
+    Parses the response content into a Python dictionary.
+
+    JSON is only trusted when the server says so; anything else,
+    including a JSON body which fails to decode, falls back to the XML
+    parser. Bodies of ``parse_threshold`` bytes or more are parsed in the
+    ``parse_pool`` (a ``multiprocessing.Pool``), if any; streamed bodies
+    are then read in full rather than parsed as they arrive. In
+    ``compact`` mode XML is parsed to share repeated strings.
+    """
+
+    def __init__(self, parse_pool=None, parse_threshold=PARSE_THRESHOLD, compact=False):
+        self.parse_pool = parse_pool
+        self.parse_threshold = parse_threshold
+        self.compact = compact
+
+    def __call__(self, call, proceed):
+        response_header, response_content = proceed(call)
+        if not call.decode:
+            return response_header, response_content
+
+        projection = call.projection
+        parser, arguments = parse_xml_compact if self.compact else parse_xml, ()
+        if "json" in response_header.get("content-type", ""):
+            if not isinstance(response_content, basestring):
+                response_content = "".join(response_content)
+            parser = parse_json_or_xml
+        elif not isinstance(response_content, basestring):
+            # Streamed bodies are parsed as they arrive, unless they may
+            # have to go to the parse pool:
+            if self.parse_pool is None:
+                return parse_xml_chunks(response_content, self.compact, projection)
+            response_content = "".join(response_content)
+        if projection and parser is not parse_json_or_xml:
+            parser, arguments = parse_xml_projected, (projection, self.compact)
+
+        # Hand large bodies over to the parse pool:
+        if self.parse_pool is not None and len(response_content) >= self.parse_threshold:
+            result = self.parse_pool.apply(parser, (response_content,) + arguments)
+        else:
+            result = parser(response_content, *arguments)
+
+        # JSON can only be projected once parsed:
+        if projection and parser is parse_json_or_xml:
+            result = project(result, projection)
+        return result
+
+class _ReleasingChunks:
+    """
+    Passes the chunks of a streamed body on, calling ``release`` once
+    they have all been read or the iterator is closed.
+    """
+
+    def __init__(self, chunks, release):
+        self._chunks = iter(chunks)
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            return next(self._chunks)
+        except:
+            self.close()
+            raise
+
+    def close(self):
+        """
+        Stops reading, closing the chunks and calling ``release``.
+        """
+        if self._release is None:
+            return
+        release, self._release = self._release, None
+        try:
+            if hasattr(self._chunks, "close"):
+                self._chunks.close()
+        finally:
+            release()
+
+    def __del__(self):
+        self.close()
+
+class ScheduleStage:
+    """
+    Waits for the scheduler's go ahead before sending the call, holding
+    the slot until the response has arrived. Streamed bodies hold it
+    until they have been read, or closed.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def __call__(self, call, proceed):
+        self.scheduler.acquire(call.tenant)
+        try:
+            response_header, response_content = proceed(call)
+        except:
+            self.scheduler.release(call.tenant)
+            raise
+        if isinstance(response_content, basestring):
+            self.scheduler.release(call.tenant)
+            return response_header, response_content
+        return response_header, _ReleasingChunks(response_content, lambda: self.scheduler.release(call.tenant))
+
+class QuotaStage:
+    """
+    Records each request sent in a :class:`QuotaTracker`.
+    """
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def __call__(self, call, proceed):
+        self.tracker.record(call.tenant)
+        return proceed(call)
+
+class SingleFlightStage:
+    """
+    Makes concurrent identical decoded ``GET``s share one request (see
+    :class:`SingleFlight`).
+    """
+
+    def __init__(self, single_flight):
+        self.single_flight = single_flight
+
+    def __call__(self, call, proceed):
+        if call.method != "GET" or not call.decode or call.hedged:
+            return proceed(call)
+        try:
+            return self.single_flight.do(call.key, proceed, call)
+        except XeroClientCancelledException:
+            # The shared call may have been given up by another caller:
+            if call.cancelled is not None and call.cancelled.is_set():
+                raise
+            return proceed(call)
+
+class CacheStage:
+    """
+    Caches decoded ``GET`` results for ``ttl`` seconds. Calls of a
+    tenant which change data (``PUT``, ``POST`` and ``DELETE``) drop the
+    tenant's cached results; raw ``GET``s (PDFs, downloads, streams) go
+    through as they are.
+
+    Cached results are shared, so they must be treated as read only.
+    """
+
+    # Methods which change data on XERO:
+    WRITES = ("PUT", "POST", "DELETE")
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, call, proceed):
+        if call.method in self.WRITES:
+            with self._lock:
+                for key in [key for key in self._entries if key[0] == call.tenant]:
+                    del self._entries[key]
+            return proceed(call)
+        if call.method != "GET" or not call.decode:
+            return proceed(call)
+
+        # Serve from the cache while fresh:
+        with self._lock:
+            entry = self._entries.get(call.key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        result = proceed(call)
+        with self._lock:
+            self._entries[call.key] = (time.time() + self.ttl, result)
+        return result
+
+class RetryStage:
+    """
+    Sends failed calls again, up to ``attempts`` times in all, waiting
+    ``backoff`` seconds doubled after each attempt.
+
+    Only calls of the given methods, and only failures which may go away
+    (request errors and unknown statuses), are retried.
+    """
+
+    def __init__(self, attempts=3, backoff=1.0, methods=("GET",),
+                 errors=(XeroClientRequestException, XeroClientUnknownException)):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.methods = methods
+        self.errors = errors
+
+    def __call__(self, call, proceed):
+        if call.method not in self.methods or not call.replayable:
+            return proceed(call)
+        attempt = 1
+        while True:
+            try:
+                return proceed(call)
+            except self.errors:
+                if attempt >= self.attempts:
+                    raise
+            time.sleep(self.backoff * 2 ** (attempt - 1))
+            attempt += 1
+
+class MetricsStage:
+    """
+    Counts the calls, their failures and their time by method.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, call, proceed):
+        started = time.time()
+        failed = True
+        try:
+            result = proceed(call)
+            failed = False
+            return result
+        finally:
+            elapsed = time.time() - started
+            with self._lock:
+                metrics = self._metrics.setdefault(call.method, {"calls": 0, "failures": 0, "seconds": 0.0})
+                metrics["calls"] += 1
+                metrics["failures"] += failed
+                metrics["seconds"] += elapsed
+
+    def snapshot(self):
+        """
+        Returns a copy of the metrics by method.
+        """
+        with self._lock:
+            return dict((method, dict(metrics)) for method, metrics in self._metrics.iteritems())
+
+class HedgeStage:
+    """
+    Hedges decoded ``GET``s against slow connections: when no response
+    has arrived after the ``percentile`` of the recent response times,
+    the call is sent once more (on another pooled connection) and the
+    first response to arrive is taken. The other attempt is then
+    cancelled: it is not sent if it has not been yet, and otherwise stops
+    reading its response at the next chunk, dropping its connection.
+
+    Hedges are capped at ``ratio`` of the calls, so that they do not eat
+    into the rate limits; nothing is hedged until ``min_samples`` response
+    times are known. Hedges go down the rest of the pipeline, so they are
+    scheduled and counted like any other call; with a ``quota``
+    :class:`QuotaTracker` (the one of the client), calls are not hedged
+    once the tenant has no calls left. Only calls sent through the pooled
+    streaming transport are hedged (see :meth:`Client.pooled`), the
+    connections of ``httplib2`` can not be used by two threads at once.
+    Hedges are not shared with in-flight calls by
+    :class:`SingleFlightStage`.
+    """
+
+    def __init__(self, percentile=95, ratio=0.05, window=200, min_samples=20, min_delay=0.01, quota=None):
+        self.percentile = percentile
+        self.ratio = ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.quota = quota
+        self._times = deque(maxlen=window)
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """
+        Returns the time to wait for a response before hedging, or None
+        while too few response times are known.
+        """
+        with self._lock:
+            if len(self._times) < self.min_samples:
+                return None
+            times = sorted(self._times)
+        return max(self.min_delay, times[min(len(times) - 1, len(times) * self.percentile // 100)])
+
+    def _spend(self, tenant):
+        """
+        Takes a hedge out of the budget, telling whether there was one
+        and the tenant has calls left for it.
+        """
+        if self.quota is not None and min(self.quota.remaining(tenant)) < 1:
+            return False
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+    def _attempt(self, call, proceed, outcomes, timed):
+        """
+        Starts a thread sending a cancellable copy of the call and
+        queueing its outcome. Returns the copy.
+        """
+        call = copy.copy(call)
+        call.cancelled = threading.Event()
+
+        def attempt():
+            started = time.time()
+            try:
+                outcomes.put((call, True, proceed(call)))
+            except:
+                outcomes.put((call, False, sys.exc_info()))
+            if timed and not call.cancelled.is_set():
+                with self._lock:
+                    self._times.append(time.time() - started)
+
+        thread = threading.Thread(target=attempt)
+        thread.daemon = True
+        thread.start()
+        return call
+
+    def __call__(self, call, proceed):
+        if call.method != "GET" or call.stream or not call.decode or not call.replayable or not call.pooled:
+            return proceed(call)
+        with self._lock:
+            # Keep a few hedges in reserve for slow spells:
+            self._tokens = min(self._tokens + self.ratio, 10.0)
+        delay = self.delay()
+        if delay is None:
+            started = time.time()
+            result = proceed(call)
+            with self._lock:
+                self._times.append(time.time() - started)
+            return result
+
+        # Wait for the first response, hedging once the delay is over:
+        outcomes = Queue.Queue()
+        attempts = [self._attempt(call, proceed, outcomes, True)]
+        try:
+            outcome = outcomes.get(timeout=delay)
+        except Queue.Empty:
+            if self._spend(call.tenant):
+                hedge = copy.copy(call)
+                hedge.hedged = True
+                attempts.append(self._attempt(hedge, proceed, outcomes, False))
+            outcome = outcomes.get()
+
+        # Take the first success; failing that, the other attempt:
+        if not outcome[1] and len(attempts) > 1:
+            other = outcomes.get()
+            if other[1]:
+                outcome = other
+
+        # Give up the attempt which lost:
+        for attempt in attempts:
+            if attempt is not outcome[0]:
+                attempt.cancelled.set()
+        if outcome[1]:
+            return outcome[2]
+        raise outcome[2][0], outcome[2][1], outcome[2][2]
+
+class _Circuit:
+    """
+    Holds the state of the circuit of an endpoint.
+    """
+
+    def __init__(self):
+        self.state = CircuitBreakerStage.CLOSED
+        self.failures = 0
+        self.opened = 0.0
+        self.probes = 0
+
+class CircuitBreakerStage:
+    """
+    Fails calls fast, with :class:`XeroClientCircuitOpenException`, to
+    an endpoint (a resource of a tenant) which keeps failing.
+
+    After ``failures`` failures in a row the circuit opens; after
+    ``reset_timeout`` seconds it lets up to ``probes`` calls through,
+    closing again on the first success and opening again on a failure.
+    Only failures which point at XERO rather than at the request
+    (request errors and unknown statuses) count.
+
+    Put it before a :class:`RetryStage` so that retries are not made
+    against an open circuit.
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, failures=5, reset_timeout=30.0, probes=1,
+                 errors=(XeroClientRequestException, XeroClientUnknownException)):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.errors = errors
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def endpoint(resource_uri):
+        """
+        Returns the endpoint of the URI, ie. ``Invoices`` for
+        ``Invoices/INV-001?page=2``.
+        """
+        return resource_uri.split("?", 1)[0].split("/", 1)[0]
+
+    def state(self, tenant, endpoint):
+        """
+        Returns the state of the circuit of the tenant's endpoint.
+        """
+        with self._lock:
+            circuit = self._circuits.get((tenant, endpoint))
+            return circuit.state if circuit else CircuitBreakerStage.CLOSED
+
+    def _admit(self, circuit):
+        """
+        Tells whether a call may go through, moving the circuit to half
+        open once the timeout is over.
+        """
+        if circuit.state == CircuitBreakerStage.OPEN:
+            if time.time() - circuit.opened < self.reset_timeout:
+                return False
+            circuit.state = CircuitBreakerStage.HALF_OPEN
+            circuit.probes = 0
+        if circuit.state == CircuitBreakerStage.HALF_OPEN:
+            if circuit.probes >= self.probes:
+                return False
+            circuit.probes += 1
+        return True
+
+    def __call__(self, call, proceed):
+        key = (call.tenant, self.endpoint(call.resource_uri))
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None:
+                circuit = self._circuits[key] = _Circuit()
+            if not self._admit(circuit):
+                raise XeroClientCircuitOpenException("Circuit is open: %s" % (key[1]))
+            probing = circuit.state == CircuitBreakerStage.HALF_OPEN
+
+        try:
+            result = proceed(call)
+        except self.errors:
+            with self._lock:
+                circuit.failures += 1
+                if probing:
+                    circuit.probes -= 1
+                if probing or circuit.failures >= self.failures:
+                    circuit.state = CircuitBreakerStage.OPEN
+                    circuit.opened = time.time()
+            raise
+        except:
+            # The request reached XERO, so the endpoint is up:
+            with self._lock:
+                self._close(circuit, probing)
+            raise
+        with self._lock:
+            self._close(circuit, probing)
+        return result
+
+    def _close(self, circuit, probing):
+        """
+        Closes the circuit after a call got through.
+        """
+        if probing:
+            circuit.probes -= 1
+        circuit.state = CircuitBreakerStage.CLOSED
+        circuit.failures = 0
@@ -0,0 +1,102 @@
+"""
+Provides a registry of XERO API clients for many organisations (tenants).
+"""
+
+from client import Client
+from client import SignatureMethod_RSA
+from ratelimit import FairScheduler
+from ratelimit import MINUTE_LIMIT
+from ratelimit import RateBudget
+from transport import ConnectionPool
+from transport import StreamingTransport
+import threading
+
+class ClientPool:
+    """
+    Provides a registry of tenants whose clients share the parsed private
+    keys (by key path), one connection pool and one fair scheduler which
+    keeps each tenant within its own rate budget.
+
+    Registering a tenant only stores its credentials; its client is
+    created the first time it is asked for.
+    """
+
+    def __init__(self, xero_api_url="https://api.xero.com/api.xro/2.0/",
+                 concurrency=8, calls=MINUTE_LIMIT, period=60.0, timeout=None,
+                 **client_options):
+        """
+        Constructs a new :class:`ClientPool` instance.
+
+        At most ``concurrency`` calls are in flight across all tenants,
+        and each tenant makes at most ``calls`` per ``period`` seconds.
+        Any other keyword arguments are passed to each :class:`Client`;
+        clients are streaming unless told otherwise.
+        """
+        self._xero_api_url = xero_api_url
+        self._client_options = client_options
+        # Only the streaming transport uses the shared connection pool:
+        self._client_options.setdefault("streaming", True)
+        self._credentials = {}
+        self._clients = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        self.transport = StreamingTransport(pool=ConnectionPool(maxsize=concurrency, timeout=timeout))
+        self.scheduler = FairScheduler(concurrency, lambda: RateBudget(calls, period))
+
+    def signature_method(self, key_path):
+        """
+        Returns the shared signature method for the private key file.
+        """
+        with self._lock:
+            method = self._keys.get(key_path)
+            if method is None:
+                method = self._keys[key_path] = SignatureMethod_RSA(key_path)
+            return method
+
+    def add(self, tenant, access_token, access_secret, cert_filepath):
+        """
+        Registers (or re-registers) a tenant.
+        """
+        with self._lock:
+            self._credentials[tenant] = (access_token, access_secret, cert_filepath)
+            self._clients.pop(tenant, None)
+
+    def remove(self, tenant):
+        """
+        Unregisters a tenant.
+        """
+        with self._lock:
+            del self._credentials[tenant]
+            self._clients.pop(tenant, None)
+
+    def client(self, tenant):
+        """
+        Returns the client of the tenant.
+        """
+        with self._lock:
+            client = self._clients.get(tenant)
+            if client is not None:
+                return client
+            access_token, access_secret, cert_filepath = self._credentials[tenant]
+
+        # Create the client out of the lock, loading the key only once:
+        client = Client(access_token, access_secret, cert_filepath,
+                        xero_api_url=self._xero_api_url,
+                        signature_method=self.signature_method(cert_filepath),
+                        transport=self.transport,
+                        scheduler=self.scheduler,
+                        tenant=tenant,
+                        **self._client_options)
+        with self._lock:
+            return self._clients.setdefault(tenant, client)
+
+    __getitem__ = client
+
+    def __contains__(self, tenant):
+        return tenant in self._credentials
+
+    def __len__(self):
+        return len(self._credentials)
+
+    def __iter__(self):
+        return iter(list(self._credentials))
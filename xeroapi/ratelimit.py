@@ -0,0 +1,303 @@
+"""
+Provides rate limiting and fair scheduling of XERO API calls.
+"""
+
+from collections import deque
+import atexit
+import sqlite3
+import threading
+import time
+import weakref
+
+# XERO allows 60 calls per rolling minute per organisation:
+MINUTE_LIMIT = 60
+
+# ... and 5000 calls per rolling day:
+DAY_LIMIT = 5000
+
+_DAY = 24 * 60 * 60.0
+
+# Trackers with a database, closed when the interpreter exits; weakly
+# held so that trackers no longer used are not kept alive:
+_open_trackers = weakref.WeakSet()
+
+@atexit.register
+def _close_trackers():
+    for tracker in list(_open_trackers):
+        tracker.close()
+
+class RateBudget:
+    """
+    Provides a rolling window rate budget of ``calls`` per ``period``
+    seconds.
+    """
+
+    def __init__(self, calls=MINUTE_LIMIT, period=60.0):
+        """
+        Constructs a new :class:`RateBudget` instance.
+        """
+        self.calls = calls
+        self.period = period
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        """
+        Drops the calls which have left the window.
+        """
+        while self._times and self._times[0] <= now - self.period:
+            self._times.popleft()
+
+    def available(self, now=None):
+        """
+        Returns the number of calls which can be made right now.
+        """
+        now = now or time.time()
+        with self._lock:
+            self._expire(now)
+            return self.calls - len(self._times)
+
+    def delay(self, now=None):
+        """
+        Returns the seconds to wait until a call can be made.
+        """
+        now = now or time.time()
+        with self._lock:
+            self._expire(now)
+            if len(self._times) < self.calls:
+                return 0.0
+            return self._times[0] + self.period - now
+
+    def consume(self, now=None):
+        """
+        Records a call, whether or not the budget allows it.
+        """
+        with self._lock:
+            self._times.append(now or time.time())
+
+    def acquire(self):
+        """
+        Blocks until a call can be made and records it.
+        """
+        while True:
+            now = time.time()
+            with self._lock:
+                self._expire(now)
+                if len(self._times) < self.calls:
+                    self._times.append(now)
+                    return
+                delay = self._times[0] + self.period - now
+            time.sleep(delay)
+
+class FairScheduler:
+    """
+    Provides a scheduler which shares a fixed number of concurrent call
+    slots between tenants in a round robin fashion, while keeping each
+    tenant within its own :class:`RateBudget`.
+
+    A tenant which has exhausted its budget is skipped, so it can not
+    hold up the others.
+    """
+
+    def __init__(self, concurrency=8, budget_factory=RateBudget):
+        """
+        Constructs a new :class:`FairScheduler` instance.
+
+        ``budget_factory`` is called without arguments to create the
+        budget of each tenant the first time it is seen.
+        """
+        self.concurrency = concurrency
+        self._budget_factory = budget_factory
+        self._budgets = {}
+        self._waiting = {}
+        self._ring = deque()
+        self._active = 0
+        self._condition = threading.Condition()
+
+    def budget(self, tenant):
+        """
+        Returns the rate budget of the tenant.
+        """
+        with self._condition:
+            budget = self._budgets.get(tenant)
+            if budget is None:
+                budget = self._budgets[tenant] = self._budget_factory()
+            return budget
+
+    def _next(self, now):
+        """
+        Returns the first tenant in the ring whose budget allows a call
+        and the shortest delay until any tenant's budget does.
+        """
+        delay = None
+        for tenant in self._ring:
+            wait = self._budgets[tenant].delay(now)
+            if not wait:
+                return tenant, 0.0
+            delay = wait if delay is None else min(delay, wait)
+        return None, delay
+
+    def acquire(self, tenant):
+        """
+        Blocks until it is the tenant's turn to make a call.
+        """
+        budget = self.budget(tenant)
+        ticket = object()
+        with self._condition:
+            # Queue the ticket and put the tenant on the ring:
+            queue = self._waiting.setdefault(tenant, deque())
+            queue.append(ticket)
+            if len(queue) == 1:
+                self._ring.append(tenant)
+
+            while True:
+                now = time.time()
+                delay = None
+                if self._active < self.concurrency:
+                    chosen, wait = self._next(now)
+                    if chosen == tenant and queue[0] is ticket:
+                        break
+                    elif chosen is None:
+                        # Nobody is within budget, wake up when one is:
+                        delay = wait
+                self._condition.wait(delay)
+
+            # Take the slot and move the tenant to the end of the ring:
+            queue.popleft()
+            self._ring.remove(tenant)
+            if queue:
+                self._ring.append(tenant)
+            else:
+                del self._waiting[tenant]
+            budget.consume(now)
+            self._active += 1
+            self._condition.notify_all()
+
+    def release(self, tenant):
+        """
+        Returns the call slot taken by :meth:`acquire`.
+        """
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+class QuotaTracker:
+    """
+    Counts the calls of each tenant in rolling minute and day windows,
+    so that the remaining quota is known and jobs can be checked against
+    it before they start.
+
+    With a ``path``, the calls are persisted into a SQLite database every
+    ``flush_interval`` seconds, and when the tracker is closed (at the
+    latest when the interpreter exits), so the counts survive restarts.
+    Close trackers which are dropped before then.
+    """
+
+    def __init__(self, path=None, minute_limit=MINUTE_LIMIT, day_limit=DAY_LIMIT, flush_interval=5.0):
+        """
+        Constructs a new :class:`QuotaTracker` instance, loading the calls
+        of the last day from the database, if any.
+        """
+        self.minute_limit = minute_limit
+        self.day_limit = day_limit
+        self.flush_interval = flush_interval
+        self._calls = {}
+        self._unsaved = []
+        self._flushed = time.time()
+        self._lock = threading.Lock()
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS quota_calls (tenant TEXT NOT NULL, time REAL NOT NULL)")
+            self._connection.execute("DELETE FROM quota_calls WHERE time <= ?", (time.time() - _DAY,))
+            self._connection.commit()
+            for tenant, when in self._connection.execute("SELECT tenant, time FROM quota_calls ORDER BY time"):
+                self._calls.setdefault(tenant, deque()).append(when)
+            _open_trackers.add(self)
+
+    @staticmethod
+    def _trim(calls, now):
+        """
+        Drops the calls which have left the day window.
+        """
+        while calls and calls[0] <= now - _DAY:
+            calls.popleft()
+
+    def record(self, tenant, now=None):
+        """
+        Records a call of the tenant.
+        """
+        now = now or time.time()
+        with self._lock:
+            calls = self._calls.setdefault(tenant, deque())
+            calls.append(now)
+            self._trim(calls, now)
+            if self._connection is not None:
+                self._unsaved.append((tenant, now))
+                if now - self._flushed >= self.flush_interval:
+                    self._flush(now)
+
+    def flush(self):
+        """
+        Persists the calls recorded since the last flush.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._flush(time.time())
+
+    def close(self):
+        """
+        Persists the calls not flushed yet and closes the database.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._flush(time.time())
+                self._connection.close()
+                self._connection = None
+        _open_trackers.discard(self)
+
+    def _flush(self, now):
+        self._connection.executemany("INSERT INTO quota_calls (tenant, time) VALUES (?, ?)", self._unsaved)
+        self._connection.execute("DELETE FROM quota_calls WHERE time <= ?", (now - _DAY,))
+        self._connection.commit()
+        self._unsaved = []
+        self._flushed = now
+
+    def used(self, tenant, now=None):
+        """
+        Returns the calls of the tenant in the last minute and day.
+        """
+        now = now or time.time()
+        with self._lock:
+            calls = self._calls.get(tenant)
+            if not calls:
+                return 0, 0
+            self._trim(calls, now)
+            minute = 0
+            for when in reversed(calls):
+                if when <= now - 60.0:
+                    break
+                minute += 1
+            return minute, len(calls)
+
+    def remaining(self, tenant, now=None):
+        """
+        Returns the calls the tenant has left this minute and this day.
+        """
+        minute, day = self.used(tenant, now)
+        return max(self.minute_limit - minute, 0), max(self.day_limit - day, 0)
+
+    def forecast(self, tenant, items, batch_size=1, calls_per_batch=1, now=None):
+        """
+        Estimates a job of ``items`` sent ``batch_size`` at a time, each
+        batch taking ``calls_per_batch`` calls, against the tenant's
+        remaining quota. Returns a dictionary of the ``calls`` needed, the
+        ``remaining`` daily calls, whether the job ``fits`` and the least
+        ``seconds`` it takes within the minute limit.
+        """
+        calls = -(-items // batch_size) * calls_per_batch
+        minute, day = self.remaining(tenant, now)
+        return {"calls": calls,
+                "remaining": day,
+                "fits": calls <= day,
+                "seconds": max(calls - minute, 0) * 60.0 / self.minute_limit}
@@ -0,0 +1,71 @@
+"""
+Provides the warm-up of a client with the reference data of its
+organization.
+
+The organization, accounts, tax rates and branding themes are fetched
+concurrently rather than one after the other, and indexed, so that the
+first invoices are built and validated as fast as the following ones.
+Going through the client, the fetches also open its connections and, if
+it has a :class:`CacheStage`, fill the cache.
+"""
+
+from bulk import run_batches
+from resources import XAccount
+from resources import XBrandingTheme
+from resources import XOrganization
+from resources import XTaxRate
+from validation import InvoiceValidator
+
+class ReferenceData:
+    """
+    Holds the reference data of an organization and its lookup indexes.
+    """
+
+    def __init__(self, organization, accounts, tax_rates, branding_themes):
+        """
+        Constructs a new :class:`ReferenceData` instance from the
+        :class:`XOrganization` and the lists of :class:`XAccount`,
+        :class:`XTaxRate` and :class:`XBrandingTheme` instances.
+        """
+        self.organization = organization
+        self.accounts = accounts
+        self.tax_rates = tax_rates
+        self.branding_themes = branding_themes
+
+        # Index the references invoices are built with:
+        self.accounts_by_code = dict((account.code, account) for account in accounts)
+        self.accounts_by_id = dict((account.id, account) for account in accounts)
+        self.tax_rates_by_type = dict((rate.TaxType, rate) for rate in tax_rates)
+        self.branding_themes_by_name = dict((theme.Name, theme) for theme in branding_themes)
+        self._validator = None
+
+    def validator(self):
+        """
+        Returns an :class:`InvoiceValidator` for the accounts and tax
+        rates, built once.
+        """
+        if self._validator is None:
+            self._validator = InvoiceValidator(self.accounts, self.tax_rates)
+        return self._validator
+
+def warm_up(client, workers=4):
+    """
+    Fetches the reference data of the client on ``workers`` threads and
+    returns it as :class:`ReferenceData`.
+
+    The fetches go through the pooled transport of the client (see
+    :meth:`Client.pooled`). Raises the first error met if any of the
+    fetches failed.
+    """
+    client = client.pooled()
+    fetches = [("organization", XOrganization.get),
+               ("accounts", XAccount.get),
+               ("tax_rates", XTaxRate.get),
+               ("branding_themes", XBrandingTheme.get)]
+    results = dict((fetch[0], result) for fetch, result in run_batches(fetches, lambda fetch: fetch[1](client), workers))
+
+    # Raise in the order of the fetches so that failures read the same:
+    for name, get in fetches:
+        if isinstance(results[name], Exception):
+            raise results[name]
+    return ReferenceData(**results)
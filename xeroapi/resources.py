@@ -1,15 +1,151 @@
+from conversion import DATE_FORMAT as _DATE_FORMAT
+from conversion import convert_records
+from conversion import parse_amount
+from conversion import parse_date
 from decimal import Decimal
 import datetime
 import json as simplejson
 import xml2json
 
-_DATE_FORMAT = "%Y-%m-%d"
+def xml_envelope(name, entities):
+    """
+    Yields the XML of a bulk envelope (ie. ``<Invoices>...</Invoices>``)
+    of the :class:`XEntity` instances, one entity at a time.
+
+    The result can be passed to :meth:`Client.post` or :meth:`Client.put`
+    which stream it to XERO as it is produced.
+    """
+    yield "<%s>" % (name)
+    for entity in entities:
+        yield entity.to_xml()
+    yield "</%s>" % (name)
 
 class XEntity(dict):
     """
     Provides an abstract class for the `X` based XERO API Resources.
+
+    Fields set since the entity was loaded (or last marked clean) are
+    tracked, so that updates can be limited to the changed fields.
+    Changes made inside nested values are only noticed once the value is
+    set again.
     """
 
+    # The XML element name and the fields identifying an existing entity:
+    _element = None
+    _identifiers = ()
+
+    # The date and amount fields, converted once and kept with the entity:
+    _dates = ()
+    _amounts = ()
+
+    @classmethod
+    def load(cls, data):
+        """
+        Returns an entity holding the fields received from XERO, with no
+        changed fields.
+        """
+        entity = cls.__new__(cls)
+        dict.update(entity, data)
+        return entity
+
+    @classmethod
+    def projection(cls, fields):
+        """
+        Returns the projection keeping only the given fields, and the
+        identifying fields, of the entities (see :meth:`Client.get`).
+        """
+        return {cls._element: frozenset(fields) | frozenset(cls._identifiers)}
+
+    @classmethod
+    def load_all(cls, records):
+        """
+        Returns the entities of a page of records, converting their date
+        and amount fields in one pass.
+        """
+        retval = []
+        for record, converted in zip(records, convert_records(records, cls._dates, cls._amounts)):
+            entity = cls.load(record)
+            entity.__dict__["_values"] = converted
+            retval.append(entity)
+        return retval
+
+    def _converted(self, key, convert):
+        """
+        Returns the field converted into a Python value, converting it
+        only when it has changed since last time.
+        """
+        value = self.get(key)
+        if not value:
+            return None
+        converted = self.__dict__.get("_values")
+        if converted is None:
+            converted = self.__dict__["_values"] = {}
+        cached = converted.get(key)
+        if cached is not None and cached[0] == value:
+            return cached[1]
+        result = convert(value)
+        converted[key] = (value, result)
+        return result
+
+    def _fields_changed(self):
+        """
+        Returns the (mutable) set of changed field names.
+        """
+        fields = self.__dict__.get("_changed")
+        if fields is None:
+            fields = self.__dict__["_changed"] = set()
+        return fields
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._fields_changed().add(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._fields_changed().add(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def changed_fields(self):
+        """
+        Returns the names of the fields changed since the entity was
+        loaded or last marked clean.
+        """
+        return frozenset(self._fields_changed())
+
+    def mark_clean(self):
+        """
+        Forgets about the changed fields, ie. after they have been sent.
+        """
+        self._fields_changed().clear()
+
+    def changes(self):
+        """
+        Returns the identifying fields and the changed fields.
+        """
+        retval = {}
+        for key in self._identifiers:
+            if key in self:
+                retval[key] = self[key]
+        for key in self._fields_changed():
+            if key in self:
+                retval[key] = self[key]
+        return retval
+
+    def to_update_xml(self):
+        """
+        Provides the XML representation of the identifying fields and the
+        changed fields only.
+        """
+        return xml2json.json2xml(simplejson.dumps({self._element: self.changes()}))
+
     def to_xml(self):
         raise NotImplementedError
 
@@ -66,19 +202,25 @@ class XAccountType:
     EQUITY = "EQUITY"
     EXPENSE = "EXPENSE"
     FIXED = "FIXED"
+    INVENTORY = "INVENTORY"
     LIABILITY = "LIABILITY"
     NONCURRENT = "NONCURRENT"
     OTHERINCOME = "OTHERINCOME"
     OVERHEADS = "OVERHEADS"
+    PAYGLIABILITY = "PAYGLIABILITY"
     PREPAYMENT = "PREPAYMENT"
     REVENUE = "REVENUE"
     SALES = "SALES"
+    SUPERANNUATIONEXPENSE = "SUPERANNUATIONEXPENSE"
+    SUPERANNUATIONLIABILITY = "SUPERANNUATIONLIABILITY"
     TERMLIAB = "TERMLIAB"
+    WAGESEXPENSE = "WAGESEXPENSE"
 
     @staticmethod
     def humanize(atype):
         """
-        Provides a human readable format for the account type.
+        Provides a human readable format for the account type, or the
+        type itself if it is unknown.
         """
         transdict = {XAccountType.BANK : "Bank",
                      XAccountType.CURRENT : "Current Asset",
@@ -88,20 +230,26 @@ class XAccountType:
                      XAccountType.EQUITY : "Equity",
                      XAccountType.EXPENSE : "Expense",
                      XAccountType.FIXED : "Fixed Asset",
+                     XAccountType.INVENTORY : "Inventory",
                      XAccountType.LIABILITY : "Liability",
                      XAccountType.NONCURRENT : "Non-Current Asset",
                      XAccountType.OTHERINCOME : "Other Income",
                      XAccountType.OVERHEADS : "Overheads",
+                     XAccountType.PAYGLIABILITY : "PAYG Liability",
                      XAccountType.PREPAYMENT : "Pre-payment",
                      XAccountType.REVENUE : "Revenue",
                      XAccountType.SALES : "Sale",
-                     XAccountType.TERMLIAB : "Non-Current Liability"}
-        return transdict[atype]
+                     XAccountType.SUPERANNUATIONEXPENSE : "Superannuation Expense",
+                     XAccountType.SUPERANNUATIONLIABILITY : "Superannuation Liability",
+                     XAccountType.TERMLIAB : "Non-Current Liability",
+                     XAccountType.WAGESEXPENSE : "Wages Expense"}
+        return transdict.get(atype, atype)
 
     @staticmethod
     def from_string(atype):
         """
-        Translates a string represented type to enum.
+        Translates a string represented type to enum. Types XERO added
+        since are kept as they are.
         """
         transdict = {"BANK" : XAccountType.BANK,
                      "CURRENT" : XAccountType.CURRENT,
@@ -111,15 +259,20 @@ class XAccountType:
                      "EQUITY" : XAccountType.EQUITY,
                      "EXPENSE" : XAccountType.EXPENSE,
                      "FIXED" : XAccountType.FIXED,
+                     "INVENTORY" : XAccountType.INVENTORY,
                      "LIABILITY" : XAccountType.LIABILITY,
                      "NONCURRENT" : XAccountType.NONCURRENT,
                      "OTHERINCOME" : XAccountType.OTHERINCOME,
                      "OVERHEADS" : XAccountType.OVERHEADS,
+                     "PAYGLIABILITY" : XAccountType.PAYGLIABILITY,
                      "PREPAYMENT" : XAccountType.PREPAYMENT,
                      "REVENUE" : XAccountType.REVENUE,
                      "SALES" : XAccountType.SALES,
-                     "TERMLIAB" : XAccountType.TERMLIAB}
-        return transdict[atype]
+                     "SUPERANNUATIONEXPENSE" : XAccountType.SUPERANNUATIONEXPENSE,
+                     "SUPERANNUATIONLIABILITY" : XAccountType.SUPERANNUATIONLIABILITY,
+                     "TERMLIAB" : XAccountType.TERMLIAB,
+                     "WAGESEXPENSE" : XAccountType.WAGESEXPENSE}
+        return transdict.get(atype, atype)
 
 class XAccount:
     """
@@ -150,14 +303,26 @@ class XAccount:
         # Attempt to retrieve the response as a Python dict:
         response = client.get("Account")
 
-        # Iterate over the accounts:
+        # Declare the return value:
         retval = []
-        for daccount in response["Response"]["Accounts"]["Account"]:
+
+        # If no accounts, return []
+        if not response["Response"].get("Accounts"):
+            return retval
+
+        # If only one instance is returned, xml2json returns
+        # dictionary. Put the single item into a list.
+        accounts = response["Response"]["Accounts"]["Account"]
+        if isinstance(accounts, dict):
+            accounts = [accounts]
+
+        # Iterate over the accounts:
+        for daccount in accounts:
             account = XAccount(daccount["AccountID"],
                                daccount["Code"],
                                daccount["Name"],
                                XAccountType.from_string(daccount["Type"]),
-                               daccount["TaxType"],
+                               daccount.get("TaxType"),
                                daccount["Description"] if daccount.has_key("Description") else None,
                                daccount["SystemAccount"] if daccount.has_key("SystemAccount") else None,
                                daccount["EnablePaymentsToAccount"] == "true")
@@ -170,6 +335,8 @@ class XItem(XEntity):
     """
     Provides an Item class which is compatible with XERO API.
     """
+    _element = "Item"
+    _identifiers = ("ItemID", "Code")
 
     def __init__(self):
         """
@@ -284,12 +451,16 @@ class XItem(XEntity):
     #     return retval
 
     @staticmethod
-    def post(client, item):
+    def post(client, item, changed_only=False):
         """
-        Creates a new item on the XERO.
+        Creates a new item on the XERO, or updates it with the changed
+        fields only if ``changed_only`` is set.
         """
         # Post the item:
-        response = client.post("Item", item.to_xml())
+        response = client.post("Item", item.to_update_xml() if changed_only else item.to_xml())
+
+        # The changes are sent:
+        item.mark_clean()
 
         # Done, return the xitem:
         return response["Response"]
@@ -298,6 +469,8 @@ class XContact(XEntity):
     """
     Provides a contact class which is compatible with XERO API.
     """
+    _element = "Contact"
+    _identifiers = ("ContactID", "ContactNumber")
 
     class Status:
         ACTIVE = "ACTIVE"
@@ -526,6 +699,10 @@ class XInvoice(XEntity):
     """
     Provides an invoice class which is compatible with XERO API.
     """
+    _element = "Invoice"
+    _identifiers = ("InvoiceID", "InvoiceNumber")
+    _dates = ("Date", "DueDate", "UpdatedDateUTC")
+    _amounts = ("SubTotal", "TotalTax", "Total", "AmountDue", "AmountPaid")
 
     class InvoiceType:
         ACCPAY = "ACCPAY"
@@ -609,11 +786,7 @@ class XInvoice(XEntity):
         """
         Returns the invoice date.
         """
-        date = self.get("Date")
-        if date:
-            return datetime.datetime.strptime(date, _DATE_FORMAT)
-        else:
-            return None
+        return self._converted("Date", parse_date)
 
     def set_date(self, date):
         """
@@ -629,11 +802,7 @@ class XInvoice(XEntity):
         """
         Returns the invoice due date.
         """
-        date = self.get("DueDate")
-        if date:
-            return datetime.datetime.strptime(date, _DATE_FORMAT)
-        else:
-            return None
+        return self._converted("DueDate", parse_date)
 
     def set_due_date(self, date):
         """
@@ -759,11 +928,7 @@ class XInvoice(XEntity):
         """
         Returns the sub total.
         """
-        sub_total = self.get("SubTotal")
-        if sub_total:
-            return Decimal(sub_total)
-        else:
-            return None
+        return self._converted("SubTotal", parse_amount)
 
     def set_sub_total(self, sub_total):
         """
@@ -779,11 +944,7 @@ class XInvoice(XEntity):
         """
         Returns the total tax.
         """
-        total_tax = self.get("TotalTax")
-        if total_tax:
-            return Decimal(total_tax)
-        else:
-            return None
+        return self._converted("TotalTax", parse_amount)
 
     def set_total_tax(self, total_tax):
         """
@@ -799,11 +960,7 @@ class XInvoice(XEntity):
         """
         Returns the total amount.
         """
-        total = self.get("Total")
-        if total:
-            return Decimal(total)
-        else:
-            return None
+        return self._converted("Total", parse_amount)
 
     def set_total(self, total):
         """
@@ -815,6 +972,27 @@ class XInvoice(XEntity):
 
     Total = property(get_total, set_total)
 
+    @property
+    def AmountDue(self):
+        """
+        Returns the amount due.
+        """
+        return self._converted("AmountDue", parse_amount)
+
+    @property
+    def AmountPaid(self):
+        """
+        Returns the amount paid.
+        """
+        return self._converted("AmountPaid", parse_amount)
+
+    @property
+    def UpdatedDateUTC(self):
+        """
+        Returns the time of the last update, in UTC.
+        """
+        return self._converted("UpdatedDateUTC", parse_date)
+
     def get_line_items(self):
         """
         Returns the invoice line items.
@@ -845,39 +1023,45 @@ class XInvoice(XEntity):
         return xml2json.json2xml(simplejson.dumps({"Invoice": self}))
 
     @staticmethod
-    def xget(client):
+    def xget(client, projection=None):
         """
-        Returns XItem instances.
+        Returns XInvoice instances.
+
+        With a ``projection`` (see :meth:`XEntity.projection`), only
+        those fields of the invoices are parsed and loaded.
         """
         # Attempt to retrieve the response as a Python dict:
-        response = client.get("Invoice")
+        response = client.get("Invoice", projection)
 
-        # Iterate over the accounts:
+        # Declare the return value:
         retval = []
 
-        if not response["Response"].has_key("Invoices"):
+        # If no invoices, return []
+        if not response["Response"].get("Invoices"):
             return retval
 
-        #for item in response["Response"]["Invoices"]["Invoice"]:
-            #print item
-            # account = XItem(item["Code"],
-            #                 item["Description"],
-            #                 item["PurchaseDetails"]["UnitPrice"] if item.has_key("PurchaseDetails") else None,
-            #                 item["PurchaseDetails"]["AccountCode"] if item.has_key("PurchaseDetails") else None,
-            #                 item["SalesDetails"]["UnitPrice"] if item.has_key("SalesDetails") else None,
-            #                 item["SalesDetails"]["AccountCode"] if item.has_key("SalesDetails") else None)
-            # retval.append(account)
+        # If only one instance is returned, xml2json returns
+        # dictionary. Put the single item into a list.
+        invoices = response["Response"]["Invoices"]["Invoice"]
+        if isinstance(invoices, dict):
+            invoices = [invoices]
 
         # Done, return:
-        return retval
+        return XInvoice.load_all(invoices)
 
     @staticmethod
-    def xpost(client, invoice):
+    def xpost(client, invoice, changed_only=False):
         """
         Updates or Creates a new invoice on the XERO.
+
+        With ``changed_only`` set, only the invoice identifier and the
+        fields changed since it was loaded are sent.
         """
         # Post the item:
-        response = client.post("Invoice", invoice.to_xml())
+        response = client.post("Invoice", invoice.to_update_xml() if changed_only else invoice.to_xml())
+
+        # The changes are sent:
+        invoice.mark_clean()
 
         return response["Response"]
 
@@ -937,12 +1121,14 @@ class XBrandingTheme(XEntity):
             return retval
 
         # If only one instance is returned, xml2json returns
-        # dictionary. Put the single item back into a list.
-        if isinstance(response["Response"]["BrandingThemes"]["BrandingTheme"], dict):
-            response["Response"]["BrandingThemes"]["BrandingTheme"] = [response["Response"]["BrandingThemes"]["BrandingTheme"]]
+        # dictionary. Put the single item into a list, leaving the
+        # (possibly shared) response untouched:
+        items = response["Response"]["BrandingThemes"]["BrandingTheme"]
+        if isinstance(items, dict):
+            items = [items]
 
         # Iterate over the values:
-        for item in response["Response"]["BrandingThemes"]["BrandingTheme"]:
+        for item in items:
             retval.append(XBrandingTheme(item))
 
         # Done, return:
@@ -986,7 +1172,7 @@ class XTaxRate(XEntity):
         """
         Returns effective tax rate.
         """
-        return self._response.get("EffectiveTaxRate")
+        return self._response.get("EffectiveRate")
 
     @staticmethod
     def get(client):
@@ -1004,12 +1190,14 @@ class XTaxRate(XEntity):
             return retval
 
         # If only one instance is returned, xml2json returns
-        # dictionary. Put the single item back into a list.
-        if isinstance(response["Response"]["TaxRates"]["TaxRate"], dict):
-            response["Response"]["TaxRates"]["TaxRate"] = [response["Response"]["TaxRates"]["TaxRate"]]
+        # dictionary. Put the single item into a list, leaving the
+        # (possibly shared) response untouched:
+        items = response["Response"]["TaxRates"]["TaxRate"]
+        if isinstance(items, dict):
+            items = [items]
 
         # Iterate over the values:
-        for item in response["Response"]["TaxRates"]["TaxRate"]:
+        for item in items:
             retval.append(XTaxRate(item))
 
         # Done, return:
@@ -0,0 +1,163 @@
+"""
+Provides a sync orchestrator which shards the tenants across processes.
+
+Each tenant belongs to exactly one worker process, where it is synced on
+one of the process' threads through a :class:`ClientPool` shared by the
+tenants of the shard: one connection pool, one cache of private keys and
+one scheduler keeping each tenant within its rate budget. Progress and
+results are sent back to the coordinator as they happen.
+"""
+
+from pool import ClientPool
+import cPickle
+import multiprocessing
+import Queue
+import threading
+
+# Events sent by the workers to the coordinator:
+PROGRESS = "progress"
+DONE = "done"
+FAILED = "failed"
+_EXIT = "exit"
+
+def _dumps(value):
+    """
+    Returns the value pickled, raising in the calling thread if it can
+    not be rather than in the feeder thread of the queue, where the error
+    would be lost.
+    """
+    return cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+
+def _work(shard, tenants, job, threads, xero_api_url, pool_options, events):
+    """
+    Syncs the tenants of the shard on ``threads`` threads, in a worker
+    process, sending the events to the coordinator.
+    """
+    pool = ClientPool(xero_api_url, **pool_options)
+    for tenant, access_token, access_secret, cert_filepath in tenants:
+        pool.add(tenant, access_token, access_secret, cert_filepath)
+    pending = Queue.Queue()
+    for tenant in tenants:
+        pending.put(tenant[0])
+
+    def work():
+        while True:
+            try:
+                tenant = pending.get_nowait()
+            except Queue.Empty:
+                return
+            progress = lambda value: events.put((PROGRESS, tenant, _dumps(value)))
+            try:
+                result = _dumps(job(pool.client(tenant), tenant, progress))
+            except Exception, e:
+                # Exceptions do not always survive pickling, send their text:
+                events.put((FAILED, tenant, _dumps("%s: %s" % (type(e).__name__, e))))
+                continue
+            events.put((DONE, tenant, result))
+
+    workers = [threading.Thread(target=work) for i in range(min(threads, len(tenants)))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    events.put((_EXIT, shard, None))
+
+class SyncOrchestrator:
+    """
+    Provides a coordinator running a sync job for many tenants across a
+    pool of worker processes.
+
+    The job is called as ``job(client, tenant, progress)`` in a worker
+    process and its return value becomes the result of the tenant;
+    ``progress(value)`` sends any value back to the coordinator right
+    away. The job, its results and progress values must be picklable,
+    ie. the job is a module level function.
+    """
+
+    def __init__(self, job, processes=None, threads=4,
+                 xero_api_url="https://api.xero.com/api.xro/2.0/", **pool_options):
+        """
+        Constructs a new :class:`SyncOrchestrator` instance.
+
+        Tenants are sharded across ``processes`` worker processes (one per
+        core by default), each syncing ``threads`` tenants at a time. Any
+        other keyword arguments are passed to the :class:`ClientPool` of
+        each worker.
+        """
+        self.job = job
+        self.processes = processes or multiprocessing.cpu_count()
+        self.threads = threads
+        self._xero_api_url = xero_api_url
+        self._pool_options = pool_options
+        self._tenants = []
+
+    def add(self, tenant, access_token, access_secret, cert_filepath):
+        """
+        Registers a tenant to be synced.
+        """
+        self._tenants.append((tenant, access_token, access_secret, cert_filepath))
+
+    def shards(self):
+        """
+        Returns the tenants of each worker process, dealt round robin.
+        """
+        count = min(self.processes, len(self._tenants))
+        return [self._tenants[i::count] for i in range(count)]
+
+    def run(self, callback=None):
+        """
+        Syncs the tenants and returns a dictionary of ``(ok, result)`` by
+        tenant, where the result is the return value of the job or the
+        error which failed it.
+
+        ``callback(event, tenant, value)`` is called in this process for
+        each :data:`PROGRESS`, :data:`DONE` and :data:`FAILED` event as
+        it arrives.
+        """
+        events = multiprocessing.Queue()
+        shards = self.shards()
+        processes = []
+        for shard, tenants in enumerate(shards):
+            process = multiprocessing.Process(target=_work,
+                                              args=(shard, tenants, self.job, self.threads,
+                                                    self._xero_api_url, self._pool_options, events))
+            process.daemon = True
+            process.start()
+            processes.append(process)
+
+        # Collect the events until every worker has exited:
+        retval = {}
+        running = set(range(len(shards)))
+        while running:
+            try:
+                event, tenant, value = events.get(timeout=1.0)
+            except Queue.Empty:
+                # Fail the tenants of the workers which died silently:
+                for shard in [shard for shard in running if not processes[shard].is_alive()]:
+                    running.discard(shard)
+                    for tenant in [tenant[0] for tenant in shards[shard] if tenant[0] not in retval]:
+                        retval[tenant] = (False, "Worker exited with code %s" % (processes[shard].exitcode))
+                        if callback:
+                            callback(FAILED, tenant, retval[tenant][1])
+                continue
+            if event == _EXIT:
+                running.discard(tenant)
+                continue
+            try:
+                value = cPickle.loads(value)
+            except Exception, e:
+                event, value = FAILED, "%s: %s" % (type(e).__name__, e)
+            if event != PROGRESS:
+                retval[tenant] = (event == DONE, value)
+            if callback:
+                callback(event, tenant, value)
+
+        # Fail the tenants whose outcome never arrived:
+        for tenant in [tenant[0] for tenant in self._tenants if tenant[0] not in retval]:
+            retval[tenant] = (False, "Worker sent no outcome")
+            if callback:
+                callback(FAILED, tenant, retval[tenant][1])
+
+        for process in processes:
+            process.join()
+        return retval
@@ -0,0 +1,252 @@
+"""
+Provides benchmarks for the response processing paths of the client.
+
+Run as ``python -m xeroapi.tests.benchmark [invoices] [lines]`` on
+generated payloads, or as ``python -m xeroapi.tests.benchmark <cassette>``
+on the responses recorded in a cassette (see :mod:`xeroapi.cassette`).
+
+``python -m xeroapi.tests.benchmark memory [invoices] [lines]`` measures
+the peak memory of the XML parsers instead, by default over a hundred
+thousand line items.
+"""
+
+from xeroapi.cassette import ReplayTransport
+from xeroapi.cassette import load_cassette
+from xeroapi.client import Client
+from xeroapi.client import parse_json
+from xeroapi.client import parse_xml
+from xeroapi.parsing import parse_xml_chunks
+from xeroapi.parsing import parse_xml_compact
+from xeroapi.parsing import parse_xml_projected
+from xeroapi.resources import XContact
+from xeroapi.resources import XInvoice
+from xeroapi.resources import XItem
+import json
+import multiprocessing
+import oauth2
+import os
+import resource
+import sys
+import timeit
+
+_INVOICE_XML = """<Invoice>
+<Type>ACCREC</Type>
+<Contact><ContactID>025867f1-d741-4d6b-b1af-9ac774b59ba7</ContactID><Name>City Agency</Name></Contact>
+<Date>2011-09-20T00:00:00</Date>
+<DueDate>2011-10-20T00:00:00</DueDate>
+<Status>AUTHORISED</Status>
+<LineAmountTypes>Exclusive</LineAmountTypes>
+<LineItems>%(lines)s</LineItems>
+<SubTotal>%(total)s</SubTotal>
+<TotalTax>0.00</TotalTax>
+<Total>%(total)s</Total>
+<UpdatedDateUTC>2011-09-20T10:12:42.753</UpdatedDateUTC>
+<CurrencyCode>NZD</CurrencyCode>
+<InvoiceID>%(id)s</InvoiceID>
+<InvoiceNumber>INV-%(number)05d</InvoiceNumber>
+<AmountDue>%(total)s</AmountDue>
+<AmountPaid>0.00</AmountPaid>
+</Invoice>"""
+
+_LINE_XML = """<LineItem>
+<Description>Line %(number)d</Description>
+<UnitAmount>10.00</UnitAmount>
+<TaxType>OUTPUT</TaxType>
+<TaxAmount>0.00</TaxAmount>
+<LineAmount>10.00</LineAmount>
+<AccountCode>200</AccountCode>
+<Quantity>1.0000</Quantity>
+</LineItem>"""
+
+def make_invoice_id(number):
+    """
+    Returns a GUID like identifier for the numbered invoice.
+    """
+    return "00000000-0000-0000-0000-%012d" % (number)
+
+def make_xml(invoices, lines):
+    """
+    Returns an invoices response as XERO would send it in XML.
+    """
+    body = []
+    for number in range(invoices):
+        body.append(_INVOICE_XML % {"id": make_invoice_id(number),
+                                    "number": number,
+                                    "total": "%d.00" % (10 * lines),
+                                    "lines": "".join([_LINE_XML % {"number": i} for i in range(lines)])})
+    return "<Response><Id>bench</Id><Status>OK</Status><Invoices>%s</Invoices></Response>" % ("".join(body))
+
+def make_json(invoices, lines):
+    """
+    Returns an invoices response as XERO would send it in JSON.
+    """
+    body = []
+    for number in range(invoices):
+        body.append({"Type": "ACCREC",
+                     "Contact": {"ContactID": "025867f1-d741-4d6b-b1af-9ac774b59ba7", "Name": "City Agency"},
+                     "Date": "/Date(1316476800000+0000)/",
+                     "DueDate": "/Date(1319068800000+0000)/",
+                     "Status": "AUTHORISED",
+                     "LineAmountTypes": "Exclusive",
+                     "LineItems": [{"Description": "Line %d" % (i),
+                                    "UnitAmount": 10.00,
+                                    "TaxType": "OUTPUT",
+                                    "TaxAmount": 0.00,
+                                    "LineAmount": 10.00,
+                                    "AccountCode": "200",
+                                    "Quantity": 1.0000} for i in range(lines)],
+                     "SubTotal": 10.00 * lines,
+                     "TotalTax": 0.00,
+                     "Total": 10.00 * lines,
+                     "UpdatedDateUTC": "/Date(1316513562753+0000)/",
+                     "CurrencyCode": "NZD",
+                     "InvoiceID": make_invoice_id(number),
+                     "InvoiceNumber": "INV-%05d" % (number),
+                     "AmountDue": 10.00 * lines,
+                     "AmountPaid": 0.00})
+    return json.dumps({"Id": "bench", "Status": "OK", "Invoices": body})
+
+def bench(name, function, payload, repeat=3):
+    """
+    Times the function over the payload and prints the best run.
+    """
+    best = min(timeit.repeat(lambda: function(payload), number=1, repeat=repeat))
+    if isinstance(payload, basestring):
+        print "%-24s %8.1f ms %10d bytes" % (name, best * 1000, len(payload))
+    else:
+        print "%-24s %8.1f ms" % (name, best * 1000)
+
+# Entities built from the recorded collections:
+_ENTITIES = {"Invoices": XInvoice,
+             "Contacts": XContact,
+             "Items": XItem}
+
+def load_entities(response):
+    """
+    Returns the entities of the known collections of the response.
+    """
+    retval = []
+    for name, entity in _ENTITIES.iteritems():
+        records = response["Response"].get(name)
+        if not records:
+            continue
+        records = records[entity._element]
+        if isinstance(records, dict):
+            records = [records]
+        retval.extend(entity.load_all(records))
+    return retval
+
+def read_invoices(response):
+    """
+    Builds the invoices of the response and reads their dates and amounts.
+    """
+    for invoice in load_entities(response):
+        invoice.Date, invoice.DueDate, invoice.UpdatedDateUTC, invoice.Total, invoice.AmountDue
+
+def bench_cassette(path):
+    """
+    Runs the benchmarks over the successful XML and JSON ``GET``
+    responses recorded in the cassette: parsing alone, the whole client
+    call served from memory and building the entities.
+    """
+    entries = []
+    for entry in load_cassette(path):
+        content_type = entry["headers"].get("content-type", "")
+        if entry["method"] == "GET" and entry["status"] == "200" and ("xml" in content_type or "json" in content_type):
+            entries.append(entry)
+    if not entries:
+        print "No successful XML or JSON GET in the cassette"
+        return
+
+    # Make the resource URIs relative to the common API url:
+    prefix = os.path.commonprefix([entry["uri"] for entry in entries])
+    prefix = prefix[:prefix.rfind("/") + 1]
+    client = Client("bench", "bench", None,
+                    xero_api_url=prefix,
+                    streaming=True,
+                    transport=ReplayTransport(path),
+                    signature_method=oauth2.SignatureMethod_PLAINTEXT())
+
+    for entry in entries:
+        resource_uri = entry["uri"][len(prefix):]
+        print "%s:" % (resource_uri)
+        if "json" in entry["headers"].get("content-type", ""):
+            bench("  JSON -> dict", parse_json, entry["content"])
+        else:
+            bench("  XML -> xml2json -> dict", parse_xml, entry["content"])
+        bench("  Client.get (replayed)", lambda content: client.get(resource_uri), entry["content"])
+        bench("  dict -> entities", load_entities, client.get(resource_uri))
+
+def parse_chunks(content):
+    """
+    Parses the content as if it was streamed in 64KB chunks.
+    """
+    return parse_xml_chunks([content[i:i + 65536] for i in range(0, len(content), 65536)])
+
+def parse_chunks_compact(content):
+    """
+    Parses the content as if it was streamed in 64KB chunks, sharing
+    strings.
+    """
+    return parse_xml_chunks([content[i:i + 65536] for i in range(0, len(content), 65536)], True)
+
+def _peak(function, invoices, lines, results):
+    """
+    Sends back how much the peak memory of this (child) process grows
+    while the function parses the payload and its result is alive.
+    """
+    content = make_xml(invoices, lines)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = function(content)
+    results.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+
+def bench_memory(name, function, invoices, lines):
+    """
+    Measures the function in a fresh process and prints its peak memory.
+    """
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_peak, args=(function, invoices, lines, results))
+    process.start()
+    growth = results.get()
+    process.join()
+    # Linux reports kilobytes:
+    print "%-32s %8.1f MB" % (name, growth / 1024.0)
+
+def memory(invoices=1000, lines=100):
+    """
+    Runs the memory benchmarks.
+    """
+    print "Invoices: %d, line items per invoice: %d" % (invoices, lines)
+    bench_memory("XML -> xml2json -> dict", parse_xml, invoices, lines)
+    bench_memory("XML -> dict, compact", parse_xml_compact, invoices, lines)
+    bench_memory("XML chunks -> dict", parse_chunks, invoices, lines)
+    bench_memory("XML chunks -> dict, compact", parse_chunks_compact, invoices, lines)
+    bench_memory("XML -> dict, summary", parse_summary, invoices, lines)
+
+# Fields of the invoices shown on dashboards:
+_SUMMARY = XInvoice.projection(["Status", "Total", "AmountDue", "DueDate"])
+
+def parse_summary(content):
+    """
+    Parses the invoices, keeping only the summary fields.
+    """
+    return parse_xml_projected(content, _SUMMARY)
+
+def main(invoices=1000, lines=10):
+    """
+    Runs the benchmarks.
+    """
+    print "Invoices: %d, line items per invoice: %d" % (invoices, lines)
+    bench("XML -> xml2json -> dict", parse_xml, make_xml(invoices, lines))
+    bench("XML -> dict, compact", parse_xml_compact, make_xml(invoices, lines))
+    bench("XML -> dict, summary", parse_summary, make_xml(invoices, lines))
+    bench("JSON -> dict", parse_json, make_json(invoices, lines))
+    bench("dict -> XInvoice values", read_invoices, parse_xml(make_xml(invoices, lines)))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "memory":
+        memory(*[int(arg) for arg in sys.argv[2:]])
+    elif len(sys.argv) == 2 and not sys.argv[1].isdigit():
+        bench_cassette(sys.argv[1])
+    else:
+        main(*[int(arg) for arg in sys.argv[1:]])
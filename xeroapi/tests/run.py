@@ -1,5 +1,23 @@
 import unittest
 from xeroapi.tests.xinvoice import *
+from xeroapi.tests.xclient import *
+from xeroapi.tests.xratelimit import *
+from xeroapi.tests.xoutbox import *
+from xeroapi.tests.xvalidation import *
+from xeroapi.tests.xentity import *
+from xeroapi.tests.xpipeline import *
+from xeroapi.tests.xcassette import *
+from xeroapi.tests.xcolumnar import *
+from xeroapi.tests.xconversion import *
+from xeroapi.tests.xparsing import *
+from xeroapi.tests.xreference import *
+from xeroapi.tests.xtransport import *
+from xeroapi.tests.xpool import *
+from xeroapi.tests.xcoalesce import *
+from xeroapi.tests.xbulk import *
+from xeroapi.tests.xattachments import *
+from xeroapi.tests.xexport import *
+from xeroapi.tests.xsync import *
 
 if __name__ == '__main__':
     unittest.main()
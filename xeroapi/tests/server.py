@@ -0,0 +1,100 @@
+"""
+Provides a local HTTP server for the tests which talk HTTP.
+"""
+
+import BaseHTTPServer
+import SocketServer
+import threading
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # Clients of the tests drop connections on purpose:
+        pass
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.local.lock:
+            self.server.local.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        """
+        Returns the raw request body, as framed, and the body itself.
+        """
+        if self.headers.getheader("transfer-encoding", "").lower() == "chunked":
+            raw = []
+            body = []
+            while True:
+                line = self.rfile.readline()
+                raw.append(line)
+                size = int(line.strip(), 16)
+                data = self.rfile.read(size + 2)
+                raw.append(data)
+                if not size:
+                    return "".join(raw), "".join(body)
+                body.append(data[:-2])
+        body = self.rfile.read(int(self.headers.getheader("content-length", "0")))
+        return body, body
+
+    def _respond(self):
+        local = self.server.local
+        raw, body = self._read_body()
+        request = {"method": self.command,
+                   "path": self.path,
+                   "headers": dict((key.lower(), value) for key, value in self.headers.items()),
+                   "raw": raw,
+                   "body": body}
+        with local.lock:
+            local.requests.append(request)
+        status, headers, content = local.handler(request)
+        self.send_response(status)
+        for key, value in headers.iteritems():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+        # Drop the connection without telling, like an idle timeout:
+        if not local.keep_alive:
+            self.close_connection = 1
+
+    do_GET = do_PUT = do_POST = _respond
+
+class LocalServer:
+    """
+    Provides a keep-alive HTTP server on a local port, run on a thread.
+
+    Requests are answered with ``handler(request)``, which returns the
+    status, the headers and the body; the request is a dictionary of its
+    ``method``, ``path``, ``headers``, ``raw`` body (as framed on the
+    wire) and ``body``. Requests received are kept in ``requests`` and
+    the connections accepted are counted in ``connections``.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.keep_alive = True
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.local = self
+        self.url = "http://127.0.0.1:%d/" % (self._server.server_address[1])
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """
+        Stops the server.
+        """
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,82 @@
+from xeroapi.attachments import INVOICES
+from xeroapi.attachments import download_attachment
+from xeroapi.attachments import list_attachments
+from xeroapi.attachments import upload_attachment
+from xeroapi.client import Client
+from xeroapi.errors import XeroClientNotFoundException
+from xeroapi.tests.server import LocalServer
+import oauth2
+import os
+import shutil
+import tempfile
+import unittest
+
+__all__ = ["AttachmentsTest"]
+
+ATTACHMENT = "<Attachment><FileName>receipt.pdf</FileName><MimeType>application/pdf</MimeType></Attachment>"
+
+class AttachmentsTest(unittest.TestCase):
+    """
+    Provides a test suit for the attachments of invoices and contacts.
+    """
+
+    def setUp(self):
+        self.content = "".join(chr(i % 256) for i in range(200 * 1024))
+        self.attachments = ""
+        self.server = LocalServer(self.respond)
+        self.client = Client("token", "secret", None, xero_api_url=self.server.url, streaming=True,
+                             signature_method=oauth2.SignatureMethod_PLAINTEXT())
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+    def respond(self, request):
+        if request["path"].endswith("/missing.pdf"):
+            return 404, {}, "Not Found"
+        if request["method"] == "GET" and request["path"].endswith("/receipt.pdf"):
+            return 200, {"Content-Type": "application/pdf"}, self.content
+        return 200, {"Content-Type": "text/xml"}, "<Response><Attachments>%s</Attachments></Response>" % (self.attachments)
+
+    def test_upload(self):
+        """
+        Tests that files are uploaded as is, with their content type.
+        """
+        path = os.path.join(self.directory, "receipt.pdf")
+        with open(path, "wb") as fileobj:
+            fileobj.write(self.content)
+        self.attachments = ATTACHMENT
+        self.assertEqual(upload_attachment(self.client, INVOICES, "INV-1", path),
+                         {"FileName": "receipt.pdf", "MimeType": "application/pdf"})
+        request = self.server.requests[-1]
+        self.assertEqual((request["method"], request["path"]), ("PUT", "/Invoices/INV-1/Attachments/receipt.pdf"))
+        self.assertEqual(request["headers"]["content-type"], "application/pdf")
+        self.assertEqual(request["headers"]["content-length"], str(len(self.content)))
+        self.assertEqual(request["body"], self.content)
+        self.assertRaises(ValueError, upload_attachment, self.client, "Items", "1", path)
+
+    def test_download(self):
+        """
+        Tests that downloads are written out, leaving no partial file
+        when they fail.
+        """
+        target = os.path.join(self.directory, "receipt.pdf")
+        download_attachment(self.client, INVOICES, "INV-1", "receipt.pdf", target)
+        with open(target, "rb") as fileobj:
+            self.assertEqual(fileobj.read(), self.content)
+
+        target = os.path.join(self.directory, "missing.pdf")
+        self.assertRaises(XeroClientNotFoundException, download_attachment, self.client, INVOICES, "INV-1", "missing.pdf", target)
+        self.assertEqual(os.listdir(self.directory), ["receipt.pdf"])
+
+    def test_list(self):
+        """
+        Tests that attachments are always listed as a list.
+        """
+        self.assertEqual(list_attachments(self.client, INVOICES, "INV-1"), [])
+        self.attachments = ATTACHMENT
+        self.assertEqual(list_attachments(self.client, INVOICES, "INV-1"),
+                         [{"FileName": "receipt.pdf", "MimeType": "application/pdf"}])
+        self.attachments = ATTACHMENT * 2
+        self.assertEqual(len(list_attachments(self.client, INVOICES, "INV-1")), 2)
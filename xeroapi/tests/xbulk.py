@@ -0,0 +1,149 @@
+from xeroapi.bulk import MAX_URI_LENGTH
+from xeroapi.bulk import _lookup_uris
+from xeroapi.bulk import fetch_invoices
+from xeroapi.bulk import transition_invoices
+from xeroapi.client import Client
+from xeroapi.errors import XeroClientBadRequestException
+from xeroapi.parsing import parse_xml
+from xeroapi.resources import XInvoice
+from xeroapi.tests.server import LocalServer
+import oauth2
+import unittest
+import urlparse
+
+__all__ = ["TransitionTest", "LookupTest"]
+
+GUID = "c5a8e1a7-1c6b-4c8a-9b3d-8a1a2f3e4d5c"
+
+class TransitionTest(unittest.TestCase):
+    """
+    Provides a test suit for the bulk invoice status transitions.
+    """
+
+    def setUp(self):
+        self.server = LocalServer(self.respond)
+        self.client = Client("token", "secret", None, xero_api_url=self.server.url,
+                             signature_method=oauth2.SignatureMethod_PLAINTEXT())
+
+    def tearDown(self):
+        self.server.close()
+
+    def envelope(self, request):
+        """
+        Returns the invoices posted in the request.
+        """
+        invoices = parse_xml(urlparse.parse_qs(request["body"])["xml"][0])["Invoices"]["Invoice"]
+        return invoices if isinstance(invoices, list) else [invoices]
+
+    def respond(self, request):
+        # Fail batches holding INV-BAD, echo the others:
+        invoices = self.envelope(request)
+        if [invoice for invoice in invoices if invoice.get("InvoiceNumber") == "INV-BAD"]:
+            return 400, {}, "A validation exception occurred"
+        results = []
+        for invoice in invoices:
+            status = "ERROR" if invoice.get("InvoiceNumber") == "INV-ERR" else "OK"
+            results.append('<Invoice status="%s"><InvoiceNumber>%s</InvoiceNumber></Invoice>'
+                           % (status, invoice.get("InvoiceNumber", "")))
+        return 200, {"Content-Type": "text/xml"}, "<Response><Invoices>%s</Invoices></Response>" % ("".join(results))
+
+    def test_envelope(self):
+        """
+        Tests that the envelope holds only the identifiers and the status.
+        """
+        retval = transition_invoices(self.client, [GUID, "INV-1"], XInvoice.InvoiceStatus.AUTHORISED)
+        self.assertEqual(len(self.server.requests), 1)
+        request = self.server.requests[0]
+        self.assertEqual(request["path"], "/Invoices?SummarizeErrors=false")
+        self.assertEqual(self.envelope(request), [{"InvoiceID": GUID, "Status": "AUTHORISED"},
+                                                  {"InvoiceNumber": "INV-1", "Status": "AUTHORISED"}])
+        self.assertEqual(sorted(retval), sorted([GUID, "INV-1"]))
+
+        # The client does not stream, so the pooled transport was used:
+        self.assertEqual(request["headers"]["accept-encoding"], "gzip")
+        self.assertRaises(ValueError, transition_invoices, self.client, ["INV-1"], "BOGUS")
+
+    def test_batches(self):
+        """
+        Tests batching, de-duplication and the outcome of each invoice.
+        """
+        identifiers = ["INV-1", "INV-ERR", "INV-1", "INV-2", "INV-BAD", "INV-3"]
+        retval = transition_invoices(self.client, identifiers, XInvoice.InvoiceStatus.VOIDED, batch_size=2, workers=2)
+        batches = sorted([invoice["InvoiceNumber"] for invoice in self.envelope(request)]
+                         for request in self.server.requests)
+        self.assertEqual(batches, [["INV-1", "INV-ERR"], ["INV-2", "INV-BAD"], ["INV-3"]])
+        self.assertEqual(retval["INV-1"], (True, {"@status": "OK", "InvoiceNumber": "INV-1"}))
+        self.assertEqual(retval["INV-3"][0], True)
+        self.assertEqual(retval["INV-ERR"], (False, {"@status": "ERROR", "InvoiceNumber": "INV-ERR"}))
+        for identifier in ("INV-2", "INV-BAD"):
+            self.assertEqual(retval[identifier][0], False)
+            self.assertTrue(isinstance(retval[identifier][1], XeroClientBadRequestException))
+        self.assertEqual(len(retval), 5)
+
+class LookupTest(unittest.TestCase):
+    """
+    Provides a test suit for the batched lookups of invoices and contacts.
+    """
+
+    def setUp(self):
+        self.invoices = [{"InvoiceID": "%s%04d" % (GUID[:-4], i), "InvoiceNumber": "INV-%d" % i} for i in range(300)]
+        self.server = LocalServer(self.respond)
+        self.client = Client("token", "secret", None, xero_api_url=self.server.url,
+                             signature_method=oauth2.SignatureMethod_PLAINTEXT())
+
+    def tearDown(self):
+        self.server.close()
+
+    def respond(self, request):
+        # Answer the IDs or the numbers of the where filter:
+        query = urlparse.parse_qs(urlparse.urlsplit(request["path"]).query)
+        if "IDs" in query:
+            wanted = query["IDs"][0].split(",")
+        else:
+            wanted = [condition.split('"')[1] for condition in query["where"][0].split(" OR ")]
+        found = ["<Invoice><InvoiceID>%s</InvoiceID><InvoiceNumber>%s</InvoiceNumber></Invoice>"
+                 % (invoice["InvoiceID"], invoice["InvoiceNumber"])
+                 for invoice in self.invoices if invoice["InvoiceID"] in wanted or invoice["InvoiceNumber"] in wanted]
+        if not found:
+            return 200, {"Content-Type": "text/xml"}, "<Response><Status>OK</Status></Response>"
+        return 200, {"Content-Type": "text/xml"}, "<Response><Invoices>%s</Invoices></Response>" % ("".join(found))
+
+    def test_uris(self):
+        """
+        Tests that IDs and numbers are split at 100 per URI and at the
+        URI length limit.
+        """
+        guids = [invoice["InvoiceID"] for invoice in self.invoices[:250]]
+        numbers = ["NUMBER-%060d" % i for i in range(150)]
+        uris = list(_lookup_uris("Invoices", "InvoiceNumber", numbers + guids))
+        self.assertEqual([len(chunk) for uri, chunk in uris[:3]], [100, 100, 50])
+        self.assertEqual(uris[0][0], "Invoices?IDs=%s" % (",".join(guids[:100])))
+        self.assertEqual(sum([chunk for uri, chunk in uris[3:]], []), numbers)
+        self.assertTrue(len(uris) > 5)
+        for uri, chunk in uris:
+            self.assertTrue(len(uri) <= MAX_URI_LENGTH)
+            self.assertTrue(len(chunk) <= 100)
+
+    def test_escaping(self):
+        """
+        Tests that quotes and backslashes are escaped in where filters.
+        """
+        uris = list(_lookup_uris("Invoices", "InvoiceNumber", ['A"1', "B\\2"]))
+        self.assertEqual(len(uris), 1)
+        query = urlparse.parse_qs(urlparse.urlsplit(uris[0][0]).query)
+        self.assertEqual(query["where"], ['InvoiceNumber=="A\\"1" OR InvoiceNumber=="B\\\\2"'])
+
+    def test_fetch(self):
+        """
+        Tests that entities are keyed by the identifiers asked for, be
+        they IDs or numbers.
+        """
+        identifiers = [self.invoices[0]["InvoiceID"], "INV-1", "INV-2", self.invoices[2]["InvoiceID"], "INV-MISSING"]
+        retval = fetch_invoices(self.client, identifiers, workers=2)
+        self.assertEqual(sorted(retval), sorted(identifiers[:4]))
+        self.assertEqual(retval["INV-1"]["InvoiceID"], self.invoices[1]["InvoiceID"])
+        self.assertEqual(retval[self.invoices[0]["InvoiceID"]]["InvoiceNumber"], "INV-0")
+        self.assertTrue(isinstance(retval["INV-1"], XInvoice))
+        self.assertEqual(len(self.server.requests), 2)
+        for request in self.server.requests:
+            self.assertEqual(request["headers"]["accept-encoding"], "gzip")
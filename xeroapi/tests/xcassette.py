@@ -0,0 +1,81 @@
+from xeroapi.cassette import CassetteResponse
+from xeroapi.cassette import RecordingTransport
+from xeroapi.cassette import ReplayTransport
+from xeroapi.cassette import load_cassette
+from xeroapi.client import Client
+import hashlib
+import oauth2
+import os
+import tempfile
+import unittest
+
+__all__ = ["CassetteTest"]
+
+class FakeTransport:
+    """
+    Provides a transport answering with numbered responses.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def request(self, uri, method="GET", body=None, headers=None):
+        self.sent.append((uri, method, body))
+        return CassetteResponse("200",
+                                {"content-type": "text/xml", "set-cookie": "session=secret"},
+                                "<Response><Id>%d</Id><Name>Acme Ltd</Name></Response>" % (len(self.sent)))
+
+class CassetteTest(unittest.TestCase):
+    """
+    Provides a test suit for the record and replay transports.
+    """
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_scrubbed(self):
+        """
+        Tests that no secrets make it into the cassette.
+        """
+        transport = RecordingTransport(self.path, FakeTransport(), secrets=["Acme"])
+        transport.request("https://api.xero.com/api.xro/2.0/Invoices?oauth_token=token", headers={"Authorization": "OAuth secret"})
+        entry = load_cassette(self.path)[0]
+        self.assertEqual(entry["uri"], "https://api.xero.com/api.xro/2.0/Invoices?oauth_token=SCRUBBED")
+        self.assertFalse("set-cookie" in entry["headers"])
+        self.assertFalse("Acme" in entry["content"])
+        self.assertFalse("secret" in open(self.path, "rb").read())
+
+    def test_replay(self):
+        """
+        Tests that requests are served their recorded responses in order.
+        """
+        recorder = RecordingTransport(self.path, FakeTransport())
+        recorder.request("https://api.xero.com/api.xro/2.0/Invoices")
+        recorder.request("https://api.xero.com/api.xro/2.0/Invoices")
+        recorder.request("https://api.xero.com/api.xro/2.0/Invoices", "POST", iter(["xml=", "<Invoice/>"]))
+
+        replay = ReplayTransport(self.path)
+        for expected in ["1", "2", "2"]:
+            response = replay.request("https://api.xero.com/api.xro/2.0/Invoices")
+            self.assertEqual(response.status, "200")
+            self.assertTrue("<Id>%s</Id>" % (expected) in response.read())
+        response = replay.request("https://api.xero.com/api.xro/2.0/Invoices", "POST", "xml=<Invoice/>")
+        self.assertTrue("<Id>3</Id>" in "".join(response.iter_content()))
+        self.assertRaises(ValueError, replay.request, "https://api.xero.com/api.xro/2.0/Invoices", "POST", "xml=<Other/>")
+
+    def test_compressed(self):
+        """
+        Tests that compressed request bodies are matched on their content.
+        """
+        xml = "<Invoices>%s</Invoices>" % ("<Invoice><Type>ACCREC</Type></Invoice>" * 1000)
+        for transport in (lambda: RecordingTransport(self.path, FakeTransport()), lambda: ReplayTransport(self.path)):
+            client = Client("token", "secret", None, streaming=True, compress_requests=True, transport=transport(),
+                            signature_method=oauth2.SignatureMethod_PLAINTEXT())
+            self.assertEqual(client.put("Invoices", xml), {"Response": {"Id": "1", "Name": "Acme Ltd"}})
+        self.assertEqual(load_cassette(self.path)[0]["body"], hashlib.sha1(xml).hexdigest())
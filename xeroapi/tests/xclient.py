@@ -0,0 +1,50 @@
+from xeroapi.client import parse_json
+from xeroapi.client import parse_xml
+import unittest
+
+__all__ = ["ClientParseTest"]
+
+class ClientParseTest(unittest.TestCase):
+    """
+    Provides a test suit for the response parsers of the client.
+    """
+
+    def test_json_shape(self):
+        """
+        Tests that JSON responses are reshaped like XML responses.
+        """
+        xml = ("<Response><Status>OK</Status><TaxRates>"
+               "<TaxRate><Name>GST</Name><EffectiveRate>15.00</EffectiveRate><CanApplyToAssets>true</CanApplyToAssets></TaxRate>"
+               "<TaxRate><Name>None</Name><EffectiveRate>0.00</EffectiveRate><CanApplyToAssets>false</CanApplyToAssets></TaxRate>"
+               "</TaxRates></Response>")
+        content = ('{"Status": "OK", "TaxRates": ['
+                   '{"Name": "GST", "EffectiveRate": 15.00, "CanApplyToAssets": true},'
+                   '{"Name": "None", "EffectiveRate": 0.00, "CanApplyToAssets": false}]}')
+        self.assertEqual(parse_json(content), parse_xml(xml))
+
+    def test_json_single_item(self):
+        """
+        Tests that single item collections are not wrapped in a list.
+        """
+        content = '{"Addresses": [{"City": "Wellington"}], "Phones": []}'
+        self.assertEqual(parse_json(content),
+                         {"Response": {"Addresses": {"Address": {"City": "Wellington"}}}})
+
+    def test_json_tracking(self):
+        """
+        Tests that line item tracking is reshaped like the XML one.
+        """
+        xml = ("<Response><LineItems><LineItem><Tracking>"
+               "<TrackingCategory><Name>Region</Name><Option>North</Option></TrackingCategory>"
+               "</Tracking></LineItem></LineItems></Response>")
+        content = '{"LineItems": [{"Tracking": [{"Name": "Region", "Option": "North"}]}]}'
+        self.assertEqual(parse_json(content), parse_xml(xml))
+
+    def test_json_date(self):
+        """
+        Tests that JSON dates are converted to the XML representation.
+        """
+        content = '{"Date": "/Date(1316476800000+0000)/", "UpdatedDateUTC": "/Date(1316513562753+0000)/"}'
+        self.assertEqual(parse_json(content),
+                         {"Response": {"Date": "2011-09-20T00:00:00",
+                                       "UpdatedDateUTC": "2011-09-20T10:12:42.753"}})
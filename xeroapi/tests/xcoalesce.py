@@ -0,0 +1,96 @@
+from xeroapi.coalesce import SingleFlight
+from xeroapi.errors import XeroClientNotFoundException
+from xeroapi.pipeline import Call
+from xeroapi.pipeline import Pipeline
+from xeroapi.pipeline import SingleFlightStage
+from xeroapi.resources import XTaxRate
+import threading
+import time
+import unittest
+
+__all__ = ["SingleFlightTest"]
+
+class _Client:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, resource_uri):
+        return self.response
+
+class SingleFlightTest(unittest.TestCase):
+    """
+    Provides a test suit for the coalescing of concurrent calls.
+    """
+
+    def setUp(self):
+        self.sent = []
+        self.release = threading.Event()
+
+    def send(self, call):
+        # Hold the call until every caller is waiting for it:
+        self.sent.append(call)
+        self.release.wait()
+        if call.resource_uri == "Missing":
+            raise XeroClientNotFoundException("Not found")
+        return {"Response": {"TaxRates": {"TaxRate": {"TaxType": "OUTPUT2", "Name": "GST"}}}}
+
+    def run_concurrently(self, pipeline, call, count=5):
+        """
+        Returns the results, or errors, of the call made on ``count``
+        threads at once.
+        """
+        results = []
+
+        def run():
+            try:
+                results.append(pipeline(call))
+            except Exception, e:
+                results.append(e)
+
+        threads = [threading.Thread(target=run) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_shared_request(self):
+        """
+        Tests that concurrent identical GETs send one request.
+        """
+        pipeline = Pipeline([SingleFlightStage(SingleFlight())], self.send)
+        results = self.run_concurrently(pipeline, Call("GET", "TaxRate", tenant="a"))
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(len(results), 5)
+        for result in results:
+            self.assertTrue(result is results[0])
+
+        # Shared responses are not changed by the resources reading them:
+        client = _Client(results[0])
+        self.assertEqual([rate.Name for rate in XTaxRate.get(client)], ["GST"])
+        self.assertEqual([rate.Name for rate in XTaxRate.get(client)], ["GST"])
+        self.assertTrue(isinstance(results[0]["Response"]["TaxRates"]["TaxRate"], dict))
+
+    def test_shared_error(self):
+        """
+        Tests that the error of a shared request reaches every caller.
+        """
+        pipeline = Pipeline([SingleFlightStage(SingleFlight())], self.send)
+        results = self.run_concurrently(pipeline, Call("GET", "Missing", tenant="a"))
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(len(results), 5)
+        for result in results:
+            self.assertTrue(isinstance(result, XeroClientNotFoundException))
+
+    def test_other_calls(self):
+        """
+        Tests that writes and other tenants' GETs are not shared.
+        """
+        pipeline = Pipeline([SingleFlightStage(SingleFlight())], self.send)
+        self.release.set()
+        pipeline(Call("GET", "TaxRate", tenant="a"))
+        pipeline(Call("GET", "TaxRate", tenant="b"))
+        pipeline(Call("POST", "TaxRate", "xml=", tenant="a"))
+        self.assertEqual(len(self.sent), 3)
@@ -0,0 +1,84 @@
+from decimal import Decimal
+from xeroapi.columnar import ColumnarReader
+from xeroapi.columnar import ColumnarWriter
+from xeroapi.columnar import export_invoices_columnar
+import datetime
+import os
+import tempfile
+import unittest
+
+__all__ = ["ColumnarTest"]
+
+class _Client:
+    def __init__(self, pages):
+        self.pages = pages
+        self.uris = []
+
+    def get(self, resource_uri):
+        self.uris.append(resource_uri)
+        if not self.pages:
+            return {"Response": {"Invoices": None}}
+        return {"Response": {"Invoices": {"Invoice": self.pages.pop(0)}}}
+
+class ColumnarTest(unittest.TestCase):
+    """
+    Provides a test suit for the columnar export.
+    """
+
+    def test_round_trip(self):
+        """
+        Tests that invoices and line items read back from the columns.
+        """
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            writer = ColumnarWriter(path)
+            writer.add({"InvoiceNumber": "INV-1",
+                        "Status": "AUTHORISED",
+                        "Contact": {"ContactID": "c1"},
+                        "Date": "2011-09-20T00:00:00",
+                        "Total": "12.50",
+                        "LineItems": {"LineItem": {"AccountCode": "200", "Quantity": "1.5000", "LineAmount": "12.50"}}})
+            writer.add({"InvoiceNumber": "INV-2",
+                        "Status": "AUTHORISED",
+                        "LineItems": {"LineItem": [{"AccountCode": "400", "Description": u"Caf\xe9"},
+                                                   {"AccountCode": "200", "Quantity": "2", "Description": ""}]}})
+            writer.close()
+
+            reader = ColumnarReader(path)
+            self.assertEqual(reader.rows("invoices"), 2)
+            self.assertEqual(reader.rows("line_items"), 3)
+            self.assertEqual(reader.values("invoices", "InvoiceNumber"), ["INV-1", "INV-2"])
+            self.assertEqual(reader.column("invoices", "Status"), (0, 0))
+            self.assertEqual(reader.values("invoices", "ContactID"), ["c1", None])
+            self.assertEqual(reader.column("invoices", "ContactID"), (0, 2, -3))
+            self.assertEqual(reader.column("invoices", "InvoiceNumber"), (0, 5, 10))
+            self.assertEqual(reader.values("line_items", "Description"), [None, u"Caf\xe9", ""])
+            self.assertFalse("dictionary" in reader.directory["invoices"]["columns"]["InvoiceNumber"])
+            self.assertEqual(reader.values("invoices", "Date"), [datetime.date(2011, 9, 20), None])
+            self.assertEqual(reader.column("invoices", "Total")[0], 1250)
+            self.assertEqual(reader.values("invoices", "Total")[0], Decimal("12.50"))
+            self.assertEqual(reader.column("line_items", "Invoice"), (0, 1, 1))
+            self.assertEqual(reader.column("line_items", "AccountCode"), (0, 1, 0))
+            self.assertEqual(reader.values("line_items", "Quantity"), [Decimal("1.5"), None, Decimal("2")])
+            reader.close()
+        finally:
+            os.remove(path)
+
+    def test_export(self):
+        """
+        Tests that pages are exported until an empty one comes back.
+        """
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            client = _Client([[{"InvoiceNumber": "INV-1"}, {"InvoiceNumber": "INV-2"}],
+                              {"InvoiceNumber": "INV-3"}])
+            self.assertEqual(export_invoices_columnar(client, path, 'Status=="PAID"'), 3)
+            self.assertEqual(len(client.uris), 3)
+            self.assertTrue(client.uris[2].startswith("Invoices?") and "page=3" in client.uris[2])
+            reader = ColumnarReader(path)
+            self.assertEqual(reader.values("invoices", "InvoiceNumber"), ["INV-1", "INV-2", "INV-3"])
+            reader.close()
+        finally:
+            os.remove(path)
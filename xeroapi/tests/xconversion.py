@@ -0,0 +1,46 @@
+from decimal import Decimal
+from xeroapi.conversion import convert_records
+from xeroapi.conversion import parse_date
+from xeroapi.resources import XInvoice
+import datetime
+import unittest
+
+__all__ = ["ConversionTest"]
+
+class ConversionTest(unittest.TestCase):
+    """
+    Provides a test suit for the date and amount conversions.
+    """
+
+    def test_dates(self):
+        """
+        Tests the date layouts XERO sends.
+        """
+        self.assertEqual(parse_date("2011-09-20"), datetime.datetime(2011, 9, 20))
+        self.assertEqual(parse_date("2011-09-20T10:12:42"), datetime.datetime(2011, 9, 20, 10, 12, 42))
+        self.assertEqual(parse_date("2011-09-20T10:12:42.753"), datetime.datetime(2011, 9, 20, 10, 12, 42, 753000))
+        self.assertEqual(parse_date(""), None)
+        self.assertRaises(ValueError, parse_date, "20/09/2011")
+
+    def test_records(self):
+        """
+        Tests that a page of records is converted in one pass.
+        """
+        records = [{"Date": "2011-09-20T00:00:00", "Total": "10.00"}, {"Total": "10.00"}]
+        converted = convert_records(records, ("Date",), ("Total",))
+        self.assertEqual(converted[0]["Date"], ("2011-09-20T00:00:00", datetime.datetime(2011, 9, 20)))
+        self.assertEqual(converted[1], {"Total": ("10.00", Decimal("10.00"))})
+
+    def test_invoice(self):
+        """
+        Tests that loaded invoices convert their fields once and notice
+        changes.
+        """
+        invoice = XInvoice.load_all([{"Date": "2011-09-20T00:00:00", "SubTotal": "10.00", "AmountDue": "5.00"}])[0]
+        self.assertEqual(invoice.Date, datetime.datetime(2011, 9, 20))
+        self.assertEqual(invoice.AmountDue, Decimal("5.00"))
+        self.assertEqual(invoice.DueDate, None)
+        invoice.SubTotal = Decimal("12.5")
+        self.assertEqual(invoice.SubTotal, Decimal("12.50"))
+        invoice.Date = datetime.datetime(2012, 1, 2)
+        self.assertEqual(invoice.Date, datetime.datetime(2012, 1, 2))
@@ -0,0 +1,44 @@
+from xeroapi.resources import XContact
+from xeroapi.resources import XInvoice
+import unittest
+
+__all__ = ["XEntityChangesTest"]
+
+class XEntityChangesTest(unittest.TestCase):
+    """
+    Provides a test suit for the change tracking of entities.
+    """
+
+    def setUp(self):
+        contact = XContact.load({"ContactID": "c1", "Name": "TEST CONTACT NAME"})
+        self.invoice = XInvoice.load({"InvoiceID": "i1",
+                                      "Type": XInvoice.InvoiceType.ACCREC,
+                                      "Status": XInvoice.InvoiceStatus.DRAFT,
+                                      "Reference": "REF",
+                                      "Contact": contact})
+
+    def test_load(self):
+        """
+        Tests that loaded entities have no changes.
+        """
+        self.assertEqual(self.invoice.changed_fields(), frozenset())
+        self.assertEqual(self.invoice.changes(), {"InvoiceID": "i1"})
+
+    def test_changes(self):
+        """
+        Tests that only the identifier and the changed fields are kept.
+        """
+        self.invoice.Status = XInvoice.InvoiceStatus.AUTHORISED
+        self.invoice.update(Reference="NEW")
+        self.assertEqual(self.invoice.changed_fields(), frozenset(["Status", "Reference"]))
+        self.assertEqual(self.invoice.changes(), {"InvoiceID": "i1",
+                                                  "Status": XInvoice.InvoiceStatus.AUTHORISED,
+                                                  "Reference": "NEW"})
+        self.invoice.mark_clean()
+        self.assertEqual(self.invoice.changes(), {"InvoiceID": "i1"})
+
+    def test_new(self):
+        """
+        Tests that all fields of a new entity are changed.
+        """
+        self.assertEqual(XInvoice().changed_fields(), frozenset(["Type", "Status", "LineAmountTypes"]))
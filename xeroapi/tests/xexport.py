@@ -0,0 +1,63 @@
+from xeroapi.client import Client
+from xeroapi.errors import XeroClientNotFoundException
+from xeroapi.export import MANIFEST
+from xeroapi.export import export_invoice_pdfs
+from xeroapi.tests.server import LocalServer
+import oauth2
+import os
+import shutil
+import tempfile
+import unittest
+
+__all__ = ["ExportTest"]
+
+class ExportTest(unittest.TestCase):
+    """
+    Provides a test suit for the resumable PDF export.
+    """
+
+    def setUp(self):
+        self.server = LocalServer(self.respond)
+        self.client = Client("token", "secret", None, xero_api_url=self.server.url, streaming=True,
+                             signature_method=oauth2.SignatureMethod_PLAINTEXT())
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+    def respond(self, request):
+        invoice_id = request["path"].split("/")[-1]
+        if invoice_id == "missing":
+            return 404, {}, "Not Found"
+        return 200, {"Content-Type": "application/pdf"}, "%%PDF-1.4 %s" % (invoice_id)
+
+    def read(self, filename):
+        with open(os.path.join(self.directory, filename), "rb") as fileobj:
+            return fileobj.read()
+
+    def test_export(self):
+        """
+        Tests that PDFs are exported, leaving no partial file on failure.
+        """
+        retval = export_invoice_pdfs(self.client, ["one", "two", "missing", "one"], self.directory, workers=2)
+        self.assertEqual((retval["one"], retval["two"]), ("exported", "exported"))
+        self.assertTrue(isinstance(retval["missing"], XeroClientNotFoundException))
+        self.assertEqual(sorted(os.listdir(self.directory)), [MANIFEST, "one.pdf", "two.pdf"])
+        self.assertEqual(self.read("one.pdf"), "%PDF-1.4 one")
+        self.assertEqual(self.server.requests[0]["headers"]["accept"], "application/pdf")
+
+    def test_resume(self):
+        """
+        Tests that files matching their checksum are skipped, and that
+        files which do not are fetched again.
+        """
+        export_invoice_pdfs(self.client, ["one", "two"], self.directory)
+        with open(os.path.join(self.directory, "two.pdf"), "wb") as fileobj:
+            fileobj.write("truncated")
+        del self.server.requests[:]
+
+        retval = export_invoice_pdfs(self.client, ["one", "two"], self.directory)
+        self.assertEqual(retval, {"one": "skipped", "two": "exported"})
+        self.assertEqual([request["path"] for request in self.server.requests], ["/Invoices/two"])
+        self.assertEqual(self.read("two.pdf"), "%PDF-1.4 two")
@@ -0,0 +1,124 @@
+from xeroapi.client import XeroClientBadRequestException
+from xeroapi.client import XeroClientUnknownException
+from xeroapi.outbox import Outbox
+from xeroapi.outbox import OutboxWorker
+from xeroapi.resources import XInvoice
+import time
+import unittest
+
+__all__ = ["OutboxTest"]
+
+class FakeClient:
+    """
+    Provides a client which answers posts from a list of responses.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posts = []
+
+    def post(self, resource_uri, content):
+        self.posts.append((resource_uri, content))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+class OutboxTest(unittest.TestCase):
+    """
+    Provides a test suit for the write-behind outbox.
+    """
+
+    def setUp(self):
+        self.outbox = Outbox(":memory:", backoff=0)
+
+    def test_batch(self):
+        """
+        Tests that entries are sent in one envelope with separate outcomes.
+        """
+        first = self.outbox.enqueue(XInvoice())
+        second = self.outbox.enqueue(XInvoice())
+        client = FakeClient({"Response": {"Invoices": {"Invoice": [{"@status": "OK", "InvoiceID": "1"},
+                                                                   {"@status": "ERROR"}]}}})
+        self.assertEqual(OutboxWorker(self.outbox, client).drain(), 2)
+        self.assertEqual(len(client.posts), 1)
+        self.assertEqual(client.posts[0][0], "Invoices?SummarizeErrors=false")
+        self.assertEqual(self.outbox.status(first), (Outbox.Status.DONE, {"@status": "OK", "InvoiceID": "1"}))
+        self.assertEqual(self.outbox.status(second)[0], Outbox.Status.FAILED)
+
+    def test_retry(self):
+        """
+        Tests that transient failures are retried and bad requests are not.
+        """
+        entry = self.outbox.enqueue(XInvoice())
+        worker = OutboxWorker(self.outbox, FakeClient(XeroClientUnknownException("503"),
+                                                      XeroClientBadRequestException("400")))
+        worker.drain()
+        self.assertEqual(self.outbox.status(entry)[0], Outbox.Status.PENDING)
+        worker.drain()
+        self.assertEqual(self.outbox.status(entry)[0], Outbox.Status.FAILED)
+        self.assertEqual(worker.drain(), 0)
+
+    def test_unexpected_response(self):
+        """
+        Tests that entries of an unexpected response are put back.
+        """
+        first = self.outbox.enqueue(XInvoice())
+        second = self.outbox.enqueue(XInvoice())
+        worker = OutboxWorker(self.outbox, FakeClient({"Response": {"Status": "OK"}},
+                                                      {"Response": {"Invoices": {"Invoice": {"@status": "OK"}}}}))
+        self.assertEqual(worker.drain(), 2)
+        status, error = self.outbox.status(first)
+        self.assertEqual(status, Outbox.Status.PENDING)
+        self.assertEqual(error["Error"], "KeyError")
+        self.assertEqual(worker.drain(), 2)
+        self.assertEqual(self.outbox.status(first)[0], Outbox.Status.DONE)
+        self.assertEqual(self.outbox.status(second)[0], Outbox.Status.PENDING)
+
+    def test_worker_survives(self):
+        """
+        Tests that the worker thread keeps running through errors.
+        """
+        entry = self.outbox.enqueue(XInvoice())
+        claim = self.outbox.claim
+        failures = []
+
+        def failing_claim(limit):
+            if not failures:
+                failures.append(limit)
+                raise RuntimeError("database is locked")
+            return claim(limit)
+
+        self.outbox.claim = failing_claim
+        worker = OutboxWorker(self.outbox, FakeClient({"Response": {"Invoices": {"Invoice": {"@status": "OK"}}}}),
+                              interval=0.01)
+        worker.start()
+        try:
+            self.assertEqual(self.outbox.wait(entry, timeout=5, poll=0.01)[0], Outbox.Status.DONE)
+            self.assertTrue(worker.is_alive())
+        finally:
+            worker.stop()
+            worker.join()
+        self.assertEqual(failures, [50])
+
+    def test_lease(self):
+        """
+        Tests that entries whose outcome could not be stored are sent again.
+        """
+        outbox = Outbox(":memory:", backoff=0, lease=0.1)
+        entry = outbox.enqueue(XInvoice())
+
+        def failing_fail(entry_id, error, retry=True):
+            raise RuntimeError("database is locked")
+
+        fail = outbox.fail
+        outbox.fail = failing_fail
+        worker = OutboxWorker(outbox, FakeClient(XeroClientUnknownException("503"),
+                                                 {"Response": {"Invoices": {"Invoice": {"@status": "OK"}}}}))
+        self.assertRaises(RuntimeError, worker.drain)
+        outbox.fail = fail
+        self.assertEqual(outbox.status(entry)[0], Outbox.Status.SENDING)
+        self.assertEqual(worker.drain(), 0)
+        time.sleep(0.15)
+        self.assertEqual(worker.drain(), 1)
+        self.assertEqual(outbox.status(entry)[0], Outbox.Status.DONE)
@@ -0,0 +1,140 @@
+from xeroapi import xml2json
+from xeroapi.parsing import parse_xml_chunks
+from xeroapi.parsing import parse_json
+from xeroapi.parsing import parse_xml
+from xeroapi.parsing import parse_xml_compact
+from xeroapi.parsing import parse_xml_projected
+from xeroapi.parsing import parse_xml_stream
+from xeroapi.parsing import project
+from xeroapi.resources import XInvoice
+from xeroapi.transport import ResponseStream
+import xml.etree.cElementTree as ET
+import unittest
+
+__all__ = ["CompactParsingTest", "StreamParsingTest", "ProjectionTest"]
+
+_XML = """<Response><Invoices>
+<Invoice><Status>AUTHORISED</Status><LineItems>
+<LineItem><AccountCode>200</AccountCode></LineItem>
+<LineItem><AccountCode>200</AccountCode></LineItem>
+</LineItems></Invoice>
+<Invoice status="OK">text<Status>AUTHORISED</Status><Empty/> tail </Invoice>
+</Invoices></Response>"""
+
+class CompactParsingTest(unittest.TestCase):
+    """
+    Provides a test suit for parsing without an element tree.
+    """
+
+    def test_same_result(self):
+        """
+        Tests that the result is the one of the element tree conversion.
+        """
+        expected = xml2json.elem_to_internal(ET.fromstring(_XML))
+        self.assertEqual(parse_xml_compact(_XML), expected)
+        self.assertEqual(parse_xml_chunks([_XML[i:i + 10] for i in range(0, len(_XML), 10)]), expected)
+
+    def test_shared_strings(self):
+        """
+        Tests that repeated values share one string.
+        """
+        invoices = parse_xml_compact(_XML)["Response"]["Invoices"]["Invoice"]
+        lines = invoices[0]["LineItems"]["LineItem"]
+        self.assertTrue(lines[0]["AccountCode"] is lines[1]["AccountCode"])
+        self.assertTrue(invoices[0]["Status"] is invoices[1]["Status"])
+
+    def test_guids_not_shared(self):
+        """
+        Tests that GUIDs, unique per record, are kept out of the memo.
+        """
+        memo = {}
+        guid = "243216c5-369e-4056-ac67-05388f86dc81"
+        self.assertEqual(xml2json.share(memo, guid), guid)
+        self.assertEqual(xml2json.share(memo, "ACCREC"), "ACCREC")
+        self.assertEqual(memo, {"ACCREC": "ACCREC"})
+
+class StreamParsingTest(unittest.TestCase):
+    """
+    Provides a test suit for parsing from a response stream.
+    """
+
+    def test_read(self):
+        """
+        Tests that reads span and split the chunks.
+        """
+        stream = ResponseStream(iter(["abc", "defgh", "", "ij"]))
+        self.assertEqual(stream.read(2), "ab")
+        self.assertEqual(stream.read(4), "cdef")
+        self.assertEqual(stream.read(), "ghij")
+        self.assertEqual(stream.read(1), "")
+
+    def test_parse(self):
+        """
+        Tests that the stream is parsed as it is read.
+        """
+        chunks = [_XML[i:i + 10] for i in range(0, len(_XML), 10)]
+        stream = ResponseStream(iter(chunks))
+        self.assertEqual(parse_xml_stream(stream, chunk_size=7), xml2json.elem_to_internal(ET.fromstring(_XML)))
+
+class _Client:
+    def __init__(self, xml):
+        self.xml = xml
+        self.projections = []
+
+    def get(self, resource_uri, projection=None):
+        self.projections.append(projection)
+        return parse_xml_projected(self.xml, projection) if projection else parse_xml(self.xml)
+
+class ProjectionTest(unittest.TestCase):
+    """
+    Provides a test suit for parsing only the projected fields.
+    """
+
+    def test_xget(self):
+        """
+        Tests that invoices are fetched with only the projected fields.
+        """
+        client = _Client(_XML)
+        invoices = XInvoice.xget(client)
+        self.assertEqual(len(invoices), 2)
+        self.assertTrue("LineItems" in invoices[0])
+
+        projection = XInvoice.projection(["Status"])
+        invoices = XInvoice.xget(client, projection)
+        self.assertEqual(client.projections, [None, projection])
+        self.assertEqual(invoices[0], {"Status": "AUTHORISED"})
+        self.assertFalse("LineItems" in invoices[0])
+        self.assertTrue(isinstance(invoices[0], XInvoice))
+
+    def test_xml(self):
+        """
+        Tests that unrequested subtrees are skipped.
+        """
+        invoices = parse_xml_projected(_XML, {"Invoice": ["Status"]})["Response"]["Invoices"]["Invoice"]
+        self.assertEqual(invoices[0], {"Status": "AUTHORISED"})
+        self.assertEqual(invoices[1], {"@status": "OK", "#text": "text", "Status": "AUTHORISED"})
+
+    def test_json(self):
+        """
+        Tests that JSON responses are projected once parsed.
+        """
+        response = parse_json('{"Invoices": [{"InvoiceID": "i1", "Status": "PAID", "LineItems": [{"LineAmount": 1}]}]}')
+        self.assertEqual(project(response, XInvoice.projection(["Status"])),
+                         {"Response": {"Invoices": {"Invoice": {"InvoiceID": "i1", "Status": "PAID"}}}})
+
+    def test_nested(self):
+        """
+        Tests that JSON and XML responses are projected alike, children
+        being projected by their own entries.
+        """
+        projection = {"Invoice": ["InvoiceID", "Contact"], "Contact": ["Name"]}
+        xml = ("<Response><Invoices><Invoice><InvoiceID>i1</InvoiceID><Status>PAID</Status>"
+               "<Contact><ContactID>c1</ContactID><Name>Bob</Name></Contact></Invoice>"
+               "<Invoice><InvoiceID>i2</InvoiceID><Contact><ContactID>c2</ContactID></Contact></Invoice>"
+               "</Invoices></Response>")
+        content = ('{"Invoices": [{"InvoiceID": "i1", "Status": "PAID", "Contact": {"ContactID": "c1", "Name": "Bob"}},'
+                   '{"InvoiceID": "i2", "Contact": {"ContactID": "c2"}}]}')
+        self.assertEqual(parse_json(content), parse_xml(xml))
+        projected = parse_xml_projected(xml, projection)
+        self.assertEqual(project(parse_json(content), projection), projected)
+        self.assertEqual(projected["Response"]["Invoices"]["Invoice"][0], {"InvoiceID": "i1", "Contact": {"Name": "Bob"}})
@@ -0,0 +1,295 @@
+from xeroapi.coalesce import SingleFlight
+from xeroapi.errors import XeroClientCancelledException
+from xeroapi.errors import XeroClientCircuitOpenException
+from xeroapi.errors import XeroClientNotFoundException
+from xeroapi.errors import XeroClientUnknownException
+from xeroapi.pipeline import CacheStage
+from xeroapi.pipeline import Call
+from xeroapi.pipeline import CheckStage
+from xeroapi.pipeline import CircuitBreakerStage
+from xeroapi.pipeline import DecodeStage
+from xeroapi.pipeline import HedgeStage
+from xeroapi.pipeline import Pipeline
+from xeroapi.pipeline import RetryStage
+from xeroapi.pipeline import ScheduleStage
+from xeroapi.pipeline import QuotaStage
+from xeroapi.pipeline import SingleFlightStage
+from xeroapi.pipeline import cancellable
+from xeroapi.parsing import parse_xml
+from xeroapi.ratelimit import QuotaTracker
+import multiprocessing
+import threading
+import time
+import unittest
+
+__all__ = ["PipelineTest"]
+
+class PipelineTest(unittest.TestCase):
+    """
+    Provides a test suit for the request pipeline stages.
+    """
+
+    def setUp(self):
+        self.responses = []
+        self.sent = []
+
+    def send(self, call):
+        self.sent.append(call)
+        return self.responses.pop(0)
+
+    def test_decode(self):
+        """
+        Tests that successful responses are decoded and errors raised.
+        """
+        pipeline = Pipeline([DecodeStage(), CheckStage()], self.send)
+        self.responses = [({"status": "200"}, "<Response><Status>OK</Status></Response>"),
+                          ({"status": "404"}, "Not Found")]
+        self.assertEqual(pipeline(Call("GET", "Invoice")), {"Response": {"Status": "OK"}})
+        self.assertRaises(XeroClientNotFoundException, pipeline, Call("GET", "Invoice"))
+
+    def test_parse_pool(self):
+        """
+        Tests that large bodies, streamed or not, are parsed in the pool.
+        """
+        xml = "<Response><Status>OK</Status><Codes><Code>A</Code><Code>B</Code></Codes></Response>"
+        pool = multiprocessing.Pool(1)
+        applied = []
+
+        class Pool:
+            def apply(self, function, arguments):
+                applied.append(function)
+                return pool.apply(function, arguments)
+
+        try:
+            for compact in (False, True):
+                pipeline = Pipeline([DecodeStage(Pool(), 50, compact), CheckStage()], self.send)
+                self.responses = [({"status": "200"}, xml),
+                                  ({"status": "200"}, iter([xml[:40], xml[40:]])),
+                                  ({"status": "200"}, "<Response />")]
+                self.assertEqual(pipeline(Call("GET", "Codes")), parse_xml(xml))
+                self.assertEqual(pipeline(Call("GET", "Codes")), parse_xml(xml))
+                self.assertEqual(pipeline(Call("GET", "Codes")), {"Response": None})
+            self.assertEqual(len(applied), 4)
+        finally:
+            pool.terminate()
+
+    def test_cache(self):
+        """
+        Tests that GETs are cached until the tenant writes.
+        """
+        pipeline = Pipeline([CacheStage(60)], self.send)
+        self.responses = ["first", "posted", "second"]
+        self.assertEqual(pipeline(Call("GET", "TaxRate", tenant="a")), "first")
+        self.assertEqual(pipeline(Call("GET", "TaxRate", tenant="a")), "first")
+        self.assertEqual(pipeline(Call("POST", "TaxRate", "xml=", tenant="a")), "posted")
+        self.assertEqual(pipeline(Call("GET", "TaxRate", tenant="a")), "second")
+
+        # Raw GETs neither are cached nor drop the cache:
+        self.responses = ["pdf", "pdf"]
+        self.assertEqual(pipeline(Call("GET", "Invoices/x", decode=False, tenant="a")), "pdf")
+        self.assertEqual(pipeline(Call("GET", "Invoices/x", decode=False, tenant="a")), "pdf")
+        self.assertEqual(pipeline(Call("GET", "TaxRate", tenant="a")), "second")
+        self.assertEqual(len(self.sent), 5)
+
+    def test_schedule(self):
+        """
+        Tests that the scheduler slot is held until streamed bodies are read.
+        """
+        held = []
+
+        class Scheduler:
+            def acquire(self, tenant):
+                held.append(tenant)
+
+            def release(self, tenant):
+                held.remove(tenant)
+
+        pipeline = Pipeline([ScheduleStage(Scheduler())], self.send)
+        self.responses = [({"status": "200"}, "<Response />"),
+                          ({"status": "200"}, iter(["<Response>", "</Response>"])),
+                          ({"status": "200"}, iter(["<Response />"]))]
+        pipeline(Call("GET", "TaxRate", tenant="a"))
+        self.assertEqual(held, [])
+
+        # Read to the end:
+        response_header, response_content = pipeline(Call("GET", "TaxRate", tenant="a"))
+        self.assertEqual(held, ["a"])
+        self.assertEqual("".join(response_content), "<Response></Response>")
+        self.assertEqual(held, [])
+
+        # Closed before being read:
+        response_header, response_content = pipeline(Call("GET", "TaxRate", tenant="a"))
+        self.assertEqual(held, ["a"])
+        response_content.close()
+        self.assertEqual(held, [])
+
+    def test_retry(self):
+        """
+        Tests that failed GETs are sent again.
+        """
+        pipeline = Pipeline([RetryStage(3, 0), CheckStage()], self.send)
+        self.responses = [({"status": "503"}, ""), ({"status": "200"}, "ok")]
+        self.assertEqual(pipeline(Call("GET", "Account")), ({"status": "200"}, "ok"))
+        self.responses = [({"status": "503"}, "")]
+        self.assertRaises(XeroClientUnknownException, pipeline, Call("POST", "Account", "xml="))
+        self.assertEqual(len(self.sent), 3)
+
+    def test_hedge(self):
+        """
+        Tests that slow GETs are hedged within the budget.
+        """
+        stage = HedgeStage(percentile=50, ratio=0.4, min_samples=2, min_delay=0.01)
+        delays = [0, 0, 0.5, 0, 0.5]
+        pipeline = Pipeline([stage], lambda call: self.sent.append(call) or time.sleep(delays.pop(0)) or len(delays))
+        pipeline(Call("GET", "TaxRate", pooled=True))
+        pipeline(Call("GET", "TaxRate", pooled=True))
+
+        # The slow call is overtaken by its hedge:
+        started = time.time()
+        self.assertEqual(pipeline(Call("GET", "TaxRate", pooled=True)), 1)
+        self.assertTrue(time.time() - started < 0.4)
+
+        # The budget is spent, so the next slow call is waited for:
+        started = time.time()
+        self.assertEqual(pipeline(Call("GET", "TaxRate", pooled=True)), 0)
+        self.assertTrue(time.time() - started >= 0.5)
+        self.assertEqual(len(self.sent), 5)
+
+        # Calls which do not go through the pooled transport are not hedged:
+        stage = HedgeStage(percentile=50, ratio=1, min_samples=2, min_delay=0.01)
+        delays = [0, 0, 0.1, 0]
+        pipeline = Pipeline([stage], lambda call: self.sent.append(call) or time.sleep(delays.pop(0)) or len(delays))
+        for i in range(3):
+            pipeline(Call("GET", "TaxRate"))
+        self.assertEqual(delays, [0])
+
+    def test_hedge_single_flight(self):
+        """
+        Tests that hedges are sent rather than joining the slow call.
+        """
+        stage = HedgeStage(percentile=50, ratio=0.4, min_samples=2, min_delay=0.01)
+        delays = [0, 0, 0.5, 0]
+        pipeline = Pipeline([stage, SingleFlightStage(SingleFlight())],
+                            lambda call: self.sent.append(call) or time.sleep(delays.pop(0)) or len(delays))
+        pipeline(Call("GET", "TaxRate", pooled=True))
+        pipeline(Call("GET", "TaxRate", pooled=True))
+        started = time.time()
+        self.assertEqual(pipeline(Call("GET", "TaxRate", pooled=True)), 0)
+        self.assertTrue(time.time() - started < 0.4)
+        self.assertEqual(len(self.sent), 4)
+        self.assertTrue(self.sent[3].hedged)
+
+    def test_hedge_cancel(self):
+        """
+        Tests that the losing attempt is cancelled and hedges are counted.
+        """
+        tracker = QuotaTracker()
+        delays = [0, 0, None, 0]
+        cancelled = []
+
+        def send(call):
+            self.sent.append(call)
+            delay = delays.pop(0)
+            if delay is None:
+                cancelled.append(call.cancelled.wait(1))
+                raise XeroClientCancelledException("Call is cancelled")
+            return "ok"
+
+        stage = HedgeStage(percentile=50, ratio=0.4, min_samples=2, min_delay=0.01, quota=tracker)
+        pipeline = Pipeline([stage, QuotaStage(tracker)], send)
+        for i in range(3):
+            self.assertEqual(pipeline(Call("GET", "TaxRate", tenant="a", pooled=True)), "ok")
+        for i in range(100):
+            if cancelled:
+                break
+            time.sleep(0.01)
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(tracker.used("a"), (4, 4))
+
+        # No hedges once the tenant has no calls left:
+        tracker = QuotaTracker(minute_limit=3)
+        stage = HedgeStage(percentile=50, ratio=1, min_samples=2, min_delay=0.01, quota=tracker)
+        delays = [0, 0, 0.2]
+        pipeline = Pipeline([stage, QuotaStage(tracker)], lambda call: time.sleep(delays.pop(0)) or "ok")
+        for i in range(3):
+            pipeline(Call("GET", "TaxRate", tenant="a", pooled=True))
+        self.assertEqual(tracker.used("a"), (3, 3))
+
+    def test_cancellable(self):
+        """
+        Tests that cancelled bodies stop being read and are closed.
+        """
+        closed = []
+
+        def chunks():
+            try:
+                for chunk in ["a", "b", "c"]:
+                    yield chunk
+            finally:
+                closed.append(True)
+
+        cancelled = threading.Event()
+        body = cancellable(chunks(), cancelled)
+        self.assertEqual(next(body), "a")
+        cancelled.set()
+        self.assertRaises(XeroClientCancelledException, next, body)
+        self.assertEqual(closed, [True])
+
+    def test_single_flight_cancelled(self):
+        """
+        Tests that callers sharing a call given up by its leader send it.
+        """
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def send(call):
+            if call.cancelled is not None:
+                started.set()
+                release.wait()
+                raise XeroClientCancelledException("Call is cancelled")
+            return "ok"
+
+        pipeline = Pipeline([SingleFlightStage(SingleFlight())], send)
+        leader = Call("GET", "TaxRate")
+        leader.cancelled = threading.Event()
+        leader.cancelled.set()
+        thread = threading.Thread(target=lambda: self.assertRaises(XeroClientCancelledException, pipeline, leader))
+        thread.start()
+        started.wait()
+        follower = threading.Thread(target=lambda: results.append(pipeline(Call("GET", "TaxRate"))))
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        thread.join()
+        follower.join()
+        self.assertEqual(results, ["ok"])
+
+    def test_circuit_breaker(self):
+        """
+        Tests that failing endpoints fail fast until a probe succeeds.
+        """
+        breaker = CircuitBreakerStage(failures=2, reset_timeout=0.05)
+        pipeline = Pipeline([breaker, CheckStage()], self.send)
+        self.responses = [({"status": "503"}, ""), ({"status": "404"}, ""), ({"status": "503"}, ""), ({"status": "503"}, "")]
+        self.assertRaises(XeroClientUnknownException, pipeline, Call("POST", "Invoices", "xml=", tenant="a"))
+        self.assertRaises(XeroClientNotFoundException, pipeline, Call("GET", "Invoices/INV-1", tenant="a"))
+        self.assertRaises(XeroClientUnknownException, pipeline, Call("POST", "Invoices", "xml=", tenant="a"))
+        self.assertRaises(XeroClientUnknownException, pipeline, Call("POST", "Invoices", "xml=", tenant="a"))
+        self.assertEqual(breaker.state("a", "Invoices"), CircuitBreakerStage.OPEN)
+
+        # Open circuits fail fast, other tenants and endpoints go through:
+        self.assertRaises(XeroClientCircuitOpenException, pipeline, Call("POST", "Invoices?SummarizeErrors=false", "xml=", tenant="a"))
+        self.responses = [({"status": "200"}, "b"), ({"status": "200"}, "contacts")]
+        self.assertEqual(pipeline(Call("POST", "Invoices", "xml=", tenant="b"))[1], "b")
+        self.assertEqual(pipeline(Call("GET", "Contacts", tenant="a"))[1], "contacts")
+
+        # A failed probe opens the circuit again, a successful one closes it:
+        time.sleep(0.06)
+        self.responses = [({"status": "503"}, "")]
+        self.assertRaises(XeroClientUnknownException, pipeline, Call("GET", "Invoices", tenant="a"))
+        self.assertRaises(XeroClientCircuitOpenException, pipeline, Call("GET", "Invoices", tenant="a"))
+        time.sleep(0.06)
+        self.responses = [({"status": "200"}, "up")]
+        self.assertEqual(pipeline(Call("GET", "Invoices", tenant="a"))[1], "up")
+        self.assertEqual(breaker.state("a", "Invoices"), CircuitBreakerStage.CLOSED)
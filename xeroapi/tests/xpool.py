@@ -0,0 +1,68 @@
+from xeroapi import pool
+from xeroapi.pipeline import ScheduleStage
+from xeroapi.pool import ClientPool
+import oauth2
+import unittest
+
+__all__ = ["ClientPoolTest"]
+
+class ClientPoolTest(unittest.TestCase):
+    """
+    Provides a test suit for the registry of tenant clients.
+    """
+
+    def setUp(self):
+        # Count the keys loaded instead of loading them:
+        self.loaded = []
+        test = self
+
+        class SignatureMethod(oauth2.SignatureMethod_PLAINTEXT):
+            def __init__(self, key_path):
+                test.loaded.append(key_path)
+
+        self._signature_method = pool.SignatureMethod_RSA
+        pool.SignatureMethod_RSA = SignatureMethod
+        self.pool = ClientPool()
+        self.pool.add("a", "token-a", "secret-a", "one.pem")
+        self.pool.add("b", "token-b", "secret-b", "one.pem")
+        self.pool.add("c", "token-c", "secret-c", "two.pem")
+
+    def tearDown(self):
+        pool.SignatureMethod_RSA = self._signature_method
+
+    def scheduler(self, client):
+        return [stage.scheduler for stage in client.pipeline.stages if isinstance(stage, ScheduleStage)][0]
+
+    def test_lazy_clients(self):
+        """
+        Tests that clients are created once, when first asked for.
+        """
+        self.assertEqual(self.loaded, [])
+        self.assertEqual(len(self.pool), 3)
+        self.assertTrue(self.pool.client("a") is self.pool["a"])
+        self.assertEqual(self.loaded, ["one.pem"])
+
+    def test_shared(self):
+        """
+        Tests that keys are loaded once per path and that the transport
+        and the scheduler are shared.
+        """
+        clients = [self.pool.client(tenant) for tenant in self.pool]
+        self.assertEqual(sorted(self.loaded), ["one.pem", "two.pem"])
+        self.assertTrue(self.pool.client("a").method is self.pool.client("b").method)
+        for client in clients:
+            self.assertTrue(client._transport is self.pool.transport)
+            self.assertTrue(self.scheduler(client) is self.pool.scheduler)
+
+    def test_add(self):
+        """
+        Tests that registering a tenant again replaces its client.
+        """
+        client = self.pool.client("a")
+        self.pool.add("a", "token-d", "secret-d", "one.pem")
+        self.assertFalse(self.pool.client("a") is client)
+        self.assertEqual(self.pool.client("a").consumer.key, "token-d")
+        self.assertEqual(self.loaded, ["one.pem"])
+        self.pool.remove("c")
+        self.assertFalse("c" in self.pool)
+        self.assertRaises(KeyError, self.pool.client, "c")
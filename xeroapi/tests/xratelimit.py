@@ -0,0 +1,115 @@
+from xeroapi.ratelimit import FairScheduler
+from xeroapi.ratelimit import QuotaTracker
+from xeroapi.ratelimit import RateBudget
+import gc
+import os
+import tempfile
+import threading
+import time
+import unittest
+import weakref
+
+__all__ = ["RateBudgetTest", "FairSchedulerTest", "QuotaTrackerTest"]
+
+class RateBudgetTest(unittest.TestCase):
+    """
+    Provides a test suit for the rolling window rate budget.
+    """
+
+    def test_window(self):
+        """
+        Tests that calls leave the budget once they leave the window.
+        """
+        budget = RateBudget(2, 60.0)
+        budget.consume(1000.0)
+        budget.consume(1010.0)
+        self.assertEqual(budget.available(1020.0), 0)
+        self.assertEqual(budget.delay(1020.0), 40.0)
+        self.assertEqual(budget.available(1060.0), 1)
+        self.assertEqual(budget.delay(1060.0), 0.0)
+
+class FairSchedulerTest(unittest.TestCase):
+    """
+    Provides a test suit for the fair scheduler.
+    """
+
+    def test_round_robin(self):
+        """
+        Tests that waiting tenants take turns.
+        """
+        scheduler = FairScheduler(1, lambda: RateBudget(100, 60.0))
+        order = []
+
+        def call(tenant):
+            scheduler.acquire(tenant)
+            order.append(tenant)
+            scheduler.release(tenant)
+
+        # Hold the only slot while the tenants queue up one by one:
+        scheduler.acquire("hold")
+        threads = []
+        for tenant in ["a", "a", "a", "b"]:
+            threads.append(threading.Thread(target=call, args=(tenant,)))
+            threads[-1].start()
+            while sum([len(queue) for queue in scheduler._waiting.values()]) < len(threads):
+                time.sleep(0.001)
+        scheduler.release("hold")
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ["a", "b", "a", "a"])
+
+class QuotaTrackerTest(unittest.TestCase):
+    """
+    Provides a test suit for the quota tracker.
+    """
+
+    def test_windows(self):
+        """
+        Tests the remaining calls of the minute and day windows.
+        """
+        tracker = QuotaTracker(minute_limit=60, day_limit=100)
+        now = time.time()
+        for offset in [-90000.0, -3600.0, -30.0, -10.0]:
+            tracker.record("a", now + offset)
+        self.assertEqual(tracker.remaining("a", now), (58, 97))
+        self.assertEqual(tracker.remaining("b", now), (60, 100))
+
+        # Calls leave the day window as new ones are recorded:
+        tracker.record("a", now + 90000.0)
+        self.assertEqual(len(tracker._calls["a"]), 1)
+
+    def test_forecast(self):
+        """
+        Tests that jobs are checked against the remaining daily calls.
+        """
+        tracker = QuotaTracker(minute_limit=60, day_limit=200)
+        forecast = tracker.forecast("a", 8000, batch_size=50)
+        self.assertEqual(forecast["calls"], 160)
+        self.assertTrue(forecast["fits"])
+        self.assertEqual(forecast["seconds"], 100.0)
+        self.assertFalse(tracker.forecast("a", 8001, batch_size=40)["fits"])
+
+    def test_persistence(self):
+        """
+        Tests that the calls survive a restart.
+        """
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            tracker = QuotaTracker(path)
+            tracker.record("a")
+            tracker.record("a")
+            tracker.flush()
+            self.assertEqual(QuotaTracker(path).used("a"), (2, 2))
+
+            # Calls within the flush interval are persisted on close:
+            tracker.record("a")
+            tracker.close()
+            self.assertEqual(QuotaTracker(path).used("a"), (3, 3))
+
+            # Trackers are not kept alive to be closed at exit:
+            reference = weakref.ref(QuotaTracker(path))
+            gc.collect()
+            self.assertTrue(reference() is None)
+        finally:
+            os.remove(path)
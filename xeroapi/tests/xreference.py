@@ -0,0 +1,97 @@
+from xeroapi.errors import XeroClientNotFoundException
+from xeroapi.reference import warm_up
+from xeroapi.resources import XAccountType
+import threading
+import time
+import unittest
+
+__all__ = ["ReferenceTest"]
+
+class ReferenceTest(unittest.TestCase):
+    """
+    Provides a test suit for the warm-up of the reference data.
+    """
+
+    RESPONSES = {"Organisation": {"Organisations": {"Organisation": {"Name": "Demo", "LegalName": "Demo Ltd",
+                                                                     "PaysTax": "true", "Version": "NZ",
+                                                                     "OrganisationType": "COMPANY",
+                                                                     "BaseCurrency": "NZD"}}},
+                 "Account": {"Accounts": {"Account": [{"AccountID": "a1", "Code": "200", "Name": "Sales",
+                                                       "Type": "REVENUE", "TaxType": "OUTPUT2",
+                                                       "EnablePaymentsToAccount": "false"}]}},
+                 "TaxRate": {"TaxRates": {"TaxRate": {"TaxType": "OUTPUT2", "Name": "GST",
+                                                      "DisplayTaxRate": "15.0000", "EffectiveRate": "15.0000"}}},
+                 "BrandingTheme": {"BrandingThemes": {"BrandingTheme": {"BrandingThemeID": "b1", "Name": "Standard",
+                                                                        "SortOrder": "0",
+                                                                        "CreatedDateUTC": "2011-09-20T00:00:00"}}}}
+
+    def setUp(self):
+        self.responses = dict(self.RESPONSES)
+        self.is_pooled = False
+        self.missing = None
+        self.requested = []
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def get(self, resource_uri):
+        with self.lock:
+            self.requested.append(resource_uri)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        if resource_uri == self.missing:
+            raise XeroClientNotFoundException("Not found")
+        return {"Response": self.responses[resource_uri]}
+
+    def pooled(self):
+        self.is_pooled = True
+        return self
+
+    def test_warm_up(self):
+        """
+        Tests that the reference data is fetched concurrently and indexed.
+        """
+        reference = warm_up(self, workers=4)
+        self.assertEqual(sorted(self.requested), sorted(self.RESPONSES))
+        self.assertTrue(self.peak > 1)
+        self.assertTrue(self.is_pooled)
+        self.assertEqual(reference.organization.legalName, "Demo Ltd")
+        self.assertEqual(reference.accounts_by_code["200"].name, "Sales")
+        self.assertEqual(reference.accounts_by_id["a1"].code, "200")
+        self.assertEqual(reference.tax_rates_by_type["OUTPUT2"].Name, "GST")
+        self.assertEqual(reference.branding_themes_by_name["Standard"].BrandingThemeID, "b1")
+        self.assertTrue(reference.validator() is reference.validator())
+
+    def test_warm_up_failure(self):
+        """
+        Tests that a failed fetch fails the warm-up.
+        """
+        self.missing = "TaxRate"
+        self.assertRaises(XeroClientNotFoundException, warm_up, self)
+
+    def test_accounts(self):
+        """
+        Tests that account types XERO added, ie. payroll ones, and single
+        accounts do not fail the warm-up.
+        """
+        self.responses["Account"] = {"Accounts": {"Account": [{"AccountID": "a1", "Code": "477", "Name": "Wages",
+                                                               "Type": "WAGESEXPENSE", "TaxType": "NONE",
+                                                               "EnablePaymentsToAccount": "false"},
+                                                              {"AccountID": "a2", "Code": "090", "Name": "Bank",
+                                                               "Type": "NEWTYPE",
+                                                               "EnablePaymentsToAccount": "true"}]}}
+        reference = warm_up(self)
+        self.assertEqual(reference.accounts_by_code["477"].type, XAccountType.WAGESEXPENSE)
+        self.assertEqual(XAccountType.humanize(reference.accounts_by_code["477"].type), "Wages Expense")
+        self.assertEqual(reference.accounts_by_code["090"].type, "NEWTYPE")
+        self.assertEqual(XAccountType.humanize("NEWTYPE"), "NEWTYPE")
+
+        self.responses["Account"] = {"Accounts": {"Account": {"AccountID": "a3", "Code": "200", "Name": "Sales",
+                                                              "Type": "REVENUE", "TaxType": "OUTPUT2",
+                                                              "EnablePaymentsToAccount": "false"}}}
+        self.assertEqual([account.code for account in warm_up(self).accounts], ["200"])
+        self.responses["Account"] = {"Status": "OK"}
+        self.assertEqual(warm_up(self).accounts, [])
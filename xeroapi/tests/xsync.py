@@ -0,0 +1,59 @@
+from xeroapi import pool
+from xeroapi.sync import DONE
+from xeroapi.sync import FAILED
+from xeroapi.sync import PROGRESS
+from xeroapi.sync import SyncOrchestrator
+import oauth2
+import threading
+import unittest
+
+__all__ = ["SyncOrchestratorTest"]
+
+def _job(client, tenant, progress):
+    """
+    Syncs nothing, answering with the tenant, or failing as it says.
+    """
+    progress(client._tenant)
+    if tenant == "failing":
+        raise ValueError("Sync failed")
+    if tenant == "unpicklable":
+        return threading.Lock()
+    return tenant.upper()
+
+class _SignatureMethod(oauth2.SignatureMethod_PLAINTEXT):
+    def __init__(self, key_path):
+        pass
+
+class SyncOrchestratorTest(unittest.TestCase):
+    """
+    Provides a test suit for the multi-process sync orchestrator.
+    """
+
+    def setUp(self):
+        # The workers are forked, so they do not load the keys either:
+        self._signature_method = pool.SignatureMethod_RSA
+        pool.SignatureMethod_RSA = _SignatureMethod
+
+    def tearDown(self):
+        pool.SignatureMethod_RSA = self._signature_method
+
+    def test_run(self):
+        """
+        Tests that each tenant gets an outcome, even when its result can
+        not be sent back.
+        """
+        orchestrator = SyncOrchestrator(_job, processes=2, threads=2)
+        for tenant in ["t1", "t2", "failing", "unpicklable", "t3"]:
+            orchestrator.add(tenant, "token-%s" % (tenant), "secret", "key.pem")
+        self.assertEqual([len(shard) for shard in orchestrator.shards()], [3, 2])
+
+        events = []
+        retval = orchestrator.run(lambda event, tenant, value: events.append((event, tenant, value)))
+        self.assertEqual(retval["t1"], (True, "T1"))
+        self.assertEqual(retval["t3"], (True, "T3"))
+        self.assertEqual(retval["failing"], (False, "ValueError: Sync failed"))
+        self.assertEqual(retval["unpicklable"][0], False)
+        self.assertEqual(len(retval), 5)
+        self.assertTrue((PROGRESS, "t2", "t2") in events)
+        self.assertTrue((DONE, "t2", "T2") in events)
+        self.assertEqual(len([event for event in events if event[0] == FAILED]), 2)
@@ -0,0 +1,134 @@
+from xeroapi.client import Client
+from xeroapi.errors import XeroClientNotFoundException
+from xeroapi.parsing import parse_xml
+from xeroapi.parsing import parse_xml_chunks
+from xeroapi.resources import xml_envelope
+from xeroapi.tests.server import LocalServer
+from xeroapi.transport import StreamingTransport
+from xeroapi.transport import gzip_string
+import gzip
+import oauth2
+import StringIO
+import unittest
+
+__all__ = ["TransportTest", "RequestBodyTest"]
+
+XML = ("<Response><Status>OK</Status><Invoices>%s</Invoices></Response>"
+       % "".join("<Invoice><InvoiceNumber>INV-%d</InvoiceNumber></Invoice>" % i for i in range(50)))
+
+class TransportTest(unittest.TestCase):
+    """
+    Provides a test suit for the streaming transport.
+    """
+
+    def setUp(self):
+        self.server = LocalServer(self.respond)
+
+    def tearDown(self):
+        self.server.close()
+
+    def respond(self, request):
+        if request["path"].startswith("/Missing"):
+            return 404, {"Content-Encoding": "gzip"}, gzip_string("The resource you're looking for cannot be found")
+        return 200, {"Content-Encoding": "gzip", "Content-Type": "text/xml"}, gzip_string(XML)
+
+    def test_gzip_parsing(self):
+        """
+        Tests that compressed bodies are decompressed as they are parsed.
+        """
+        response = StreamingTransport().request("%sInvoices" % (self.server.url))
+        self.assertEqual(response.status, "200")
+        self.assertEqual(parse_xml_chunks(response.iter_content(chunk_size=64)), parse_xml(XML))
+
+    def test_error_body(self):
+        """
+        Tests that error bodies are read and raised by the client.
+        """
+        response = StreamingTransport().request("%sMissing" % (self.server.url))
+        self.assertEqual(response.status, "404")
+        self.assertEqual(response.read(), "The resource you're looking for cannot be found")
+
+        client = Client("token", "secret", None, xero_api_url=self.server.url, streaming=True,
+                        signature_method=oauth2.SignatureMethod_PLAINTEXT())
+        self.assertRaises(XeroClientNotFoundException, client.get, "Missing")
+        self.assertEqual(client.get("Invoices"), parse_xml(XML))
+        self.assertEqual(self.server.requests[-1]["headers"]["accept-encoding"], "gzip")
+
+    def test_connection_reuse(self):
+        """
+        Tests that read connections are reused, and that a connection
+        dropped while idle is replaced.
+        """
+        transport = StreamingTransport()
+        transport.request("%sInvoices" % (self.server.url)).read()
+        transport.request("%sInvoices" % (self.server.url)).read()
+        self.assertEqual(self.server.connections, 1)
+
+        # Connections not read to the end are not reused:
+        transport.request("%sInvoices" % (self.server.url)).close()
+        transport.request("%sInvoices" % (self.server.url)).read()
+        self.assertEqual(self.server.connections, 2)
+
+        # The server drops the connection after answering:
+        self.server.keep_alive = False
+        transport.request("%sInvoices" % (self.server.url)).read()
+        self.assertEqual(transport.request("%sInvoices" % (self.server.url)).read(), XML)
+        self.assertEqual(self.server.connections, 3)
+
+class _Entity:
+    def __init__(self, name):
+        self.name = name
+
+    def to_xml(self):
+        return "<Contact><Name>%s</Name></Contact>" % (self.name)
+
+class RequestBodyTest(unittest.TestCase):
+    """
+    Provides a test suit for the streamed request bodies.
+    """
+
+    def setUp(self):
+        self.server = LocalServer(lambda request: (200, {}, "<Response><Status>OK</Status></Response>"))
+
+    def tearDown(self):
+        self.server.close()
+
+    def client(self, **options):
+        return Client("token", "secret", None, xero_api_url=self.server.url,
+                      signature_method=oauth2.SignatureMethod_PLAINTEXT(), **options)
+
+    def test_chunked_post(self):
+        """
+        Tests that envelopes are posted as raw XML, one chunk per entity.
+        """
+        self.client().post("Contacts", xml_envelope("Contacts", [_Entity("A"), _Entity("B")]))
+        request = self.server.requests[-1]
+        self.assertEqual(request["method"], "POST")
+        self.assertEqual(request["headers"]["content-type"], "application/xml")
+        self.assertEqual(request["headers"]["transfer-encoding"], "chunked")
+        self.assertEqual(request["raw"], "a\r\n<Contacts>\r\n"
+                                         "21\r\n<Contact><Name>A</Name></Contact>\r\n"
+                                         "21\r\n<Contact><Name>B</Name></Contact>\r\n"
+                                         "b\r\n</Contacts>\r\n"
+                                         "0\r\n\r\n")
+
+    def test_compressed_put(self):
+        """
+        Tests that chunked bodies are sent as one gzip stream if allowed.
+        """
+        entities = [_Entity(str(i)) for i in range(100)]
+        self.client(compress_requests=True).put("Contacts", xml_envelope("Contacts", entities))
+        request = self.server.requests[-1]
+        self.assertEqual(request["method"], "PUT")
+        self.assertEqual(request["headers"]["content-encoding"], "gzip")
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO.StringIO(request["body"])).read(),
+                         "".join(xml_envelope("Contacts", entities)))
+
+    def test_form_post(self):
+        """
+        Tests that complete documents are still posted form encoded.
+        """
+        self.client(streaming=True).post("Contacts", "<Contacts />")
+        request = self.server.requests[-1]
+        self.assertEqual(request["headers"]["content-type"], "application/x-www-form-urlencoded")
+        self.assertEqual(request["body"], "xml=%3CContacts+%2F%3E")
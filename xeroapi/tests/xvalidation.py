@@ -0,0 +1,66 @@
+from decimal import Decimal
+from xeroapi.resources import XAccount
+from xeroapi.resources import XAccountType
+from xeroapi.resources import XInvoice
+from xeroapi.resources import XTaxRate
+from xeroapi.validation import InvoiceValidator
+import unittest
+
+__all__ = ["InvoiceValidatorTest"]
+
+class InvoiceValidatorTest(unittest.TestCase):
+    """
+    Provides a test suit for the local invoice validator.
+    """
+
+    def setUp(self):
+        self.validator = InvoiceValidator([XAccount("1", "200", "Sales", XAccountType.REVENUE, "OUTPUT2", None, None, False)],
+                                          [XTaxRate({"TaxType": "OUTPUT2", "Name": "GST", "DisplayTaxRate": "15.0000", "EffectiveRate": "15.0000"}),
+                                           XTaxRate({"TaxType": "NONE", "Name": "No GST", "DisplayTaxRate": "0.0000", "EffectiveRate": "0.0000"})])
+        self.invoice = XInvoice()
+        self.invoice.LineItems = [{"Quantity": "2", "UnitAmount": "10.00", "AccountCode": "200"},
+                                  {"Quantity": "1", "UnitAmount": "5.00", "AccountCode": "200", "TaxType": "NONE"}]
+
+    def test_exclusive(self):
+        """
+        Tests the totals of a tax exclusive invoice.
+        """
+        self.invoice.SubTotal = Decimal("25.00")
+        self.invoice.TotalTax = Decimal("3.00")
+        self.invoice.Total = Decimal("28.00")
+        self.assertEqual(self.validator.validate(self.invoice), [])
+        self.invoice.Total = Decimal("25.00")
+        self.assertEqual(self.validator.validate(self.invoice), ["Total should be 28.00, not 25.00"])
+
+    def test_inclusive(self):
+        """
+        Tests the totals of a tax inclusive invoice.
+        """
+        self.invoice.LineAmountTypes = XInvoice.InvoiceLineAmountType.Inclusive
+        self.invoice.SubTotal = Decimal("22.39")
+        self.invoice.TotalTax = Decimal("2.61")
+        self.invoice.Total = Decimal("25.00")
+        self.assertEqual(self.validator.validate(self.invoice), [])
+
+    def test_references(self):
+        """
+        Tests that unknown account codes and tax types are rejected.
+        """
+        self.invoice.LineItems = [{"LineAmount": "10.00", "AccountCode": "999", "TaxType": "BOGUS"}]
+        valid, rejected = self.validator.validate_all([self.invoice])
+        self.assertEqual(valid, [])
+        self.assertEqual(rejected[0][1], ["Line 1: AccountCode is unknown: 999",
+                                          "Line 1: TaxType is unknown: BOGUS"])
+
+    def test_effective_rate(self):
+        """
+        Tests that taxes are worked out at the effective rate, not the
+        displayed one, ie. for compound rates.
+        """
+        validator = InvoiceValidator([XAccount("1", "200", "Sales", XAccountType.REVENUE, "GSTONIMPORTS", None, None, False)],
+                                     [XTaxRate({"TaxType": "GSTONIMPORTS", "Name": "Compound", "DisplayTaxRate": "10.0000", "EffectiveRate": "12.5000"})])
+        self.invoice.LineItems = [{"Quantity": "1", "UnitAmount": "100.00", "AccountCode": "200", "TaxAmount": "12.50"}]
+        self.invoice.SubTotal = Decimal("100.00")
+        self.invoice.TotalTax = Decimal("12.50")
+        self.invoice.Total = Decimal("112.50")
+        self.assertEqual(validator.validate(self.invoice), [])
@@ -0,0 +1,271 @@
+"""
+Provides a streaming HTTP transport for the XERO API client.
+
+Unlike ``httplib2``, which buffers and decompresses the complete
+response body before handing it over, this transport gives access to
+the response as it arrives, decompressing it chunk by chunk.
+"""
+
+import gzip
+import httplib
+import StringIO
+import threading
+import urlparse
+import zlib
+
+# Size of the chunks read from the socket:
+CHUNK_SIZE = 64 * 1024
+
+# Request bodies smaller than this are not worth compressing:
+COMPRESSION_THRESHOLD = 16 * 1024
+
+def gzip_string(content):
+    """
+    Returns the gzip compressed content.
+    """
+    buf = StringIO.StringIO()
+    zfile = gzip.GzipFile(mode="wb", fileobj=buf)
+    zfile.write(content)
+    zfile.close()
+    return buf.getvalue()
+
+def gzip_chunks(chunks):
+    """
+    Yields the gzip compressed stream of the chunks, chunk by chunk.
+    """
+    # Offset the window bits so that zlib writes a gzip header:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+class ResponseStream:
+    """
+    Provides a read only file object over the chunks of a response body,
+    which are only read from the connection as the file is read.
+    """
+
+    def __init__(self, chunks):
+        """
+        Constructs a new :class:`ResponseStream` instance.
+        """
+        self._chunks = iter(chunks)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        """
+        Returns up to ``size`` bytes, or the rest of the body if no size
+        is given, and an empty string once the body has been read.
+        """
+        if size is None or size < 0:
+            data, self._buffer = self._buffer + "".join(self._chunks), ""
+            return data
+
+        # Chunks are passed on as they are when the sizes match up:
+        parts = [self._buffer] if self._buffer else []
+        buffered = len(self._buffer)
+        while buffered < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            parts.append(chunk)
+            buffered += len(chunk)
+        data = "".join(parts)
+        data, self._buffer = data[:size], data[size:]
+        return data
+
+    def __iter__(self):
+        return iter(lambda: self.read(CHUNK_SIZE), "")
+
+    def close(self):
+        """
+        Stops reading, releasing the connection.
+        """
+        if hasattr(self._chunks, "close"):
+            self._chunks.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class StreamingResponse:
+    """
+    Wraps a ``httplib`` response which is consumed as a stream.
+    """
+
+    def __init__(self, response, release=None):
+        """
+        Constructs a new :class:`StreamingResponse` instance.
+
+        ``release`` is called on close with a flag telling whether the
+        connection can be reused, ie. the body has been read completely.
+        """
+        self._response = response
+        self._release = release
+        self.status = str(response.status)
+        self.headers = dict((key.lower(), value) for key, value in response.getheaders())
+        self.headers["status"] = self.status
+
+    def iter_content(self, chunk_size=CHUNK_SIZE):
+        """
+        Yields the (decompressed) response body chunk by chunk.
+        """
+        decompressor = None
+        if self.headers.get("content-encoding", "").lower() in ("gzip", "x-gzip"):
+            # Offset the window bits so that zlib expects a gzip header:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        try:
+            while True:
+                chunk = self._response.read(chunk_size)
+                if not chunk:
+                    break
+                if decompressor:
+                    chunk = decompressor.decompress(chunk)
+                    if not chunk:
+                        continue
+                yield chunk
+            if decompressor:
+                chunk = decompressor.flush()
+                if chunk:
+                    yield chunk
+        finally:
+            self.close()
+
+    def read(self):
+        """
+        Returns the complete (decompressed) response body.
+        """
+        return "".join(self.iter_content())
+
+    def stream(self):
+        """
+        Returns the (decompressed) response body as a
+        :class:`ResponseStream`.
+        """
+        return ResponseStream(self.iter_content())
+
+    def close(self):
+        """
+        Closes the underlying response.
+        """
+        # The response closes itself once the body is read completely:
+        complete = self._response.isclosed()
+        self._response.close()
+        if self._release:
+            release, self._release = self._release, None
+            release(complete and not self._response.will_close)
+
+class ConnectionPool:
+    """
+    Provides a thread safe pool of keep-alive connections, keyed by
+    scheme and host, which can be shared by many clients.
+    """
+
+    def __init__(self, maxsize=8, timeout=None):
+        """
+        Constructs a new :class:`ConnectionPool` instance keeping at most
+        ``maxsize`` idle connections per host.
+        """
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, uri, fresh=False):
+        """
+        Returns the pool key, a connection for the URI and whether the
+        connection is an idle one being reused rather than a new one.
+        """
+        parsed = urlparse.urlsplit(uri)
+        key = (parsed.scheme, parsed.netloc)
+        if not fresh:
+            with self._lock:
+                idle = self._idle.get(key)
+                if idle:
+                    return key, idle.pop(), True
+        if parsed.scheme == "https":
+            return key, httplib.HTTPSConnection(parsed.netloc, timeout=self.timeout), False
+        return key, httplib.HTTPConnection(parsed.netloc, timeout=self.timeout), False
+
+    def put(self, key, connection, reusable=True):
+        """
+        Returns the connection to the pool, or closes it if it can not be
+        reused or the pool is full.
+        """
+        if reusable:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.maxsize:
+                    idle.append(connection)
+                    return
+        connection.close()
+
+class StreamingTransport:
+    """
+    Provides a minimal HTTP transport which returns streaming responses.
+    """
+
+    def __init__(self, timeout=None, pool=None):
+        """
+        Constructs a new :class:`StreamingTransport` instance.
+
+        Connections are taken from, and returned to, the given
+        :class:`ConnectionPool`, which may be shared by many transports.
+        """
+        self.pool = pool or ConnectionPool(timeout=timeout)
+
+    def send_chunked(self, connection, method, path, chunks, headers):
+        """
+        Sends the request with a body of the given chunks using chunked
+        transfer encoding, so that no more than one chunk is held in
+        memory at a time.
+        """
+        connection.putrequest(method, path, skip_accept_encoding=True)
+        for key, value in headers.iteritems():
+            connection.putheader(key, value)
+        connection.putheader("Transfer-Encoding", "chunked")
+        connection.endheaders()
+        for chunk in chunks:
+            if chunk:
+                connection.send("%x\r\n%s\r\n" % (len(chunk), chunk))
+        connection.send("0\r\n\r\n")
+
+    def request(self, uri, method="GET", body=None, headers=None):
+        """
+        Sends the request and returns a :class:`StreamingResponse`
+        once the response headers have arrived.
+
+        The body is either a string, a file object, which is read block by
+        block, or an iterable of string chunks, which is sent with chunked
+        transfer encoding.
+        """
+        parsed = urlparse.urlsplit(uri)
+        path = parsed.path
+        if parsed.query:
+            path = "%s?%s" % (path, parsed.query)
+
+        streamed = hasattr(body, "read")
+        chunked = body is not None and not streamed and not isinstance(body, basestring)
+        fresh = False
+        while True:
+            key, connection, reused = self.pool.get(uri, fresh)
+            try:
+                if chunked:
+                    self.send_chunked(connection, method, path, body, headers or {})
+                else:
+                    connection.request(method, path, body, headers or {})
+                response = connection.getresponse()
+                break
+            except:
+                self.pool.put(key, connection, False)
+                # The server may have dropped an idle connection; retry
+                # once on a new one unless the body can not be replayed:
+                if not reused or chunked or streamed:
+                    raise
+                fresh = True
+        return StreamingResponse(response, lambda reusable: self.pool.put(key, connection, reusable))
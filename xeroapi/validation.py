@@ -0,0 +1,171 @@
+"""
+Provides local validation of invoices before they are sent to XERO.
+"""
+
+from decimal import Decimal
+from decimal import InvalidOperation
+from decimal import ROUND_HALF_UP
+from resources import XAccount
+from resources import XInvoice
+from resources import XTaxRate
+
+_CENT = Decimal("0.01")
+_HUNDRED = Decimal("100")
+
+def _amount(value):
+    """
+    Returns the string amount as a Decimal, or None if it is missing.
+
+    Raises ValueError if the amount is not a number.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError("Not an amount: %s" % value)
+
+def _round(amount):
+    """
+    Rounds the amount to cents the way XERO does.
+    """
+    return amount.quantize(_CENT, rounding=ROUND_HALF_UP)
+
+class InvoiceValidator:
+    """
+    Provides a validator which catches the invoice errors XERO would
+    reject with a ``400``: unknown account codes or tax types, unknown
+    line amount types and amounts which do not add up.
+
+    Line amounts, taxes and totals are recomputed with :class:`Decimal`
+    under the ``Exclusive``, ``Inclusive`` and ``NoTax`` rules.
+    """
+
+    def __init__(self, accounts, tax_rates):
+        """
+        Constructs a new :class:`InvoiceValidator` instance from
+        :class:`XAccount` and :class:`XTaxRate` instances.
+        """
+        self._accounts = dict((account.code, account) for account in accounts)
+        self._rates = {}
+        for rate in tax_rates:
+            self._rates[rate.TaxType] = Decimal(rate.EffectiveRate or rate.DisplayTaxRate or "0")
+
+    @staticmethod
+    def from_client(client):
+        """
+        Returns a validator for the accounts and tax rates of the client.
+        """
+        return InvoiceValidator(XAccount.get(client), XTaxRate.get(client))
+
+    def _validate_line(self, number, line, line_amount_types, errors):
+        """
+        Validates the line item, appending the errors found, and returns
+        the line amount and tax (or None when they can not be worked out).
+        """
+        # Check the account and tax type references:
+        account = None
+        if line.get("AccountCode") is not None:
+            account = self._accounts.get(line["AccountCode"])
+            if account is None:
+                errors.append("Line %d: AccountCode is unknown: %s" % (number, line["AccountCode"]))
+        tax_type = line.get("TaxType") or (account.tax_type if account else None)
+        if line.get("TaxType") is not None and line["TaxType"] not in self._rates:
+            errors.append("Line %d: TaxType is unknown: %s" % (number, line["TaxType"]))
+            tax_type = None
+
+        # Work out the line amount:
+        try:
+            quantity = _amount(line.get("Quantity"))
+            unit_amount = _amount(line.get("UnitAmount"))
+            discount_rate = _amount(line.get("DiscountRate"))
+            line_amount = _amount(line.get("LineAmount"))
+            tax_amount = _amount(line.get("TaxAmount"))
+        except ValueError, e:
+            errors.append("Line %d: %s" % (number, e))
+            return None, None
+        if quantity is not None and unit_amount is not None:
+            computed = quantity * unit_amount
+            if discount_rate:
+                computed = computed * (_HUNDRED - discount_rate) / _HUNDRED
+            computed = _round(computed)
+            if line_amount is not None and line_amount != computed:
+                errors.append("Line %d: LineAmount should be %s, not %s" % (number, computed, line_amount))
+            line_amount = computed
+        if line_amount is None:
+            return None, None
+
+        # Work out the tax of the line:
+        if line_amount_types == XInvoice.InvoiceLineAmountType.NoTax:
+            computed = Decimal("0.00")
+        elif tax_type in self._rates:
+            rate = self._rates[tax_type]
+            if line_amount_types == XInvoice.InvoiceLineAmountType.Inclusive:
+                computed = _round(line_amount * rate / (_HUNDRED + rate))
+            else:
+                computed = _round(line_amount * rate / _HUNDRED)
+        else:
+            return line_amount, tax_amount
+        if tax_amount is not None and tax_amount != computed:
+            errors.append("Line %d: TaxAmount should be %s, not %s" % (number, computed, tax_amount))
+        return line_amount, computed
+
+    def validate(self, invoice):
+        """
+        Returns the list of errors found in the :class:`XInvoice`, which
+        is empty if it is fine to be sent.
+        """
+        errors = []
+        line_amount_types = invoice.get("LineAmountTypes") or XInvoice.InvoiceLineAmountType.Exclusive
+        if line_amount_types not in XInvoice.InvoiceLineAmountType.get_all_types():
+            errors.append("LineAmountTypes is unknown: %s" % line_amount_types)
+            return errors
+
+        # Validate the lines, summing up their amounts and taxes:
+        lines = invoice.LineItems or []
+        if isinstance(lines, dict):
+            lines = [lines]
+        line_total = Decimal("0.00")
+        tax_total = Decimal("0.00")
+        complete = True
+        for number, line in enumerate(lines):
+            line_amount, tax_amount = self._validate_line(number + 1, line, line_amount_types, errors)
+            if line_amount is None or tax_amount is None:
+                complete = False
+                continue
+            line_total += line_amount
+            tax_total += tax_amount
+
+        # Check the totals if all lines could be worked out:
+        if not complete:
+            return errors
+        if line_amount_types == XInvoice.InvoiceLineAmountType.Inclusive:
+            sub_total = line_total - tax_total
+        else:
+            sub_total = line_total
+        try:
+            expected = [("SubTotal", sub_total, _amount(invoice.get("SubTotal"))),
+                        ("TotalTax", tax_total, _amount(invoice.get("TotalTax"))),
+                        ("Total", sub_total + tax_total, _amount(invoice.get("Total")))]
+        except ValueError, e:
+            errors.append(str(e))
+            return errors
+        for name, computed, given in expected:
+            if given is not None and given != computed:
+                errors.append("%s should be %s, not %s" % (name, computed, given))
+        return errors
+
+    def validate_all(self, invoices):
+        """
+        Validates the invoices and returns the list of valid invoices and
+        the list of ``(invoice, errors)`` for the rejected ones.
+        """
+        valid = []
+        rejected = []
+        for invoice in invoices:
+            errors = self.validate(invoice)
+            if errors:
+                rejected.append((invoice, errors))
+            else:
+                valid.append(invoice)
+        return valid, rejected
@@ -1,25 +1,23 @@
 from client import Client
-from resources import XOrganization
-from resources import XAccount
+from reference import warm_up
 from resources import XAccountType
-from resources import XBrandingTheme
-from resources import XTaxRate
 from xeroapi import __version__
 import sys
 
 def run_main (token, secret, pem_filepath):
     print "XERO API Version %s" % __version__
     xero_client = Client(token, secret, pem_filepath)
-    print XOrganization.get(xero_client)
+    reference = warm_up(xero_client)
+    print reference.organization
     #count = 1
-    # for account in XAccount.get(xero_client):
+    # for account in reference.accounts:
     #     print "%03d (%21s) %s" % (count, XAccountType.humanize(account.type), account)
     #     count += 1
 
     print ",-----------------------------------------------------------------------------------------"
     print "| Branding Themes: "
     print "| ----------------------------------------------------------------------------------------"
-    for theme in XBrandingTheme.get(xero_client):
+    for theme in reference.branding_themes:
         print "| %s %-22s %2s %s" % (theme.BrandingThemeID,
                                  theme.CreatedDateUTC,
                                  theme.SortOrder,
@@ -27,7 +25,7 @@ def run_main (token, secret, pem_filepath):
     print "`-----------------------------------------------------------------------------------------"
     print "| Tax Rates: "
     print "| ----------------------------------------------------------------------------------------"
-    for rate in XTaxRate.get(xero_client):
+    for rate in reference.tax_rates:
         print "| %-12s %-32s %8s %8s" % (rate.TaxType,
                                          rate.Name,
                                          rate.DisplayTaxRate,
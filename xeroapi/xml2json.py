@@ -34,22 +34,55 @@ R. White, 2006 November 6
 """
 
 import xml.etree.cElementTree as ET
-import optparse, sys, os
+import optparse, re, sys, os
 import json as simplejson
 
-def elem_to_internal(elem,strip=1):
+# longest value, and most values, shared through a memo
+MEMO_VALUE_LENGTH = 40
+MEMO_SIZE = 65536
 
-    """Convert an Element into an internal dictionary (not JSON!)."""
+# identifiers (GUIDs) are unique per record, so never worth sharing
+GUID_LENGTH = 36
+GUID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+def share(memo, value):
+
+    """Return the string equal to value already in the memo, adding it if
+    it is short enough, is not a GUID and the memo is not full."""
+
+    shared = memo.get(value)
+    if shared is not None:
+        return shared
+    if len(value) <= MEMO_VALUE_LENGTH and len(memo) < MEMO_SIZE:
+        if len(value) == GUID_LENGTH and GUID.match(value):
+            return value
+        memo[value] = value
+    return value
+
+def elem_to_internal(elem,strip=1,memo=None):
+
+    """Convert an Element into an internal dictionary (not JSON!).
+
+    With a memo (a dictionary shared across the document), equal tags,
+    attribute names and short values are stored once: repeated elements
+    then share their key strings and their low cardinality values (codes,
+    statuses, currencies) instead of each holding copies. GUIDs, unique
+    per record, are left out so that they do not fill the memo."""
 
     d = {}
     for key, value in elem.attrib.items():
-        d['@'+key] = value
+        if memo is None:
+            d['@'+key] = value
+        else:
+            d[share(memo, '@'+key)] = share(memo, value)
 
     # loop over subelements to merge them
     for subelem in elem:
-        v = elem_to_internal(subelem,strip=strip)
+        v = elem_to_internal(subelem,strip=strip,memo=memo)
         tag = subelem.tag
         value = v[tag]
+        if memo is not None:
+            tag = share(memo, tag)
         try:
             # add to existing list for this tag
             d[tag].append(value)
@@ -69,6 +102,9 @@ def elem_to_internal(elem,strip=1):
     if tail:
         d['#tail'] = tail
 
+    if text and memo is not None:
+        text = share(memo, text)
+
     if d:
         # use #text element if other attributes exist
         if text: d["#text"] = text
@@ -148,6 +184,144 @@ def xml2json(xmlstring,strip=1):
     return elem2json(elem,strip=strip)
 
 
+class InternalBuilder(object):
+
+    """Parser target building the internal dictionary (the same one as
+    elem_to_internal) as the elements are parsed, so that no element tree
+    is held in memory, sharing strings through the memo if any.
+
+    An element is only converted once its tail has been seen, ie. when
+    the next element starts or its parent ends.
+
+    A projection maps tags to the child tags to keep: the other children
+    of those elements are skipped along with their whole subtree."""
+
+    def __init__(self, strip=1, memo=None, projection=None):
+        self.strip = strip
+        self.memo = memo
+        self.projection = projection
+        # open elements as [tag, dict, text parts, closed child]
+        self.stack = []
+        self.root = None
+        # depth into a skipped subtree
+        self.skipping = 0
+
+    def start(self, tag, attrib):
+        if self.skipping:
+            self.skipping += 1
+            return
+        if self.stack:
+            self._merge(self.stack[-1])
+            if self.projection:
+                keep = self.projection.get(self.stack[-1][0])
+                if keep is not None and tag not in keep:
+                    self.skipping = 1
+                    return
+        d = {}
+        for key, value in attrib.items():
+            if self.memo is None:
+                d['@'+key] = value
+            else:
+                d[share(self.memo, '@'+key)] = share(self.memo, value)
+        self.stack.append([tag, d, [], None])
+
+    def data(self, data):
+        if self.skipping:
+            return
+        frame = self.stack[-1]
+        if frame[3] is not None:
+            # text after a child is the tail of the child
+            frame[3][3].append(data)
+        else:
+            frame[2].append(data)
+
+    def end(self, tag):
+        if self.skipping:
+            self.skipping -= 1
+            if not self.skipping:
+                # collect the tail of the skipped element to drop it
+                self.stack[-1][3] = [None, None, None, []]
+            return
+        frame = self.stack.pop()
+        self._merge(frame)
+        closed = [frame[0], frame[1], frame[2] and "".join(frame[2]), []]
+        if self.stack:
+            self.stack[-1][3] = closed
+        else:
+            self.root = closed
+
+    def close(self):
+        tag, value = self._convert(self.root)
+        return {tag: value}
+
+    def _convert(self, closed):
+        tag, d, text, tail = closed
+        tail = tail and "".join(tail)
+        if self.strip:
+            # ignore leading and trailing whitespace
+            if text: text = text.strip()
+            if tail: tail = tail.strip()
+        if self.memo is not None:
+            tag = share(self.memo, tag)
+            if text: text = share(self.memo, text)
+
+        if tail:
+            d['#tail'] = tail
+
+        if d:
+            # use #text element if other attributes exist
+            if text: d["#text"] = text
+        else:
+            # text is the value if no attributes
+            d = text or None
+        return tag, d
+
+    def _merge(self, frame):
+        if frame[3] is None:
+            return
+        if frame[3][0] is None:
+            frame[3] = None
+            return
+        tag, value = self._convert(frame[3])
+        frame[3] = None
+        d = frame[1]
+        try:
+            # add to existing list for this tag
+            d[tag].append(value)
+        except AttributeError:
+            # turn existing entry into a list
+            d[tag] = [d[tag], value]
+        except KeyError:
+            # add a new non-list entry
+            d[tag] = value
+
+
+def xml2internal(xmlstring,strip=1,memo=None,projection=None):
+
+    """Convert an XML string into an internal dictionary, without an
+    element tree, sharing strings through the memo and keeping only the
+    projected elements, if any (see InternalBuilder)."""
+
+    parser = ET.XMLParser(target=InternalBuilder(strip, memo, projection))
+    parser.feed(xmlstring)
+    return parser.close()
+
+
+def chunks2internal(chunks,strip=1,memo=None,projection=None):
+
+    """Convert an iterable of XML string chunks into an internal dictionary.
+
+    The chunks are fed to the parser as they come and converted as they
+    are parsed, so neither the complete XML string nor its element tree
+    ever have to be held in memory.
+    """
+
+    parser = ET.XMLParser(target=InternalBuilder(strip, memo, projection))
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
 def json2xml(json, factory=ET.Element):
 
     """Convert a JSON string into an XML string.